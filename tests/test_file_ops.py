@@ -1,3 +1,7 @@
+import errno
+import json
+import os
+
 import pytest
 from unittest.mock import patch, MagicMock, mock_open
 from velez.file_ops import FileOperations
@@ -26,6 +30,32 @@ def test_format_hcl_files_ot(mock_run_command, file_ops):
     mock_run_command.assert_any_call(['terragrunt', 'hclfmt'])
     mock_run_command.assert_any_call(['tofu', 'fmt', '-recursive', '.'])
 
+@patch('velez.file_ops.run_command')
+def test_format_hcl_files_changed(mock_run_command, file_ops):
+    """Test format_hcl_files formats only files changed in git."""
+    file_ops.velez.check_terragrunt = MagicMock(return_value=True)
+    file_ops.velez.get_tf_ot = MagicMock(return_value='terraform')
+    file_ops.list_changed_hcl_files = MagicMock(return_value=['a/terragrunt.hcl', 'b/main.tf', 'b/vars.tfvars'])
+    file_ops.format_hcl_files(mode='changed')
+    mock_run_command.assert_any_call(['terragrunt', 'hclfmt', '--file', 'a/terragrunt.hcl'])
+    mock_run_command.assert_any_call(['terraform', 'fmt', 'b/main.tf', 'b/vars.tfvars'])
+    assert mock_run_command.call_count == 2
+
+@patch('velez.file_ops.run_command')
+def test_format_hcl_files_modified(mock_run_command, tmp_path, monkeypatch, file_ops):
+    """Test format_hcl_files formats only files modified since the last run, never generated lock files."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('velez.file_ops.FORMAT_CACHE', str(tmp_path / 'cache' / 'format.json'))
+    file_ops.velez.check_terragrunt = MagicMock(return_value=True)
+    file_ops.velez.get_tf_ot = MagicMock(return_value='tofu')
+    (tmp_path / 'main.tf').write_text('a = 1\n')
+    (tmp_path / '.terraform.lock.hcl').write_text('provider "registry.terraform.io/hashicorp/aws" {}\n')
+    file_ops.format_hcl_files(mode='modified')
+    mock_run_command.assert_called_once_with(['tofu', 'fmt', './main.tf'])
+    mock_run_command.reset_mock()
+    file_ops.format_hcl_files(mode='modified')
+    mock_run_command.assert_not_called()
+
 @patch('builtins.input', return_value='')  # Mock input to return an empty string
 @patch('os.remove')
 @patch('shutil.rmtree')
@@ -41,14 +71,67 @@ def test_clean_files(mock_rmtree, mock_remove, mock_input, file_ops):
         mock_remove.assert_any_call('/path/.terraform.lock.hcl')
         mock_remove.assert_any_call('/path/tfplan')
 
+@patch('velez.file_ops.FileOperations.write_hcl_cache')
+@patch('velez.file_ops.FileOperations.read_hcl_cache', return_value=None)
 @patch('builtins.open', new_callable=mock_open, read_data='key = "value"')
-@patch('velez.file_ops.hcl2.load', return_value={"key": "value"})
-def test_load_hcl_file(mock_hcl_load, mock_file):
+@patch('velez.file_ops.hcl2.loads', return_value={"key": "value"})
+def test_load_hcl_file(mock_hcl_loads, mock_file, mock_read_cache, mock_write_cache):
     """Test load_hcl_file."""
     result = FileOperations.load_hcl_file('dummy.hcl')
     assert result == {"key": "value"}
     mock_file.assert_called_once_with('dummy.hcl', 'r')
-    mock_hcl_load.assert_called_once()
+    mock_hcl_loads.assert_called_once_with('key = "value"')
+    mock_write_cache.assert_called_once()
+
+def test_load_hcl_file_cached(tmp_path, monkeypatch):
+    """Test load_hcl_file returns cached result without parsing again."""
+    monkeypatch.setattr('velez.file_ops.HCL_CACHE_DIR', str(tmp_path / 'cache'))
+    hcl_file = tmp_path / 'terragrunt.hcl'
+    hcl_file.write_text('inputs = {\n  a = 1\n}\n')
+    assert FileOperations.load_hcl_file(str(hcl_file)) == {'inputs': {'a': 1}}
+    with patch('velez.file_ops.hcl2.loads') as mock_hcl_loads:
+        assert FileOperations.load_hcl_file(str(hcl_file)) == {'inputs': {'a': 1}}
+        mock_hcl_loads.assert_not_called()
+
+def test_load_hcl_files(tmp_path, monkeypatch, capsys):
+    """Test load_hcl_files parses many files and skips broken ones, reporting their parse errors."""
+    monkeypatch.setattr('velez.file_ops.HCL_CACHE_DIR', str(tmp_path / 'cache'))
+    for i in range(3):
+        (tmp_path / f'{i}.hcl').write_text(f'a = {i}\n')
+    (tmp_path / 'broken.hcl').write_text('a = {\n')
+    files = [str(tmp_path / f'{i}.hcl') for i in range(3)] + [str(tmp_path / 'broken.hcl')]
+    results = FileOperations.load_hcl_files(files, workers=2)
+    assert results == {str(tmp_path / f'{i}.hcl'): {'a': i} for i in range(3)}
+    out = capsys.readouterr().out
+    assert f"Error loading {tmp_path / 'broken.hcl'}" in out
+    assert 'pickle' not in out
+
+def test_read_hcl_cache_corrupt(tmp_path):
+    """Test read_hcl_cache treats entries which can't be decoded as not cached."""
+    cache_file = tmp_path / 'entry.json'
+    cache_file.write_bytes(b'{"inputs": \x80')
+    assert FileOperations.read_hcl_cache(str(cache_file)) is None
+
+def test_write_hcl_cache_private(tmp_path, monkeypatch):
+    """Test write_hcl_cache stores JSON readable only by the current user."""
+    monkeypatch.setattr('velez.file_ops.HCL_CACHE_DIR', str(tmp_path / 'cache'))
+    cache_path = FileOperations.get_hcl_cache_path('a = 1\n')
+    FileOperations.write_hcl_cache(cache_path, {'a': 1})
+    with open(cache_path) as fr:
+        assert json.load(fr) == {'a': 1}
+    assert os.stat(cache_path).st_mode & 0o777 == 0o600
+    assert os.stat(tmp_path / 'cache').st_mode & 0o777 == 0o700
+    assert os.stat(os.path.dirname(cache_path)).st_mode & 0o777 == 0o700
+
+def test_prune_hcl_cache(tmp_path, monkeypatch):
+    """Test prune_hcl_cache evicts least recently used entries."""
+    monkeypatch.setattr('velez.file_ops.HCL_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr('velez.file_ops.HCL_CACHE_SIZE', '1000')
+    for i, name in enumerate(['old', 'new']):
+        (tmp_path / name).write_bytes(b'x' * 600)
+        os.utime(tmp_path / name, (i, i))
+    FileOperations.prune_hcl_cache()
+    assert sorted(os.listdir(tmp_path)) == ['new']
 
 @patch('builtins.open', new_callable=mock_open, read_data='{"key": "value"}')
 def test_load_json_file(mock_file):
@@ -56,3 +139,91 @@ def test_load_json_file(mock_file):
     result = FileOperations.load_json_file('dummy.json')
     assert result == {"key": "value"}
     mock_file.assert_called_once_with('dummy.json', 'r')
+
+def _make_cache(module_dir, size, last_used):
+    """Create a module with a .terragrunt-cache of a given size and last use time."""
+    cache_dir = module_dir / '.terragrunt-cache'
+    cache_dir.mkdir(parents=True)
+    (cache_dir / 'blob').write_bytes(b'x' * size)
+    lock_file = module_dir / '.terraform.lock.hcl'
+    lock_file.write_text('')
+    os.utime(lock_file, (last_used, last_used))
+    os.utime(cache_dir, (last_used, last_used))
+    return cache_dir
+
+def test_gc_caches(tmp_path, file_ops):
+    """Test gc_caches evicts least recently used caches until the budget fits."""
+    old = _make_cache(tmp_path / 'old', 1000, 1_000_000)
+    hot = _make_cache(tmp_path / 'hot', 1000, 2_000_000)
+    evicted = file_ops.gc_caches(str(tmp_path), budget=1500)
+    assert [c['path'] for c in evicted] == [str(old)]
+    assert not old.exists()
+    assert hot.exists()
+
+def test_gc_caches_dry_run(tmp_path, file_ops):
+    """Test gc_caches in dry run mode keeps caches."""
+    old = _make_cache(tmp_path / 'old', 1000, 1_000_000)
+    evicted = file_ops.gc_caches(str(tmp_path), budget=0, dry_run=True)
+    assert [c['path'] for c in evicted] == [str(old)]
+    assert old.exists()
+
+def test_dedup_caches(tmp_path, file_ops):
+    """Test dedup_caches hardlinks identical files across caches when hardlinks are requested."""
+    content = os.urandom(8192)
+    first = _make_cache(tmp_path / 'first', 0, 1_000_000) / 'main.tf'
+    second = _make_cache(tmp_path / 'second', 0, 1_000_000) / 'main.tf'
+    first.write_bytes(content)
+    second.write_bytes(content)
+    for module in ['third', 'fourth']:
+        generated = _make_cache(tmp_path / module, 0, 1_000_000) / 'backend.tf'
+        generated.write_bytes(b'# Generated by Terragrunt' + content)
+    saved = file_ops.dedup_caches(str(tmp_path), mode='hardlink')
+    assert saved == 8192
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert os.stat(generated).st_nlink == 1
+    assert file_ops.dedup_caches(str(tmp_path), mode='hardlink') == 0
+
+def test_link_file_reflink_unsupported(tmp_path, capsys):
+    """Test reflinks not supported by the filesystem don't fall back to hardlinks."""
+    source = tmp_path / 'source'
+    destination = tmp_path / 'destination'
+    source.write_bytes(b'content')
+    destination.write_bytes(b'content')
+    with patch('velez.file_ops.fcntl.ioctl', side_effect=OSError(errno.EOPNOTSUPP, 'Operation not supported')):
+        assert not FileOperations.link_file(str(source), str(destination), 'reflink')
+    assert os.stat(destination).st_nlink == 1
+    assert sorted(os.listdir(tmp_path)) == ['destination', 'source']
+    assert 'Operation not supported' in capsys.readouterr().out
+
+@pytest.mark.parametrize('dry_run', [False, True])
+def test_dedup_caches_reflink_unsupported(tmp_path, file_ops, capsys, dry_run):
+    """Test dedup_caches probes reflinks once, and saves nothing without them, even in a dry run."""
+    for module in ['first', 'second', 'third']:
+        (_make_cache(tmp_path / module, 0, 1_000_000) / 'main.tf').write_bytes(b'x' * 8192)
+    with patch.object(FileOperations, 'supports_reflink', return_value=False) as mock_probe, \
+            patch.object(FileOperations, 'link_file') as mock_link:
+        assert file_ops.dedup_caches(str(tmp_path), mode='reflink', dry_run=dry_run) == 0
+    mock_probe.assert_called_once()
+    mock_link.assert_not_called()
+    out = capsys.readouterr().out
+    assert 'VELEZ_DEDUP_MODE=hardlink' in out
+    assert '0.00 B by deduplicating caches' in out
+
+@pytest.mark.parametrize('extent, linked', [(1, 0), (None, 2)])
+def test_dedup_caches_reflink_shared(tmp_path, file_ops, extent, linked):
+    """Test dedup_caches skips files already sharing their extents with the source, as on reruns."""
+    for module in ['first', 'second', 'third']:
+        (_make_cache(tmp_path / module, 0, 1_000_000) / 'main.tf').write_bytes(b'x' * 8192)
+    with patch.object(FileOperations, 'supports_reflink', return_value=True), \
+            patch.object(FileOperations, 'get_first_extent', return_value=extent), \
+            patch.object(FileOperations, 'link_file', return_value=True) as mock_link:
+        assert file_ops.dedup_caches(str(tmp_path), mode='reflink') == linked * 8192
+    assert mock_link.call_count == linked
+
+def test_list_terragrunt_modules(tmp_path):
+    """Test list_terragrunt_modules skips caches and hidden directories."""
+    for module in ['aws/dev', 'aws/prod', 'aws/dev/.terragrunt-cache/abc']:
+        (tmp_path / module).mkdir(parents=True)
+        (tmp_path / module / 'terragrunt.hcl').write_text('')
+    modules = FileOperations.list_terragrunt_modules(str(tmp_path))
+    assert modules == [str(tmp_path / 'aws/dev'), str(tmp_path / 'aws/prod')]
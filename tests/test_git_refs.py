@@ -0,0 +1,70 @@
+import os
+import subprocess
+
+import pytest
+from velez.git_refs import GitRefs
+
+
+def git(repo, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@a', GIT_COMMITTER_NAME='a',
+               GIT_COMMITTER_EMAIL='a@a')
+    return subprocess.run(['git', '-C', str(repo)] + list(args), check=True, capture_output=True, text=True,
+                          env=env).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, 'init', '-q', '-b', 'main')
+    git(tmp_path, 'commit', '-q', '--allow-empty', '-m', 'initial')
+    git(tmp_path, 'branch', 'feature/a')
+    git(tmp_path, 'update-ref', 'refs/remotes/origin/main', 'HEAD')
+    git(tmp_path, 'symbolic-ref', 'refs/remotes/origin/HEAD', 'refs/remotes/origin/main')
+    git(tmp_path, 'update-ref', 'refs/remotes/upstream/dev', 'HEAD')
+    return tmp_path
+
+
+def test_branches(repo):
+    """Test branches and HEAD are read like git does, from loose and packed refs."""
+    refs = GitRefs(str(repo))
+    assert refs.head() == 'main'
+    assert refs.local_branches() == ['feature/a', 'main']
+    assert refs.remote_branches() == ['origin/main', 'upstream/dev']
+    assert refs.remote_branches('origin') == ['origin/main']
+
+    git(repo, 'pack-refs', '--all')
+    git(repo, 'branch', 'loose')
+    assert refs.local_branches() == ['feature/a', 'loose', 'main']
+    git(repo, 'branch', '-D', 'feature/a')
+    assert refs.local_branches() == ['loose', 'main']
+    assert refs.list_refs('refs/heads/')['refs/heads/main'] == git(repo, 'rev-parse', 'main')
+
+    git(repo, 'checkout', '-q', 'loose')
+    assert refs.head() == 'loose'
+    git(repo, 'checkout', '-q', '--detach')
+    assert refs.head() == 'HEAD'
+
+
+def test_worktree(repo, tmp_path_factory):
+    """Test refs of a linked worktree come from the main repository."""
+    worktree = tmp_path_factory.mktemp('worktree') / 'wt'
+    git(repo, 'worktree', 'add', '-q', '-b', 'wt-branch', str(worktree))
+    refs = GitRefs(str(worktree))
+    assert refs.head() == 'wt-branch'
+    assert refs.local_branches() == ['feature/a', 'main', 'wt-branch']
+
+
+def test_remotes(repo):
+    """Test remotes and their URLs are read from git config."""
+    git(repo, 'remote', 'add', 'origin', 'git@github.com:org/repo.git')
+    git(repo, 'remote', 'add', 'upstream', 'https://github.com/upstream/repo.git')
+    refs = GitRefs(str(repo))
+    assert refs.remotes() == ['origin', 'upstream']
+    assert refs.remote_url('origin') == 'git@github.com:org/repo.git'
+    assert refs.remote_url('upstream') == 'https://github.com/upstream/repo.git'
+    assert refs.remote_url('missing') is None
+
+
+def test_not_a_repository(tmp_path):
+    """Test an error is raised outside of a git repository."""
+    with pytest.raises(ValueError):
+        GitRefs(str(tmp_path))
@@ -0,0 +1,112 @@
+import os
+from unittest.mock import patch
+
+import pytest
+import requests
+from velez.github_cache import CachingHTTPAdapter, CachingHTTPSConnection, ResponseCache, install_cache
+
+
+def make_response(status, body=b'', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response.encoding = 'utf-8'
+    return response
+
+
+def make_request(url='https://api.github.com/repos/o/r', method='GET', token='token a'):
+    return requests.Request(method, url, headers={'Authorization': token}).prepare()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path), '1MB')
+
+
+def test_revalidate(cache):
+    """Test responses are cached and served from the cache when not modified."""
+    adapter = CachingHTTPAdapter(cache)
+    sent = []
+    responses = [make_response(200, b'{"a": 1}', {'ETag': '"v1"', 'X-RateLimit-Remaining': '10'}),
+                 make_response(304, headers={'X-RateLimit-Remaining': '9'})]
+
+    def send(self, request, **kwargs):
+        sent.append(dict(request.headers))
+        return responses.pop(0)
+
+    with patch('requests.adapters.HTTPAdapter.send', send):
+        assert adapter.send(make_request()).json() == {'a': 1}
+        response = adapter.send(make_request())
+    assert 'If-None-Match' not in sent[0]
+    assert sent[1]['If-None-Match'] == '"v1"'
+    assert response.status_code == 200
+    assert response.json() == {'a': 1}
+    assert response.headers['X-RateLimit-Remaining'] == '9'
+    assert cache.stats == {'hits': 1, 'misses': 1, 'uncached': 0}
+
+
+def test_passthrough(cache):
+    """Test non-GET, already conditional and uncacheable requests are not cached."""
+    adapter = CachingHTTPAdapter(cache)
+    with patch('requests.adapters.HTTPAdapter.send', return_value=make_response(304)) as mock_send:
+        request = make_request()
+        request.headers['If-None-Match'] = '"x"'
+        assert adapter.send(request).status_code == 304
+    with patch('requests.adapters.HTTPAdapter.send', return_value=make_response(201, headers={'ETag': '"v"'})):
+        adapter.send(make_request(method='POST'))
+    with patch('requests.adapters.HTTPAdapter.send', return_value=make_response(200)):
+        adapter.send(make_request())
+    mock_send.assert_called_once()
+    assert cache.stats == {'hits': 0, 'misses': 0, 'uncached': 1}
+    assert not any(files for _, _, files in os.walk(cache.cache_dir))
+
+
+def test_binary_content(cache, tmp_path):
+    """Test binary responses are cached byte for byte, in files readable only by the user."""
+    adapter = CachingHTTPAdapter(cache)
+    content = bytes(range(256))
+    responses = [make_response(200, content, {'ETag': '"v1"', 'Content-Type': 'application/octet-stream'}),
+                 make_response(304)]
+    responses[0].encoding = None
+    with patch('requests.adapters.HTTPAdapter.send', lambda self, request, **kwargs: responses.pop(0)):
+        adapter.send(make_request())
+        assert adapter.send(make_request()).content == content
+    path = cache.get_path(cache.get_key(make_request()))
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.stat(tmp_path).st_mode & 0o777 == 0o700
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+def test_get_key():
+    """Test cache keys differ per URL and token."""
+    assert ResponseCache.get_key(make_request()) == ResponseCache.get_key(make_request())
+    assert ResponseCache.get_key(make_request()) != ResponseCache.get_key(make_request(token='token b'))
+    assert ResponseCache.get_key(make_request()) != ResponseCache.get_key(make_request(url='https://api.github.com/x'))
+
+
+def test_prune(cache):
+    """Test least recently used entries are evicted first."""
+    for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+        cache.write(key, make_response(200, b'x' * 50, {'ETag': f'"{i}"'}))
+        os.utime(cache.get_path(key), (i, i))
+    cache.max_size = os.path.getsize(cache.get_path('aa1')) * 2
+    cache.read('aa1')
+    cache.prune()
+    assert cache.read('aa1') is not None
+    assert cache.read('bb2') is None
+    assert cache.read('cc3') is not None
+
+
+def test_install_cache_keeps_hooks(cache, monkeypatch):
+    """Test installing the cache again reuses the installed cache and adds hooks instead of replacing them."""
+    monkeypatch.setattr(CachingHTTPSConnection, 'cache', None)
+    monkeypatch.setattr(CachingHTTPSConnection, 'hooks', [])
+    monkeypatch.setattr(CachingHTTPSConnection, 'session', None)
+    first, second = lambda r, *a, **k: r, lambda r, *a, **k: r
+    assert install_cache(cache, hooks=[first]) is cache
+    session = CachingHTTPSConnection('api.github.com').session
+    assert install_cache(hooks=[second]) is cache
+    assert install_cache(hooks=[second]) is cache
+    assert CachingHTTPSConnection.hooks == [first, second]
+    assert CachingHTTPSConnection('api.github.com').session is session
+    assert session.hooks['response'] == [first, second]
@@ -0,0 +1,56 @@
+import pytest
+
+from velez.history import ExecutionHistory, percentile
+
+
+@pytest.fixture
+def history(tmp_path):
+    return ExecutionHistory(str(tmp_path / 'history.sqlite'))
+
+
+def test_get_command_name():
+    """Test get_command_name strips flags and keeps state subcommands."""
+    assert ExecutionHistory.get_command_name(['run', 'plan', '-target', 'x']) == 'plan'
+    assert ExecutionHistory.get_command_name(['run', 'state', 'list']) == 'state list'
+    assert ExecutionHistory.get_command_name(['render-json', '--out', 'x.json']) == 'render-json'
+
+
+def test_percentile():
+    """Test percentile interpolates between ranks."""
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2], 50) == 1.5
+    assert percentile([10], 95) == 10
+
+
+def test_estimate(history):
+    """Test estimate uses recent successful runs only."""
+    assert history.estimate('aws/dev', 'plan') is None
+    for wall_time, exit_code in [(10, 0), (20, 0), (300, 1), (30, 0)]:
+        history.record('aws/dev', ['run', 'plan'], exit_code, wall_time, 1.0, 1024, 100)
+    assert history.estimate('aws/dev', 'plan') == 20
+    assert history.trend('aws/dev', 'plan') == [10, 20, 300, 30]
+
+
+def test_stats(history):
+    """Test command_stats and slowest_modules."""
+    history.record('aws/dev', ['run', 'plan'], 0, 10, 1.0, 1024, 100)
+    history.record('aws/prod', ['run', 'plan'], 1, 30, 2.0, 2048, 100)
+    history.record('gcp/dev', ['run', 'apply'], 0, 60, 3.0, 4096, 100)
+    assert history.command_stats('aws') == [{'command': 'plan', 'runs': 2, 'failures': 1, 'p50': 20, 'p95': 29}]
+    slowest = history.slowest_modules()
+    assert [(m['module'], m['command']) for m in slowest] == [('gcp/dev', 'apply'), ('aws/prod', 'plan'),
+                                                              ('aws/dev', 'plan')]
+    assert slowest[0]['max_rss'] == 4096
+
+
+def test_unwritable_history(tmp_path, capsys):
+    """Test history is disabled if its database can't be created, without failing."""
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    history = ExecutionHistory(str(blocker / 'history.sqlite'))
+    assert 'Error opening run history' in capsys.readouterr().out
+    history.record('aws/dev', ['run', 'plan'], 0, 10, 1.0, 1024, 100)
+    assert history.estimate('aws/dev', 'plan') is None
+    assert history.command_stats() == []
+    assert history.slowest_modules() == []
+    assert history.trend('aws/dev', 'plan') == []
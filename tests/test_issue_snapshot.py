@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from velez.issue_snapshot import IssueSnapshot
+
+
+def make_issue(number, state='open', labels=(), assignees=(), repo='org/a', pull_request=None):
+    issue = MagicMock(number=number, state=state, title=f"Issue {number}", html_url=f"http://example.com/{number}",
+                      pull_request=pull_request, updated_at=datetime(2024, 1, number, tzinfo=timezone.utc))
+    issue.repository.full_name = repo
+    issue.labels = [MagicMock() for _ in labels]
+    for label, name in zip(issue.labels, labels):
+        label.name = name
+    issue.assignees = [MagicMock(login=login) for login in assignees]
+    return issue
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return IssueSnapshot(str(tmp_path / 'issues.sqlite'))
+
+
+def test_sync(snapshot):
+    """Test first sync fetches open issues, next syncs fetch only updated issues and remove closed ones."""
+    org = MagicMock(login='org')
+    org.get_issues.return_value = [make_issue(1, labels=['bug'], assignees=['alice']), make_issue(2, repo='org/b'),
+                                   make_issue(3, pull_request=MagicMock())]
+    assert snapshot.sync(org) == (2, 0)
+    org.get_issues.assert_called_once_with(filter='all', state='open')
+    assert snapshot.get_synced_at('org') is not None
+
+    org.get_issues.reset_mock()
+    org.get_issues.return_value = [make_issue(2, state='closed', repo='org/b'), make_issue(4, labels=['bug'])]
+    assert snapshot.sync(org) == (1, 1)
+    assert org.get_issues.call_args.kwargs['state'] == 'all'
+    assert 'since' in org.get_issues.call_args.kwargs
+    assert [i['number'] for i in snapshot.list_issues('org')] == [4, 1]
+
+
+def test_list_issues(snapshot):
+    """Test filtering issues by repository, label and assignee."""
+    org = MagicMock(login='org')
+    org.get_issues.return_value = [make_issue(1, labels=['bug', 'p1'], assignees=['alice']),
+                                   make_issue(2, labels=['bug'], repo='org/b'), make_issue(3, assignees=['bob'])]
+    snapshot.sync(org)
+    assert [i['number'] for i in snapshot.list_issues('org', repo='b')] == [2]
+    assert [i['number'] for i in snapshot.list_issues('org', label='bug')] == [2, 1]
+    assert [i['number'] for i in snapshot.list_issues('org', label='bug', assignee='alice')] == [1]
+    assert snapshot.list_issues('org', label='bu') == []
+    assert snapshot.list_issues('other') == []
+    assert snapshot.list_issues('org', repo='org/a', assignee='bob')[0]['labels'] == []
+
+
+def test_full_sync(snapshot, monkeypatch):
+    """Test all open issues are fetched again after the TTL, removing issues which updates never return."""
+    org = MagicMock(login='org')
+    org.get_issues.return_value = [make_issue(1), make_issue(2)]
+    snapshot.sync(org)
+    with snapshot.connect() as conn:
+        conn.execute('UPDATE full_syncs SET synced_at = ?',
+                     ((datetime.now(timezone.utc) - timedelta(days=2)).isoformat(),))
+    monkeypatch.setattr('velez.issue_snapshot.ISSUES_FULL_SYNC_TTL', 86400)
+    org.get_issues.return_value = [make_issue(1)]
+    assert snapshot.sync(org) == (1, 1)
+    org.get_issues.assert_called_with(filter='all', state='open')
+    assert [i['number'] for i in snapshot.list_issues('org')] == [1]
+    snapshot.sync(org)
+    assert 'since' in org.get_issues.call_args.kwargs
+
+
+def test_unwritable_snapshot(tmp_path, capsys):
+    """Test issues are synchronized in memory if the database can't be created, without failing."""
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    snapshot = IssueSnapshot(str(blocker / 'issues.sqlite'))
+    assert 'Error opening issue snapshot' in capsys.readouterr().out
+    org = MagicMock(login='org')
+    org.get_issues.return_value = [make_issue(1), make_issue(2, labels=['bug'])]
+    assert snapshot.sync(org) == (2, 0)
+    assert [i['number'] for i in snapshot.list_issues('org', label='bug')] == [2]
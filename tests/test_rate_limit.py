@@ -0,0 +1,74 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import github
+from velez.rate_limit import RateLimitController
+
+
+def make_response(status=200, remaining=None, reset=0, retry_after=None):
+    headers = {}
+    if remaining is not None:
+        headers.update({'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(reset)})
+    if retry_after is not None:
+        headers['Retry-After'] = str(retry_after)
+    return MagicMock(status_code=status, headers=headers)
+
+
+def test_observe_adjusts_concurrency():
+    """Test concurrency is halved on rate limit and grows back after rounds of successful responses."""
+    controller = RateLimitController(max_workers=8, reserve=0)
+    controller.observe(make_response(403, remaining=4000, retry_after=60))
+    assert controller.concurrency == 4
+    assert controller.paused_until > time.time() + 50
+    for _ in range(4 + 5):
+        controller.observe(make_response(200, remaining=3999))
+    assert controller.concurrency == 6
+    controller.observe(make_response(404))
+    assert controller.concurrency == 6
+
+
+def test_get_delay():
+    """Test delays spread the remaining quota over the time left until reset."""
+    now = 1000.0
+    controller = RateLimitController(reserve=10)
+    assert controller.get_delay(now) == 0
+    controller.observe(make_response(200, remaining=110, reset=now + 100))
+    controller.pending = 50
+    assert controller.get_delay(now) == 0
+    controller.pending = 500
+    controller.last_start = now
+    assert controller.get_delay(now) == 1.0
+    controller.remaining = 10
+    assert controller.get_delay(now) == 100
+    controller.paused_until = now + 5
+    assert controller.get_delay(now) == 5
+
+
+def test_map():
+    """Test all items are processed within the concurrency limit, and items hitting the rate limit are retried."""
+    controller = RateLimitController(max_workers=4)
+    controller.concurrency = 2
+    running, peak, attempts = [0], [0], {}
+    lock = threading.Lock()
+
+    def fn(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            attempts[item] = attempts.get(item, 0) + 1
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if item == 3 and attempts[item] == 1:
+            raise github.RateLimitExceededException(403, {}, {})
+        if item == 4:
+            raise ValueError('boom')
+        return item * 10
+
+    results = dict(controller.map(fn, [1, 2, 3, 4, 5]))
+    assert {k: v for k, v in results.items() if k != 4} == {1: 10, 2: 20, 3: 30, 5: 50}
+    assert isinstance(results[4], ValueError)
+    assert attempts[3] == 2
+    assert peak[0] <= 2
+    assert controller.running == 0 and controller.pending == 0
@@ -0,0 +1,35 @@
+from velez.run_checkpoint import RunCheckpoint, hash_module_inputs
+
+
+def test_checkpoint(tmp_path):
+    """Test entries are recorded, the last entry of a module wins and a truncated line is ignored."""
+    checkpoint = RunCheckpoint('aws', ['plan'], checkpoint_dir=str(tmp_path))
+    assert not checkpoint.exists()
+    checkpoint.start(['aws/a', 'aws/b'])
+    checkpoint.record('aws/a', 'failed', 'h1', 1.0)
+    checkpoint.record('aws/a', 'succeeded', 'h2', 2.0)
+    with open(checkpoint.path, 'a') as fw:
+        fw.write('{"module": "aws/b", "sta')
+    assert checkpoint.exists()
+    assert checkpoint.load() == {'aws/a': {'module': 'aws/a', 'status': 'succeeded', 'input_hash': 'h2',
+                                           'duration': 2.0}}
+    checkpoint.start(['aws/b'], resume=True)
+    assert 'aws/a' in checkpoint.load()
+    checkpoint.start(['aws/a', 'aws/b'])
+    assert checkpoint.load() == {}
+    assert RunCheckpoint('aws', ['apply'], checkpoint_dir=str(tmp_path)).path != checkpoint.path
+
+
+def test_hash_module_inputs(tmp_path):
+    """Test hash changes with module files, configuration and arguments, but not with caches or nested modules."""
+    (tmp_path / 'terragrunt.hcl').write_text('inputs = {}')
+    initial = hash_module_inputs(str(tmp_path), {'inputs': {}}, ['plan'])
+    (tmp_path / '.terragrunt-cache').mkdir()
+    (tmp_path / '.terragrunt-cache' / 'main.tf').write_text('x')
+    (tmp_path / 'nested').mkdir()
+    (tmp_path / 'nested' / 'terragrunt.hcl').write_text('x')
+    assert hash_module_inputs(str(tmp_path), {'inputs': {}}, ['plan']) == initial
+    assert hash_module_inputs(str(tmp_path), {'inputs': {'a': 1}}, ['plan']) != initial
+    assert hash_module_inputs(str(tmp_path), {'inputs': {}}, ['apply']) != initial
+    (tmp_path / 'terragrunt.hcl').write_text('inputs = {a = 1}')
+    assert hash_module_inputs(str(tmp_path), {'inputs': {}}, ['plan']) != initial
@@ -0,0 +1,86 @@
+import threading
+
+from velez.run_queue import RunQueue, STATUS_SUCCEEDED, STATUS_FAILED, STATUS_LOCKED, STATUS_SKIPPED
+
+
+def test_run():
+    """Test all modules are run and failures are recorded."""
+    queue = RunQueue(lambda m: m != 'b', lambda m: None, workers=2)
+    results = queue.run(['a', 'b', 'c'])
+    assert {m: r['status'] for m, r in results.items()} == {
+        'a': STATUS_SUCCEEDED, 'b': STATUS_FAILED, 'c': STATUS_SUCCEEDED}
+
+
+def test_run_waits_for_lock():
+    """Test a locked module is parked while other modules run, and run once unlocked."""
+    order = []
+    lock = threading.Lock()
+    checks = {'a': 0}
+
+    def run_module(module):
+        with lock:
+            order.append(module)
+        return True
+
+    def get_lock(module):
+        if module == 'a':
+            checks['a'] += 1
+            return 'someone' if checks['a'] < 3 else None
+        return None
+
+    queue = RunQueue(run_module, get_lock, workers=1, poll_interval=0.01, max_poll_interval=0.02)
+    results = queue.run(['a', 'b', 'c'])
+    assert order[-1] == 'a'
+    assert sorted(order) == ['a', 'b', 'c']
+    assert results['a']['status'] == STATUS_SUCCEEDED
+
+
+def test_run_lock_timeout():
+    """Test a module locked for too long is given up."""
+    queue = RunQueue(lambda m: True, lambda m: 'someone' if m == 'a' else None, workers=2, poll_interval=0.01,
+                     max_poll_interval=0.01, lock_timeout=0.05)
+    results = queue.run(['a', 'b'])
+    assert results['a']['status'] == STATUS_LOCKED
+    assert results['b']['status'] == STATUS_SUCCEEDED
+
+
+def test_get_eta():
+    """Test get_eta spreads remaining estimates over workers, using the average for unknown modules."""
+    queue = RunQueue(lambda m: True, lambda m: None, workers=2, estimates={'a': 10, 'b': 30, 'c': None})
+    assert queue.get_eta(['b', 'c'], {}) == 25
+    assert queue.get_eta([], {}) == 0
+    assert RunQueue(lambda m: True, lambda m: None).get_eta(['a'], {}) is None
+
+
+def test_run_dependencies():
+    """Test modules run after their dependencies, and dependents of failed modules are skipped."""
+    order = []
+    queue = RunQueue(lambda m: order.append(m) or m != 'c', lambda m: None, workers=4,
+                     dependencies={'b': {'a'}, 'c': {'b'}, 'd': {'c'}, 'e': {'d', 'a'}})
+    results = queue.run(['e', 'd', 'c', 'b', 'a'])
+    assert order == ['a', 'b', 'c']
+    assert {m: r['status'] for m, r in results.items()} == {
+        'a': STATUS_SUCCEEDED, 'b': STATUS_SUCCEEDED, 'c': STATUS_FAILED, 'd': STATUS_SKIPPED, 'e': STATUS_SKIPPED}
+
+
+def test_run_dependency_cycle():
+    """Test modules in a dependency cycle are skipped."""
+    results = RunQueue(lambda m: True, lambda m: None, dependencies={'a': {'b'}, 'b': {'a'}}).run(['a', 'b', 'c'])
+    assert {m: r['status'] for m, r in results.items()} == {
+        'a': STATUS_SKIPPED, 'b': STATUS_SKIPPED, 'c': STATUS_SUCCEEDED}
+
+
+def test_get_priorities():
+    """Test priorities are the estimated durations of the longest path through dependents."""
+    queue = RunQueue(lambda m: True, lambda m: None, estimates={'a': 10, 'b': 5, 'c': 50, 'd': None},
+                     dependencies={'b': {'a'}, 'c': {'a'}})
+    assert queue.get_priorities(['a', 'b', 'c', 'd']) == {'a': 60, 'b': 5, 'c': 50, 'd': 65 / 3}
+
+
+def test_run_critical_path_first():
+    """Test the ready module starting the longest chain is dispatched first."""
+    order = []
+    queue = RunQueue(lambda m: order.append(m) or True, lambda m: None, workers=1,
+                     estimates={'short': 10, 'long': 10, 'tail': 100}, dependencies={'tail': {'long'}})
+    queue.run(['short', 'long', 'tail'])
+    assert order == ['long', 'tail', 'short']
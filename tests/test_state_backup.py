@@ -0,0 +1,55 @@
+import hashlib
+from datetime import datetime
+from unittest.mock import patch
+
+from velez.state_backup import StateBackup
+
+
+def test_store_and_read(tmp_path):
+    """Test storing a state and reading it back."""
+    store = StateBackup(str(tmp_path))
+    assert store.find('bucket', 'aws/terraform.tfstate', 'etag1') is None
+    name = store.store('bucket', 'aws/terraform.tfstate', 'etag1', b'{"serial": 1}')
+    assert store.find('bucket', 'aws/terraform.tfstate', 'etag1') == name
+    assert store.read(name) == b'{"serial": 1}'
+
+
+def test_store_deduplicates_content(tmp_path):
+    """Test storing the same content under different keys keeps a single object."""
+    store = StateBackup(str(tmp_path))
+    first = store.store('bucket', 'a/terraform.tfstate', 'etag1', b'{}')
+    second = store.store('bucket', 'b/terraform.tfstate', 'etag2', b'{}')
+    assert first == second
+    assert len(list((tmp_path / 'objects').iterdir())) == 1
+
+
+def test_store_finds_other_compression(tmp_path):
+    """Test content stored with the other compression is found without listing the objects directory."""
+    store = StateBackup(str(tmp_path))
+    digest = hashlib.sha256(b'{}').hexdigest()
+    (tmp_path / 'objects' / f"{digest}.tfstate.zst").write_bytes(b'compressed')
+    with patch('velez.state_backup.os.listdir', side_effect=AssertionError('listdir')):
+        assert store.store('bucket', 'a/terraform.tfstate', 'etag1', b'{}') == f"{digest}.tfstate.zst"
+    assert len(list((tmp_path / 'objects').iterdir())) == 1
+
+def test_snapshots(tmp_path):
+    """Test saving and loading snapshots, with the index persisted."""
+    store = StateBackup(str(tmp_path))
+    name = store.store('bucket', 'aws/terraform.tfstate', 'etag1', b'{}')
+    entries = {'aws': {'bucket': 'bucket', 'key': 'aws/terraform.tfstate', 'etag': 'etag1', 'object': name}}
+    snapshot = store.save_snapshot(entries)
+    assert store.list_snapshots() == [snapshot]
+    assert store.load_snapshot(snapshot) == entries
+    assert StateBackup(str(tmp_path)).find('bucket', 'aws/terraform.tfstate', 'etag1') == name
+
+
+def test_snapshots_same_second(tmp_path):
+    """Test snapshots saved within the same second don't overwrite each other."""
+    store = StateBackup(str(tmp_path))
+    with patch('velez.state_backup.datetime') as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 1, 1, 12, 0, 0, 123456)
+        first = store.save_snapshot({'a': {}})
+        second = store.save_snapshot({'b': {}})
+    assert first != second
+    assert store.list_snapshots() == [second, first]
+    assert store.load_snapshot(first) == {'a': {}}
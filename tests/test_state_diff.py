@@ -0,0 +1,49 @@
+import json
+
+import velez.state_diff
+from velez.state_diff import STR_IJSON_MISSING, diff_states, get_instance_address, iter_state_instances
+
+
+def _write_state(path, resources):
+    """Write a minimal state file with given resources."""
+    path.write_text(json.dumps({'version': 4, 'serial': 1, 'resources': resources}))
+    return str(path)
+
+
+def test_get_instance_address():
+    """Test get_instance_address with modules, data sources and index keys."""
+    resource = {'module': 'module.app', 'mode': 'data', 'type': 'aws_ami', 'name': 'this'}
+    assert get_instance_address(resource, {'index_key': 0}) == 'module.app.data.aws_ami.this[0]'
+    resource = {'mode': 'managed', 'type': 'aws_instance', 'name': 'a'}
+    assert get_instance_address(resource, {'index_key': 'x'}) == 'aws_instance.a["x"]'
+    assert get_instance_address(resource, {}) == 'aws_instance.a'
+
+
+def test_diff_states(tmp_path):
+    """Test diff_states finds added, removed and changed instances with changed attributes."""
+    old = _write_state(tmp_path / 'old.tfstate', [
+        {'mode': 'managed', 'type': 'aws_instance', 'name': 'a', 'instances': [
+            {'attributes': {'id': 'i-1', 'type': 't3.small', 'tags': {'a': '1'}}}]},
+        {'mode': 'managed', 'type': 'aws_eip', 'name': 'e', 'instances': [{'attributes': {'id': 'e-1'}}]},
+    ])
+    new = _write_state(tmp_path / 'new.tfstate', [
+        {'mode': 'managed', 'type': 'aws_instance', 'name': 'a', 'instances': [
+            {'attributes': {'id': 'i-1', 'type': 't3.large', 'tags': {'a': '1'}, 'ebs': True}}]},
+        {'mode': 'managed', 'type': 'aws_s3_bucket', 'name': 'b', 'instances': [{'attributes': {'id': 'b'}}]},
+    ])
+    assert diff_states(old, new) == {
+        'added': ['aws_s3_bucket.b'],
+        'removed': ['aws_eip.e'],
+        'changed': {'aws_instance.a': {'ebs': (None, True), 'type': ('t3.small', 't3.large')}},
+    }
+
+
+def test_iter_state_instances_without_ijson(tmp_path, monkeypatch, capsys):
+    """Test states are loaded whole with a single warning when ijson is not installed."""
+    monkeypatch.setattr(velez.state_diff, 'ijson', None)
+    monkeypatch.setattr(velez.state_diff, 'ijson_warned', False)
+    state = _write_state(tmp_path / 'state.tfstate', [
+        {'mode': 'managed', 'type': 'aws_eip', 'name': 'e', 'instances': [{'attributes': {'id': 'e-1'}}]}])
+    assert list(iter_state_instances(state)) == [('aws_eip.e', {'id': 'e-1'})]
+    assert list(iter_state_instances(state)) == [('aws_eip.e', {'id': 'e-1'})]
+    assert capsys.readouterr().out.count(STR_IJSON_MISSING) == 1
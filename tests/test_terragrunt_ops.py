@@ -1,15 +1,24 @@
-from unittest.mock import patch
+import json
+import os
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
 
 import pytest
+from velez.history import ExecutionHistory
+from velez.state_backup import StateBackup
 from velez.terragrunt_ops import TerragruntOperations
 from velez.velez import Velez
 
 
+USAGE = {'wall_time': 1.0, 'cpu_time': 0.5, 'max_rss': 1024}
+
+
 @pytest.fixture
 def terragrunt_ops():
     velez = Velez()
     return TerragruntOperations(velez)
 
+
 @patch('velez.terragrunt_ops.run_command')
 def test_get_terraform_version(mock_run_command, terragrunt_ops):
     """Test get_terraform_version method."""
@@ -86,7 +95,7 @@ def test_refresh_action(mock_run_command, terragrunt_ops):
     mock_run_command.assert_called_once_with(['refresh'])
 
 
-@patch('velez.terragrunt_ops.run_command')
+@patch('velez.terragrunt_ops.run_command_with_status', return_value=(0, '', '', USAGE))
 @patch('velez.terragrunt_ops.FileOperations.load_json_file', return_value={})
 def test_load_terragrunt_config(mock_load_json_file, mock_run_command, terragrunt_ops):
     """Test load_terragrunt_config method."""
@@ -97,8 +106,318 @@ def test_load_terragrunt_config(mock_load_json_file, mock_run_command, terragrun
     mock_load_json_file.assert_called_once_with(terragrunt_ops.temp_config)
 
 
-@patch('velez.terragrunt_ops.run_command')
+@patch('velez.terragrunt_ops.run_command_with_status', return_value=(0, '', '', USAGE))
 def test_run_terragrunt(mock_run_command, terragrunt_ops):
     """Test run_terragrunt method."""
     terragrunt_ops.run_terragrunt(['plan'])
     mock_run_command.assert_called_once_with(['terragrunt', 'plan'], quiet=False)
+
+
+def test_run_terragrunt_history(tmp_path, monkeypatch):
+    """Test the history is opened on first use and internal runs are not recorded."""
+    ops = TerragruntOperations.__new__(TerragruntOperations)
+    ops._history, ops.module, ops.terraform_source, ops.state_addresses = None, 'aws/dev', None, {}
+    monkeypatch.setattr('velez.terragrunt_ops.ExecutionHistory',
+                        lambda: ExecutionHistory(str(tmp_path / 'history.sqlite')))
+    with patch.object(ops, 'build_terragrunt_command', side_effect=lambda args, *rest: ['terragrunt'] + args), \
+            patch('velez.terragrunt_ops.run_command_with_status', return_value=(0, '', '', USAGE)):
+        ops.run_terragrunt(['render-json', '--out', 'x.json'], quiet=True, record=False)
+        assert ops._history is None
+        ops.run_terragrunt(['run', 'plan'], wait=False)
+    assert ops.history.trend('aws/dev', 'plan') == [1.0]
+    assert ops.history.trend('aws/dev', 'render-json') == []
+
+
+@pytest.mark.parametrize('command', [['apply'], ['destroy', '-target=x']])
+def test_run_all_requires_auto_approve(command, capsys):
+    """Test run-all apply and destroy are rejected without -auto-approve, instead of failing in every module."""
+    velez = Velez()
+    with patch('velez.velez.TerragruntOperations') as mock_ops, pytest.raises(SystemExit) as exit_info:
+        velez.run(terragrunt=True, pos_args=['run-all', 'aws'] + command)
+    assert exit_info.value.code == 2
+    mock_ops.assert_not_called()
+    assert '-auto-approve' in capsys.readouterr().out
+
+
+def test_get_state_addresses():
+    """Test state addresses are cached, but failed reads are not."""
+    ops = TerragruntOperations.__new__(TerragruntOperations)
+    ops.module, ops.state_addresses = 'aws/dev', {}
+    results = [(1, '', 'Error: no credentials'), (0, 'aws_instance.a\naws_eip.e\n', ''), (0, '', '')]
+    with patch.object(ops, 'run_terragrunt_with_status', side_effect=results) as mock_run:
+        assert ops.get_state_addresses() == []
+        assert ops.get_state_addresses() == ['aws_instance.a', 'aws_eip.e']
+        assert ops.get_state_addresses() == ['aws_instance.a', 'aws_eip.e']
+    assert mock_run.call_count == 2
+
+
+def test_parse_git_source():
+    """Test parse_git_source method."""
+    assert TerragruntOperations.parse_git_source(
+        '"git::https://github.com/org/repo.git//modules/vpc?ref=v1.2.3"') == (
+        'git::https://github.com/org/repo.git', 'v1.2.3')
+    assert TerragruntOperations.parse_git_source('git::git@github.com:org/repo.git?ref=main') == (
+        'git::git@github.com:org/repo.git', 'main')
+    assert TerragruntOperations.parse_git_source('git::https://github.com/org/repo.git//modules/vpc') is None
+    assert TerragruntOperations.parse_git_source('../modules/vpc') is None
+    assert TerragruntOperations.parse_git_source(None) is None
+
+
+def test_parse_state_operations():
+    """Test parse_state_operations method."""
+    lines = ['# refactor\n', 'mv aws_s3_bucket.a module.s3.aws_s3_bucket.a\n', '\n', 'rm-re aws_iam_.*\n']
+    assert TerragruntOperations.parse_state_operations(lines) == [
+        ('mv', 'aws_s3_bucket.a', 'module.s3.aws_s3_bucket.a'),
+        ('rm-re', 'aws_iam_.*'),
+    ]
+    with pytest.raises(ValueError):
+        TerragruntOperations.parse_state_operations(['mv aws_s3_bucket.a'])
+    assert TerragruntOperations.parse_state_operations(['rm \'aws_s3_bucket.b["a b"]\'']) == [
+        ('rm', 'aws_s3_bucket.b["a b"]')]
+    with pytest.raises(ValueError):
+        TerragruntOperations.parse_state_operations(['rm "aws_s3_bucket.b'])
+
+
+def test_expand_state_operations():
+    """Test expand_state_operations method."""
+    addresses = ['aws_s3_bucket.a', 'aws_s3_bucket.b', 'aws_iam_role.r["x"]']
+    operations = [('mv-re', r'aws_s3_bucket\.(.*)', r'module.s3.aws_s3_bucket.\1'), ('rm-re', r'aws_iam_role\..*'),
+                  ('rm', 'aws_instance.i')]
+    assert TerragruntOperations.expand_state_operations(operations, addresses) == [
+        ('mv', 'aws_s3_bucket.a', 'module.s3.aws_s3_bucket.a'),
+        ('mv', 'aws_s3_bucket.b', 'module.s3.aws_s3_bucket.b'),
+        ('rm', 'aws_iam_role.r["x"]'),
+        ('rm', 'aws_instance.i'),
+    ]
+
+
+def test_simulate_state_operations():
+    """Test simulate_state_operations applies chained moves and removals to modules and resources."""
+    addresses = ['aws_instance.a', 'aws_eip.e[0]', 'aws_eip.e[1]', 'module.app.aws_s3_bucket.b']
+    operations = [('mv', 'aws_instance.a', 'aws_instance.b'), ('rm', 'aws_instance.b'),
+                  ('mv', 'aws_eip.e', 'aws_eip.f'), ('mv', 'module.app', 'module.web')]
+    assert TerragruntOperations.simulate_state_operations(addresses, operations) == {
+        'aws_eip.f[0]', 'aws_eip.f[1]', 'module.web.aws_s3_bucket.b'}
+
+
+def _edit_state_ops(tmp_path, monkeypatch, **attributes):
+    """Create TerragruntOperations for edit_state without loading a module."""
+    monkeypatch.setattr('velez.terragrunt_ops.STATE_BACKUP_DIR', str(tmp_path))
+    ops = TerragruntOperations.__new__(TerragruntOperations)
+    ops.module, ops.state_addresses = 'aws/dev', {}
+    ops.terraform_version, ops.opentofu_version = '1.9.0', None
+    ops.use_s3_backend, ops.s3_bucket_name, ops.s3_state_key = True, 'b', 'aws/dev/terraform.tfstate'
+    ops.use_dynamodb_locks, ops.dynamodb_table, ops.use_s3_lockfile = False, None, False
+    for name, value in attributes.items():
+        setattr(ops, name, value)
+    return ops
+
+
+@pytest.mark.parametrize('rm_result, pushed', [((0, 'Removed b', 'Warning: deprecated'), True), ((1, '', ''), False)])
+def test_state_batch_exit_codes(tmp_path, monkeypatch, rm_result, pushed):
+    """Test state_batch judges local state commands by their exit code, not by output on stderr."""
+    ops = _edit_state_ops(tmp_path, monkeypatch)
+    ops.velez = MagicMock(get_tf_ot=lambda: 'terraform')
+    results = [(0, 'a\nb["x y"]\n', 'Warning: deprecated', None), rm_result + (None,), (0, 'a\n', '', None)]
+    with patch('velez.terragrunt_ops.run_command_with_status', side_effect=results) as mock_run, \
+            patch.object(ops, 'edit_state', side_effect=lambda operation, edit: edit(str(tmp_path / 'state'))):
+        assert ops.state_batch([('rm', 'b["x y"]')]) == pushed
+    assert mock_run.call_args_list[1].args[0][-1] == 'b["x y"]'
+
+
+def test_edit_state_without_locking(tmp_path, monkeypatch):
+    """Test edit_state refuses to edit a state which can't be locked."""
+    ops = _edit_state_ops(tmp_path, monkeypatch)
+    with patch.object(ops, 'run_terragrunt_with_status') as mock_run:
+        assert not ops.edit_state('test', lambda path: True)
+    mock_run.assert_not_called()
+
+
+def test_edit_state_push_failure(tmp_path, monkeypatch):
+    """Test edit_state holds the S3 lock file for the whole cycle, detects a failed push and keeps the original."""
+    ops = _edit_state_ops(tmp_path, monkeypatch, use_s3_lockfile=True)
+    state = json.dumps({'lineage': 'l1', 'serial': 1})
+
+    def edit(path):
+        with open(path, 'w') as fw:
+            json.dump({'lineage': 'l1', 'serial': 2}, fw)
+        return True
+
+    with patch.object(ops, 'acquire_state_lock', return_value='id') as mock_acquire, \
+            patch.object(ops, 'release_state_lock') as mock_release, \
+            patch.object(ops, 'run_terragrunt_with_status',
+                         side_effect=[(0, state, ''), (1, '', 'failed')]) as mock_run:
+        assert not ops.edit_state('test', edit)
+    assert mock_acquire.call_args.args[0]['use_lockfile']
+    mock_release.assert_called_once()
+    assert '-lock=false' in mock_run.call_args.args[0]
+    work_dir = os.path.dirname(mock_run.call_args.args[0][-1])
+    assert not os.path.exists(work_dir)
+    saved = list((tmp_path / 'edits').iterdir())
+    assert len(saved) == 1 and saved[0].read_text() == state
+
+
+def test_load_imports(tmp_path):
+    """Test load_imports method with CSV and JSON files."""
+    csv_file = tmp_path / 'imports.csv'
+    csv_file.write_text('address,id\naws_instance.a,i-123\n\naws_s3_bucket.b["x"],my-bucket\n')
+    assert TerragruntOperations.load_imports(str(csv_file)) == {
+        'aws_instance.a': 'i-123', 'aws_s3_bucket.b["x"]': 'my-bucket'}
+    json_file = tmp_path / 'imports.json'
+    json_file.write_text('[{"address": "aws_instance.a", "id": "i-123"}]')
+    assert TerragruntOperations.load_imports(str(json_file)) == {'aws_instance.a': 'i-123'}
+
+
+def test_render_import_blocks():
+    """Test render_import_blocks method."""
+    code = TerragruntOperations.render_import_blocks({'aws_instance.a': 'i-123', 'aws_ssm_parameter.p': '/a/${b}'})
+    assert 'import {\n  to = aws_instance.a\n  id = "i-123"\n}\n' in code
+    assert 'id = "/a/$${b}"' in code
+
+
+def test_match_addresses():
+    """Test match_addresses method with globs and regular expressions."""
+    addresses = ['aws_instance.a[0]', 'aws_instance.a[1]', 'module.app.aws_instance.b["x"]', 'aws_eip.a']
+    assert TerragruntOperations.match_addresses('aws_instance.a[*]', addresses) == [
+        'aws_instance.a[0]', 'aws_instance.a[1]']
+    assert TerragruntOperations.match_addresses('*.aws_instance.*', addresses) == ['module.app.aws_instance.b["x"]']
+    assert TerragruntOperations.match_addresses(r're:aws_(eip|instance)\.a.*', addresses) == [
+        'aws_instance.a[0]', 'aws_instance.a[1]', 'aws_eip.a']
+
+
+def test_untaint_state():
+    """Test untaint_state method."""
+    state = {'serial': 3, 'resources': [
+        {'mode': 'managed', 'type': 'aws_instance', 'name': 'a', 'module': 'module.app',
+         'instances': [{'index_key': 'x', 'status': 'tainted'}, {'index_key': 'y', 'status': 'tainted'}]},
+        {'mode': 'managed', 'type': 'aws_eip', 'name': 'e', 'instances': [{}]},
+    ]}
+    assert TerragruntOperations.untaint_state(state, ['module.app.aws_instance.a["x"]', 'aws_eip.e']) == 1
+    assert state['resources'][0]['instances'] == [{'index_key': 'x'}, {'index_key': 'y', 'status': 'tainted'}]
+    assert state['serial'] == 4
+
+
+def test_get_s3_backend():
+    """Test get_s3_backend method."""
+    config = {'remote_state': {'backend': 's3', 'config': {'bucket': 'b', 'key': 'aws/dev/terraform.tfstate'}}}
+    assert TerragruntOperations.get_s3_backend(config) == {
+        'bucket': 'b', 'key': 'aws/dev/terraform.tfstate', 'dynamodb_table': None, 'use_lockfile': False}
+    assert TerragruntOperations.get_s3_backend({'remote_state': {'backend': 'local', 'config': {}}}) is None
+    assert TerragruntOperations.get_s3_backend({}) is None
+
+
+def test_get_common_prefix():
+    """Test get_common_prefix method."""
+    assert TerragruntOperations.get_common_prefix(['aws/dev/terraform.tfstate', 'aws/prod/terraform.tfstate']) == 'aws/'
+    assert TerragruntOperations.get_common_prefix(['aws/terraform.tfstate', 'gcp/terraform.tfstate']) == ''
+    assert TerragruntOperations.get_common_prefix(['terraform.tfstate']) == ''
+
+
+def test_diff_backend_states():
+    """Test diff_backend_states method."""
+    backends = {
+        'aws/dev': {'bucket': 'b', 'key': 'aws/dev/terraform.tfstate'},
+        'aws/prod': {'bucket': 'b', 'key': 'aws/prod/terraform.tfstate'},
+    }
+    orphan = {'Key': 'aws/old/terraform.tfstate', 'Size': 10}
+    objects = {'b': {'aws/dev/terraform.tfstate': {'Key': 'aws/dev/terraform.tfstate'},
+                     'aws/old/terraform.tfstate': orphan}}
+    assert TerragruntOperations.diff_backend_states(backends, objects) == ([('b', orphan)], ['aws/prod'])
+
+
+@pytest.mark.parametrize('failed, keys, offered', [
+    ([], ['aws/dev/terraform.tfstate', 'aws/prod/terraform.tfstate'], True),
+    (['aws/broken'], ['aws/dev/terraform.tfstate', 'aws/prod/terraform.tfstate'], False),
+    ([], ['aws/terraform.tfstate', 'gcp/terraform.tfstate'], False),
+])
+def test_reconcile_backends(failed, keys, offered):
+    """Test deleting orphaned states is offered only if all modules rendered and the listing was scoped."""
+    ops = TerragruntOperations.__new__(TerragruntOperations)
+    backends = {key.removesuffix('/terraform.tfstate'): {'bucket': 'b', 'key': key} for key in keys}
+    orphan = {'Key': 'aws/old/terraform.tfstate', 'Size': 10, 'LastModified': datetime.now(tz=timezone.utc)}
+    with patch.object(ops, 'resolve_backends', return_value=(backends, failed)), \
+            patch.object(TerragruntOperations, 'list_state_objects', return_value={orphan['Key']: orphan}), \
+            patch.object(TerragruntOperations, 's3_delete_objects') as mock_delete, \
+            patch('builtins.input', return_value='delete') as mock_input:
+        ops.reconcile_backends('.')
+    assert mock_input.called == offered
+    assert mock_delete.called == offered
+
+
+def test_get_restore_conflict():
+    """Test get_restore_conflict method."""
+    backup = {'lineage': 'l1', 'serial': 5}
+    assert TerragruntOperations.get_restore_conflict(None, backup) is None
+    assert TerragruntOperations.get_restore_conflict({'lineage': 'l1', 'serial': 5}, backup) is None
+    assert 'newer' in TerragruntOperations.get_restore_conflict({'lineage': 'l1', 'serial': 6}, backup)
+    assert 'lineage' in TerragruntOperations.get_restore_conflict({'lineage': 'l2', 'serial': 1}, backup)
+
+
+@patch('velez.terragrunt_ops.boto3.client')
+def test_restore_states(mock_client, tmp_path):
+    """Test states are restored under the state lock, skipping locked states and declined older backups."""
+    store = StateBackup(str(tmp_path))
+    backup = store.store('b', 'a/terraform.tfstate', 'etag', json.dumps({'lineage': 'l1', 'serial': 1}).encode())
+    entries = {m: {'bucket': 'b', 'key': f"{m}/terraform.tfstate", 'dynamodb_table': 't', 'object': backup}
+               for m in ['a', 'locked']}
+    client = mock_client.return_value
+    client.get_object.return_value = {'Body': MagicMock(read=lambda: b'{"lineage": "l1", "serial": 2}')}
+
+    def put_item(TableName, Item, ConditionExpression=None):
+        if ConditionExpression and Item['LockID']['S'].startswith('b/locked/'):
+            raise RuntimeError('ConditionalCheckFailedException')
+    client.put_item.side_effect = put_item
+
+    with patch('builtins.input', return_value='n'):
+        TerragruntOperations.restore_states(store, entries)
+    client.put_object.assert_not_called()
+    with patch('builtins.input', return_value='y'):
+        TerragruntOperations.restore_states(store, entries)
+    client.put_object.assert_called_once()
+    assert client.put_object.call_args.kwargs['Key'] == 'a/terraform.tfstate'
+    assert client.delete_item.call_count == 2  # lock of module a released after each run
+
+
+@pytest.mark.parametrize('snapshot, destroyed', [(None, False), ('2026-01-01', True)])
+def test_module_destroy_action_backup(snapshot, destroyed):
+    """Test the state is backed up before destroying, and nothing is destroyed if the backup fails."""
+    ops = TerragruntOperations.__new__(TerragruntOperations)
+    ops.module, ops.use_dynamodb_locks, ops.use_s3_backend = 'aws/dev', True, True
+    ops.dynamodb_table, ops.dynamodb_lockid, ops.s3_state_path = 't', 'b/aws/dev/terraform.tfstate', 's3://b/x'
+    ops.s3_bucket_name, ops.s3_state_key = 'b', 'aws/dev/terraform.tfstate'
+    calls = []
+    with patch.object(ops, 'backup_states', side_effect=lambda b: calls.append('backup') or snapshot), \
+            patch.object(ops, 'run_terragrunt', side_effect=lambda args: calls.append(args[-1])), \
+            patch.object(ops, 's3_delete_state') as mock_delete, patch.object(ops, 'dynamodb_delete_lock'), \
+            patch.object(ops, 'action_menu'), patch.object(ops, 'folder_menu'), patch('builtins.input'), \
+            patch('velez.terragrunt_ops.os.rmdir'):
+        ops.module_destroy_action()
+    assert calls == (['backup', 'destroy'] if destroyed else ['backup'])
+    if destroyed:
+        mock_delete.assert_called_once_with(backup=False)
+
+
+def test_get_dependencies():
+    """Test get_dependencies method with dependency and dependencies blocks."""
+    configs = {
+        'aws/vpc': {},
+        'aws/eks': {'dependency': {'vpc': {'config_path': '../vpc'}}},
+        'aws/app': {'dependencies': {'paths': ['../eks', '/base/aws/vpc', '../../external']}},
+    }
+    assert TerragruntOperations.get_dependencies(configs, '/base') == {
+        'aws/vpc': set(), 'aws/eks': {'aws/vpc'}, 'aws/app': {'aws/eks', 'aws/vpc'}}
+
+
+def test_get_completed_modules():
+    """Test get_completed_modules method skips only succeeded modules with unchanged inputs and dependencies."""
+    entries = {
+        'vpc': {'status': 'succeeded', 'input_hash': 'v'},
+        'eks': {'status': 'succeeded', 'input_hash': 'e'},
+        'app': {'status': 'succeeded', 'input_hash': 'a'},
+        'db': {'status': 'failed', 'input_hash': 'd'},
+        'dns': {'status': 'succeeded', 'input_hash': 'old'},
+    }
+    hashes = {'vpc': 'v', 'eks': 'e', 'app': 'a', 'db': 'd', 'dns': 'new', 'api': 'x'}
+    dependencies = {'eks': {'vpc'}, 'app': {'eks', 'db'}}
+    assert TerragruntOperations.get_completed_modules(entries, hashes, dependencies) == {'vpc', 'eks'}
+    assert TerragruntOperations.get_completed_modules({}, hashes, dependencies) == set()
@@ -1,7 +1,10 @@
 import subprocess
+import sys
 from unittest.mock import patch, MagicMock
 
-from velez.utils import run_command
+import pytest
+
+from velez.utils import run_command, run_command_with_status, human_readable_to_bytes
 
 
 @patch('shutil.which', return_value=True)
@@ -39,3 +42,39 @@ def test_run_command_exception(mock_popen, mock_which):
     mock_which.assert_called_once_with('echo')
     mock_popen.assert_called_once_with(['echo', 'hello'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                        universal_newlines=True)
+
+
+def test_human_readable_to_bytes():
+    """Test human_readable_to_bytes with various units."""
+    assert human_readable_to_bytes('100') == 100
+    assert human_readable_to_bytes('2kB') == 2048
+    assert human_readable_to_bytes('10G') == 10 * 1024 ** 3
+    assert human_readable_to_bytes('1.5 MB') == int(1.5 * 1024 ** 2)
+    with pytest.raises(ValueError):
+        human_readable_to_bytes('lots')
+
+
+def test_run_command_with_status():
+    """Test run_command_with_status captures exit code, output and resource usage."""
+    code, out, err, usage = run_command_with_status([sys.executable, '-c', 'import sys; print("out"); sys.exit(3)'])
+    assert code == 3
+    assert out == 'out\n'
+    assert err == ''
+    assert usage['wall_time'] > 0
+    assert usage['max_rss'] > 0
+
+
+def test_run_command_with_status_without_wait4(monkeypatch):
+    """Test run_command_with_status captures exit code without resource usage where wait4 is not available."""
+    monkeypatch.delattr('os.wait4')
+    code, out, err, usage = run_command_with_status([sys.executable, '-c', 'import sys; print("out"); sys.exit(3)'])
+    assert code == 3
+    assert out == 'out\n'
+    assert usage['max_rss'] == 0
+
+
+def test_run_command_with_status_not_found():
+    """Test run_command_with_status with a nonexistent command."""
+    code, out, err, usage = run_command_with_status(['nonexistent_command'])
+    assert code == 127
+    assert err == 'Command not found: nonexistent_command'
@@ -0,0 +1,113 @@
+import os
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+from velez.workspace_ops import WorkspaceOperations
+
+
+def git(repo, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME='a', GIT_AUTHOR_EMAIL='a@a', GIT_COMMITTER_NAME='a',
+               GIT_COMMITTER_EMAIL='a@a')
+    subprocess.run(['git', '-C', str(repo)] + list(args), check=True, capture_output=True, env=env)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    origin = tmp_path / 'origin'
+    origin.mkdir()
+    git(origin, 'init', '-q', '-b', 'main')
+    git(origin, 'commit', '-q', '--allow-empty', '-m', 'initial')
+    root = tmp_path / 'workspace'
+    (root / 'team').mkdir(parents=True)
+    git(root, 'clone', '-q', str(origin), 'app')
+    git(root / 'team', 'clone', '-q', str(origin), 'infra')
+    (root / 'notes').mkdir()
+    (root / 'node_modules' / 'dep' / '.git').mkdir(parents=True)
+    # nested repositories are not workspace repositories
+    git(root / 'app', 'init', '-q', 'vendored')
+    git(origin, 'commit', '-q', '--allow-empty', '-m', 'second')
+    (root / 'app' / 'new.txt').write_text('new')
+    return root
+
+
+def test_discover_repos(workspace):
+    """Test repositories are found without descending into repositories and skipped directories."""
+    assert WorkspaceOperations.discover_repos(str(workspace)) == ['app', os.path.join('team', 'infra')]
+    assert WorkspaceOperations.discover_repos(str(workspace), depth=1) == ['app']
+
+
+def test_parse_status():
+    """Test parsing of git status with branch and upstream headers."""
+    output = ("# branch.oid abc\n# branch.head main\n# branch.upstream origin/main\n# branch.ab +2 -3\n"
+              "1 .M N... 100644 100644 100644 abc abc file.txt\n? new.txt\n")
+    assert WorkspaceOperations.parse_status(output) == {'branch': 'main', 'ahead': 2, 'behind': 3, 'changes': 2}
+    assert WorkspaceOperations.parse_status("# branch.head feature\n") == {'branch': 'feature', 'ahead': None,
+                                                                          'behind': None, 'changes': 0}
+
+
+def test_run_on_repos(workspace):
+    """Test operations run on all repositories and their results are aggregated in order of repositories."""
+    ops = WorkspaceOperations(MagicMock(base_dir=str(workspace)))
+    git(workspace / 'app', 'fetch', '-q')
+    rows = ops.run_on_repos(ops.repo_status)
+    assert rows == [['app', 'main', '0', '1', '2'], [os.path.join('team', 'infra'), 'main', '0', '0', '0']]
+
+    rows = ops.run_on_repos(lambda repo: ops.run_git(repo, ['pull', '--rebase', '--quiet']))
+    assert [row[:2] for row in rows] == [['app', 'ok'], [os.path.join('team', 'infra'), 'ok']]
+    assert ops.run_on_repos(ops.repo_status)[0] == ['app', 'main', '0', '0', '2']
+
+
+def test_run_on_repos_error(workspace):
+    """Test an operation failing on a repository is reported in its row without stopping others."""
+    ops = WorkspaceOperations(MagicMock(base_dir=str(workspace)))
+
+    def operation(repo_dir):
+        if repo_dir.endswith('app'):
+            raise ValueError('broken')
+        return ['ok']
+
+    assert ops.run_on_repos(operation) == [['app', 'An error occurred: broken'],
+                                           [os.path.join('team', 'infra'), 'ok']]
+
+
+def test_repo_stale_branches(workspace):
+    """Test stale branches are found from local refs after fetching origin."""
+    assert WorkspaceOperations.repo_stale_branches(str(workspace / 'app')) == ['0', '']
+
+
+def test_run_git_noninteractive(monkeypatch):
+    """Test git runs without the terminal, so it can't ask for credentials while running in many repositories."""
+    calls = []
+    monkeypatch.setattr('velez.workspace_ops.run_command_with_status',
+                        lambda command, **kwargs: calls.append(kwargs) or (1, '', 'fatal: no credentials\n', {}))
+    assert WorkspaceOperations.run_git('repo', ['push']) == ['failed', 'fatal: no credentials']
+    assert calls[0]['interactive'] is False
+    assert calls[0]['env']['GIT_TERMINAL_PROMPT'] == '0'
+
+
+def test_workspace_push_confirmation(workspace, monkeypatch):
+    """Test pushing all repositories asks for confirmation first."""
+    ops = WorkspaceOperations(MagicMock(base_dir=str(workspace)))
+    monkeypatch.setattr('velez.workspace_ops.pick', lambda options, title: (options[2], 2))
+    monkeypatch.setattr('builtins.input', MagicMock(side_effect=['n', SystemExit]))
+    with patch.object(ops, 'run_on_repos') as mock_run, pytest.raises(SystemExit):
+        ops.workspace_menu()
+    mock_run.assert_not_called()
+
+
+def test_list_pull_requests_github_only(monkeypatch):
+    """Test pull requests are only listed for repositories hosted on GitHub."""
+    monkeypatch.setenv('GITHUB_TOKEN', 'token')
+    ops = WorkspaceOperations.__new__(WorkspaceOperations)
+    ops.root, ops.repos, ops.velez = '/workspace', ['app', 'infra', 'local'], MagicMock()
+    ops.velez.github_ops.rate_limit.map.side_effect = lambda fetch, repos: [(r, fetch(r)) for r in repos]
+    urls = {'app': 'git@github.com:owner/app.git', 'infra': 'https://gitlab.com/owner/infra.git',
+            'local': '/srv/git/local.git'}
+    monkeypatch.setattr('velez.workspace_ops.run_command_with_status',
+                        lambda command: (0, urls[os.path.basename(command[2])], '', {}))
+    with patch('velez.workspace_ops.install_cache'), patch('velez.workspace_ops.github.Github') as mock_github:
+        gh = mock_github.return_value.withLazy.return_value
+        gh.get_repo.return_value.get_pulls.return_value = [MagicMock(number=1, title='Fix', html_url='url')]
+        assert ops.list_pull_requests() == [['app', '#1', 'Fix', 'url']]
+    gh.get_repo.assert_called_once_with('owner/app')
@@ -1,14 +1,44 @@
+import errno
+import hashlib
 import json
 import os
 import shutil
+import struct
 import sys
+from functools import cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from importlib.metadata import version
 
 import hcl2
 from pick import pick
-from velez.utils import STR_BACK, STR_EXIT, run_command
+from velez.utils import STR_BACK, STR_EXIT, run_command, print_markdown_table, bytes_to_human_readable, \
+    human_readable_to_bytes
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where reflinks are not supported
+    fcntl = None
+
+CACHE_BUDGET = os.getenv('VELEZ_CACHE_BUDGET', '10GB')
+DEDUP_MODE = os.getenv('VELEZ_DEDUP_MODE', 'reflink')  # reflink, or hardlink as an explicit opt-in
+DEDUP_MIN_SIZE = int(os.getenv('VELEZ_DEDUP_MIN_SIZE', 4096))
+FICLONE = 0x40049409  # Linux ioctl request for reflink copies
+FIEMAP = 0xC020660B  # Linux ioctl request for the physical extents of a file
+FIEMAP_FLAG_SYNC = 1  # flush the file before mapping its extents, so delayed allocations have an address
+FORMAT_MODE = os.getenv('VELEZ_FORMAT_MODE', 'all')  # all, changed or modified
+FORMAT_CACHE = os.getenv('VELEZ_FORMAT_CACHE', os.path.expanduser('~/.cache/velez/format.json'))
+FORMAT_BATCH_SIZE = int(os.getenv('VELEZ_FORMAT_BATCH_SIZE', 50))
+FORMAT_WORKERS = int(os.getenv('VELEZ_FORMAT_WORKERS', os.cpu_count() or 4))
+HCL_CACHE_DIR = os.getenv('VELEZ_HCL_CACHE', os.path.expanduser('~/.cache/velez/hcl'))
+HCL_CACHE_SIZE = os.getenv('VELEZ_HCL_CACHE_SIZE', '256MB')
+HCL_CACHE_PRUNE_EVERY = 100  # number of cache writes between size checks
 
 STR_FORMAT_FILES = "⎆ Format HCL files"
+STR_FORMAT_CHANGED_FILES = "⎆ Format changed HCL files"
 STR_CLEAN_FILES = "⌧ Clean temporary files"
+STR_GC_CACHES = "⌛ Trim caches to budget"
+STR_DEDUP_CACHES = "⧉ Deduplicate caches"
 
 
 class FileOperations:
@@ -16,6 +46,8 @@ class FileOperations:
     Class for file operations.
     """
 
+    hcl_cache_writes = 0  # cache writes since the last size check, shared by all instances
+
     def __init__(self, velez):
         self.velez = velez
 
@@ -27,7 +59,10 @@ class FileOperations:
         title = "Choose a file operation:"
         options = [
             STR_FORMAT_FILES,
+            STR_FORMAT_CHANGED_FILES,
             STR_CLEAN_FILES,
+            STR_GC_CACHES,
+            STR_DEDUP_CACHES,
             STR_BACK,
             STR_EXIT
         ]
@@ -38,24 +73,129 @@ class FileOperations:
         elif option == STR_EXIT:
             sys.exit()
         elif option == STR_FORMAT_FILES:
-            self.format_hcl_files()
+            self.format_hcl_files(mode=FORMAT_MODE)
+        elif option == STR_FORMAT_CHANGED_FILES:
+            self.format_hcl_files(mode='changed')
         elif option == STR_CLEAN_FILES:
             self.clean_files()
+        elif option == STR_GC_CACHES:
+            budget = input(f"Enter the cache budget (e.g., 5GB; will use {CACHE_BUDGET} if empty): ")
+            self.gc_caches(budget=budget or CACHE_BUDGET)
+            input("Press Enter to return to the file menu...")
+        elif option == STR_DEDUP_CACHES:
+            self.dedup_caches()
+            input("Press Enter to return to the file menu...")
 
         self.file_menu()
 
-    def format_hcl_files(self) -> None:
+    def format_hcl_files(self, mode: str = 'all') -> None:
         """
-        Format all HCL files.
+        Format HCL files.
+        :param mode: all to format the whole project, changed to format only files changed in git,
+                     modified to format only files which content changed since the last run
         :return: None
         """
         print("Formatting HCL files...")
-        if self.velez.check_terragrunt():
+        if not self.velez.check_terragrunt():
+            return
+        tf_ot = self.velez.get_tf_ot()
+        if mode == 'all':
             run_command(['terragrunt', 'hclfmt'])
-            if self.velez.get_tf_ot() == 'terraform':
-                run_command(['terraform', 'fmt', '-recursive', '.'])
-            elif self.velez.get_tf_ot() == 'tofu':
-                run_command(['tofu', 'fmt', '-recursive', '.'])
+            if tf_ot:
+                run_command([tf_ot, 'fmt', '-recursive', '.'])
+            return
+
+        hashes = {}
+        if mode == 'changed':
+            files = self.list_changed_hcl_files()
+        else:
+            hashes = self.load_format_cache()
+            files = [f for f in self.list_hcl_files() if hashes.get(os.path.abspath(f)) != self.get_file_hash(f)]
+        if not files:
+            print("No HCL files to format.")
+            return
+
+        # terragrunt formats a single file per run, terraform/tofu accepts many files at once
+        commands = [['terragrunt', 'hclfmt', '--file', f] for f in files if f.endswith('.hcl')]
+        tf_files = [f for f in files if f.endswith(('.tf', '.tfvars'))]
+        if tf_ot:
+            commands += [[tf_ot, 'fmt'] + tf_files[i:i + FORMAT_BATCH_SIZE]
+                         for i in range(0, len(tf_files), FORMAT_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=FORMAT_WORKERS) as executor:
+            list(executor.map(run_command, commands))
+
+        if mode == 'modified':
+            for file in files:
+                hashes[os.path.abspath(file)] = self.get_file_hash(file)
+            self.save_format_cache(hashes)
+
+    @staticmethod
+    def is_hcl_file(file_path: str) -> bool:
+        """
+        Check if a file is an HCL, Terraform or tfvars file to format, generated lock files are not.
+        :param file_path: file path
+        :return: True if the file is formatted, False otherwise
+        """
+        return file_path.endswith(('.hcl', '.tf', '.tfvars')) and os.path.basename(file_path) != '.terraform.lock.hcl'
+
+    @staticmethod
+    def list_hcl_files(base_path: str = '.') -> list[str]:
+        """
+        List all HCL, Terraform and tfvars files, skipping hidden directories and generated lock files.
+        :param base_path: root path to start searching from
+        :return: sorted list of file paths
+        """
+        hcl_files = []
+        for root, dirs, files in os.walk(base_path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            hcl_files += [os.path.join(root, f) for f in files if FileOperations.is_hcl_file(f)]
+        return sorted(hcl_files)
+
+    @staticmethod
+    def list_changed_hcl_files() -> list[str]:
+        """
+        List HCL, Terraform and tfvars files which are staged, modified or untracked in git, except lock files.
+        :return: sorted list of file paths
+        """
+        files = set()
+        for command in [['git', 'diff', '--name-only', '--cached', '--relative'],
+                        ['git', 'diff', '--name-only', '--relative'],
+                        ['git', 'ls-files', '--others', '--exclude-standard']]:
+            files.update(run_command(command, quiet=True)[0].splitlines())
+        return sorted(f for f in files if FileOperations.is_hcl_file(f) and os.path.isfile(f))
+
+    @staticmethod
+    def get_file_hash(file_path: str) -> str:
+        """
+        Get SHA-256 hash of file content.
+        :param file_path: file to hash
+        :return: hex digest
+        """
+        with open(file_path, 'rb') as fr:
+            return hashlib.file_digest(fr, 'sha256').hexdigest()
+
+    @staticmethod
+    def load_format_cache() -> dict:
+        """
+        Load hashes of files formatted in the previous runs.
+        :return: dictionary of absolute file path to content hash
+        """
+        try:
+            with open(FORMAT_CACHE, 'r') as fr:
+                return json.load(fr)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def save_format_cache(hashes: dict) -> None:
+        """
+        Save hashes of formatted files.
+        :param hashes: dictionary of absolute file path to content hash
+        :return: None
+        """
+        os.makedirs(os.path.dirname(FORMAT_CACHE), exist_ok=True)
+        with open(FORMAT_CACHE, 'w') as fw:
+            json.dump(hashes, fw)
 
     @staticmethod
     def clean_files(clean_path: str = '.') -> None:
@@ -103,15 +243,393 @@ class FileOperations:
                         print(f"Error removing {file_path}: {e}")
         input("Press Enter to return to the file menu...")
 
+    @staticmethod
+    def list_terragrunt_modules(base_path: str = '.') -> list[str]:
+        """
+        List all Terragrunt modules, i.e. directories with a terragrunt.hcl file, skipping hidden directories.
+        :param base_path: root path to start searching from
+        :return: sorted list of module paths
+        """
+        modules = []
+        for root, dirs, files in os.walk(base_path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            if 'terragrunt.hcl' in files:
+                modules.append(os.path.normpath(root))
+        return sorted(modules)
+
+    @staticmethod
+    def list_cache_dirs(base_path: str = '.') -> list[dict]:
+        """
+        Inventory .terragrunt-cache and .terraform directories with their size and last use.
+        Last use is the most recent access or modification time of plan and lock files of the module,
+        falling back to the directory modification time.
+        :param base_path: root path to start searching from
+        :return: list of dictionaries with path, size and last_used keys
+        """
+        markers = ['.terraform.lock.hcl', 'tfplan', 'terraform.tfstate', 'terragrunt-debug.tfvars.json']
+        caches = []
+        for root, dirs, files in os.walk(base_path):
+            for cache_dir in ['.terragrunt-cache', '.terraform']:
+                if cache_dir not in dirs:
+                    continue
+                # don't descend into caches, nested .terraform directories are counted with their parent
+                dirs.remove(cache_dir)
+                # ignore .terragrunt-cache folder in main terragrunt directory if it has .gitkeep file
+                if cache_dir == '.terragrunt-cache' and '.gitkeep' in files:
+                    continue
+                cache_path = os.path.join(root, cache_dir)
+                last_used = os.stat(cache_path).st_mtime
+                for file in files:
+                    if file in markers:
+                        stat = os.stat(os.path.join(root, file))
+                        last_used = max(last_used, stat.st_atime, stat.st_mtime)
+                size = 0
+                for cache_root, _, cache_files in os.walk(cache_path):
+                    for file in cache_files:
+                        try:
+                            stat = os.lstat(os.path.join(cache_root, file))
+                        except OSError:
+                            continue
+                        size += stat.st_size
+                        if file in markers:
+                            last_used = max(last_used, stat.st_atime, stat.st_mtime)
+                caches.append({'path': cache_path, 'size': size, 'last_used': last_used})
+        return caches
+
+    def gc_caches(self, clean_path: str = '.', budget: str | int = CACHE_BUDGET, dry_run: bool = False) -> list[dict]:
+        """
+        Evict least recently used cache directories until their total size fits the budget.
+        :param clean_path: root path to start searching from
+        :param budget: maximum total size of caches, e.g. "10GB" or a number of bytes
+        :param dry_run: if True, only report caches that would be evicted
+        :return: list of evicted caches
+        """
+        try:
+            budget_bytes = human_readable_to_bytes(budget)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return []
+        caches = sorted(self.list_cache_dirs(clean_path), key=lambda c: c['last_used'])
+        total = sum(c['size'] for c in caches)
+        print(f"Caches in {clean_path} use {bytes_to_human_readable(total)} "
+              f"of {bytes_to_human_readable(budget_bytes)} budget.")
+        evicted = []
+        for cache in caches:
+            if total <= budget_bytes:
+                break
+            if not dry_run:
+                try:
+                    shutil.rmtree(cache['path'])
+                except Exception as e:
+                    print(f"Error removing {cache['path']}: {e}")
+                    continue
+            total -= cache['size']
+            evicted.append(cache)
+        if evicted:
+            rows = [[c['path'], bytes_to_human_readable(c['size']),
+                     datetime.fromtimestamp(c['last_used']).strftime("%Y-%m-%d %H:%M:%S")] for c in evicted]
+            print_markdown_table("Evicted cache | Size | Last used", rows)
+        print(f"Caches use {bytes_to_human_readable(total)} after {'dry run' if dry_run else 'eviction'}.")
+        return evicted
+
+    def dedup_caches(self, clean_path: str = '.', mode: str = DEDUP_MODE, dry_run: bool = False) -> int:
+        """
+        Replace identical files across cache directories with reflinks, or hardlinks if explicitly requested.
+        Files generated by Terragrunt and state or lock files are never linked, as they are rewritten in place.
+        Hardlinked files share their content, and Terragrunt and Terraform rewrite some cache files in place,
+        which then changes every linked copy; reflinks are copy-on-write and safe to rewrite.
+        :param clean_path: root path to start searching from
+        :param mode: reflink, or hardlink
+        :param dry_run: if True, only report bytes that would be saved
+        :return: number of bytes saved
+        """
+        if mode not in ['reflink', 'hardlink']:
+            print(f"Error: Unknown deduplication mode: {mode}")
+            return 0
+        skip_files = ['.terraform.lock.hcl', 'terraform.tfstate', '.terragrunt-source-version',
+                      '.terragrunt-module-manifest']
+        # group candidates by device and size first, only files of equal size need hashing
+        by_size = {}
+        for cache in self.list_cache_dirs(clean_path):
+            for root, _, files in os.walk(cache['path']):
+                for file in files:
+                    if file in skip_files:
+                        continue
+                    file_path = os.path.join(root, file)
+                    try:
+                        stat = os.lstat(file_path)
+                    except OSError:
+                        continue
+                    if not os.path.isfile(file_path) or os.path.islink(file_path) or stat.st_size < DEDUP_MIN_SIZE:
+                        continue
+                    by_size.setdefault((stat.st_dev, stat.st_size), {}).setdefault(stat.st_ino, file_path)
+
+        saved = 0
+        reflink_devices = {}  # device to reflink support, probed once per filesystem
+        for (device, size), inodes in by_size.items():
+            if len(inodes) < 2:
+                continue
+            if mode == 'reflink':
+                if device not in reflink_devices:
+                    probe_dir = os.path.dirname(next(iter(inodes.values())))
+                    reflink_devices[device] = self.supports_reflink(probe_dir)
+                    if not reflink_devices[device]:
+                        print(f"Error: Reflinks are not supported by the filesystem of {probe_dir}, "
+                              f"set VELEZ_DEDUP_MODE=hardlink to use hardlinks instead.")
+                if not reflink_devices[device]:
+                    continue
+            by_hash = {}
+            for file_path in inodes.values():
+                try:
+                    with open(file_path, 'rb') as fr:
+                        if fr.read(25) == b'# Generated by Terragrunt':
+                            continue
+                        fr.seek(0)
+                        digest = hashlib.file_digest(fr, 'sha256').hexdigest()
+                except OSError:
+                    continue
+                by_hash.setdefault(digest, []).append(file_path)
+            for source, *duplicates in by_hash.values():
+                # reflinked copies keep their own inodes, files already sharing extents were linked by a previous run
+                extent = self.get_first_extent(source) if mode == 'reflink' else None
+                for duplicate in duplicates:
+                    if extent is not None and self.get_first_extent(duplicate) == extent:
+                        continue
+                    if dry_run or self.link_file(source, duplicate, mode):
+                        saved += size
+        print(f"{'Would save' if dry_run else 'Saved'} {bytes_to_human_readable(saved)} by deduplicating caches.")
+        return saved
+
+    @staticmethod
+    def supports_reflink(directory: str) -> bool:
+        """
+        Check if the filesystem of a directory supports reflinks, by cloning a temporary file.
+        :param directory: directory to probe
+        :return: True if reflinks are supported, False otherwise
+        """
+        if fcntl is None:
+            return False
+        source = os.path.join(directory, f".velez-reflink-probe.{os.getpid()}")
+        try:
+            with open(source, 'wb') as fw:
+                fw.write(os.urandom(4096))
+            with open(source, 'rb') as src, open(f"{source}.clone", 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            return False
+        finally:
+            for path in [source, f"{source}.clone"]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def get_first_extent(file_path: str) -> int | None:
+        """
+        Get the physical address of the first extent of a file, equal for files sharing their content by reflinks.
+        :param file_path: path to the file
+        :return: physical address, or None if unknown
+        """
+        if fcntl is None:
+            return None
+        # struct fiemap asking for one extent from the start of the file, followed by space for that extent
+        request = bytearray(struct.pack('=QQIIII', 0, 2 ** 64 - 1, FIEMAP_FLAG_SYNC, 0, 1, 0) + bytes(56))
+        try:
+            with open(file_path, 'rb') as fr:
+                fcntl.ioctl(fr.fileno(), FIEMAP, request)
+        except OSError:
+            return None
+        mapped_extents = struct.unpack_from('=I', request, 20)[0]
+        physical = struct.unpack_from('=Q', request, 40)[0]
+        return physical if mapped_extents and physical else None
+
+    @staticmethod
+    def link_file(source: str, destination: str, mode: str = 'reflink') -> bool:
+        """
+        Atomically replace destination with a reflink or hardlink of source.
+        :param source: file to link to
+        :param destination: duplicate file to replace
+        :param mode: reflink or hardlink
+        :return: True if replaced, False otherwise
+        """
+        temp_path = f"{destination}.velez-dedup"
+        try:
+            if mode == 'reflink':
+                if fcntl is None:
+                    raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this system")
+                with open(source, 'rb') as src, open(temp_path, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copystat(destination, temp_path)
+            else:
+                os.link(source, temp_path)
+            os.replace(temp_path, destination)
+            return True
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"Error linking {destination}: {e}")
+            return False
+
     @staticmethod
     def load_hcl_file(hcl_file: str) -> dict:
         """
         Load HCL file into a dictionary.
+        Parsed results are cached on disk by content hash and parser version.
         :param hcl_file: HCL file to load
         :return: dictionary of HCL file
         """
         with open(hcl_file, 'r') as fr:
-            return hcl2.load(fr)
+            content = fr.read()
+        cache_path = FileOperations.get_hcl_cache_path(content)
+        cached = FileOperations.read_hcl_cache(cache_path)
+        if cached is not None:
+            return cached
+        parsed = FileOperations.parse_hcl(content)
+        FileOperations.write_hcl_cache(cache_path, parsed)
+        return parsed
+
+    @staticmethod
+    def load_hcl_files(hcl_files: list[str], workers: int = None) -> dict:
+        """
+        Load many HCL files at once, parsing cache misses in a pool of processes.
+        Files that fail to load are reported and skipped.
+        :param hcl_files: HCL files to load
+        :param workers: number of parsing processes, defaults to number of CPUs
+        :return: dictionary of file path to dictionary of HCL file
+        """
+        results = {}
+        misses = {}
+        for hcl_file in hcl_files:
+            try:
+                with open(hcl_file, 'r') as fr:
+                    content = fr.read()
+            except OSError as e:
+                print(f"Error loading {hcl_file}: {e}")
+                continue
+            cache_path = FileOperations.get_hcl_cache_path(content)
+            cached = FileOperations.read_hcl_cache(cache_path)
+            if cached is not None:
+                results[hcl_file] = cached
+            else:
+                misses[hcl_file] = (cache_path, content)
+
+        if misses:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {f: executor.submit(FileOperations.parse_hcl_in_worker, c) for f, (_, c) in misses.items()}
+            for hcl_file, future in futures.items():
+                try:
+                    results[hcl_file] = future.result()
+                except Exception as e:
+                    print(f"Error loading {hcl_file}: {e}")
+                    continue
+                FileOperations.write_hcl_cache(misses[hcl_file][0], results[hcl_file], prune=False)
+            FileOperations.prune_hcl_cache()
+        return results
+
+    @staticmethod
+    def parse_hcl(content: str) -> dict:
+        """
+        Parse HCL content into a dictionary.
+        :param content: HCL content
+        :return: dictionary of HCL content
+        """
+        return hcl2.loads(content)
+
+    @staticmethod
+    def parse_hcl_in_worker(content: str) -> dict:
+        """
+        Parse HCL content in a worker process.
+        Parser exceptions can't be pickled back to the main process, so they are replaced with their message.
+        :param content: HCL content
+        :return: dictionary of HCL content
+        """
+        try:
+            return FileOperations.parse_hcl(content)
+        except Exception as e:
+            raise ValueError(str(e)) from None
+
+    @staticmethod
+    @cache
+    def get_hcl_parser_version() -> str:
+        """
+        Get version of the HCL parser, part of the cache keys of parse results.
+        :return: version of python-hcl2
+        """
+        return version('python-hcl2')
+
+    @staticmethod
+    def get_hcl_cache_path(content: str) -> str:
+        """
+        Get path of the cached parse result for HCL content.
+        :param content: HCL content
+        :return: path to the cache file
+        """
+        key = hashlib.sha256(f"{FileOperations.get_hcl_parser_version()}\0{content}".encode()).hexdigest()
+        return os.path.join(HCL_CACHE_DIR, key[:2], f"{key}.json")
+
+    @staticmethod
+    def read_hcl_cache(cache_path: str) -> dict | None:
+        """
+        Read cached parse result, marking it as recently used.
+        :param cache_path: path to the cache file
+        :return: dictionary of HCL file, or None if not cached
+        """
+        try:
+            with open(cache_path, 'r') as fr:
+                parsed = json.load(fr)
+            os.utime(cache_path)
+            return parsed
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def write_hcl_cache(cache_path: str, parsed: dict, prune: bool = True) -> None:
+        """
+        Write parse result to the cache, atomically, readable only by the current user.
+        :param cache_path: path to the cache file
+        :param parsed: dictionary of HCL file
+        :param prune: if True, check the cache size every few writes
+        :return: None
+        """
+        try:
+            os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+            os.chmod(HCL_CACHE_DIR, 0o700)
+            temp_path = f"{cache_path}.{os.getpid()}"
+            with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as fw:
+                json.dump(parsed, fw)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Error writing HCL cache: {e}")
+            return
+        FileOperations.hcl_cache_writes += 1
+        if prune and FileOperations.hcl_cache_writes >= HCL_CACHE_PRUNE_EVERY:
+            FileOperations.prune_hcl_cache()
+
+    @staticmethod
+    def prune_hcl_cache() -> None:
+        """
+        Evict least recently used parse results until the cache fits its size limit.
+        :return: None
+        """
+        FileOperations.hcl_cache_writes = 0
+        entries = []
+        for root, _, files in os.walk(HCL_CACHE_DIR):
+            for file in files:
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+        total = sum(e[1] for e in entries)
+        limit = human_readable_to_bytes(HCL_CACHE_SIZE)
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
 
     @staticmethod
     def load_json_file(json_file: str) -> dict:
@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+import time
+
+from velez.git_refs import GitRefs
+from velez.utils import get_noninteractive_git_env, run_command_with_status
+
+FETCH_TTL = int(os.getenv('GITHUB_FETCH_TTL', 300))
+
+
+class BackgroundFetcher:
+    """
+    Fetch remotes in the background, so menus can use current refs immediately.
+    Remotes fetched within the TTL are not fetched again, remotes are fetched one by one as concurrent fetches
+    of a repository would compete for the same files.
+    """
+
+    def __init__(self, refs: GitRefs, repo_dir: str, ttl: int = FETCH_TTL):
+        """
+        :param refs: reader of refs of the repository
+        :param repo_dir: path to the working tree of the repository
+        :param ttl: time in seconds for which fetched remotes are considered fresh
+        """
+        self.refs = refs
+        self.repo_dir = repo_dir
+        self.ttl = ttl
+        self.last_fetch = {}  # remote -> time of the last successful fetch
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """
+        Normalize a remote URL the way git records it in FETCH_HEAD, without credentials, trailing slash and .git.
+        :param url: remote URL
+        :return: normalized URL
+        """
+        url = re.sub(r'^([a-z+]+://)[^/@]+@', r'\1', url.strip())
+        return url.rstrip('/').removesuffix('.git').rstrip('/')
+
+    def get_last_fetch(self, remote: str) -> float:
+        """
+        Get time of the last fetch of a remote, from FETCH_HEAD if not fetched by velez yet and it names the remote.
+        :param remote: remote name
+        :return: time of the last fetch, 0 if never fetched
+        """
+        if remote in self.last_fetch:
+            return self.last_fetch[remote]
+        url = self.refs.remote_url(remote)
+        fetch_head = os.path.join(self.refs.git_dir, 'FETCH_HEAD')
+        try:
+            with open(fetch_head, 'r') as fr:
+                lines = fr.read().splitlines()
+            mtime = os.stat(fetch_head).st_mtime
+        except OSError:
+            return 0.0
+        # lines end with " of <url>", FETCH_HEAD is rewritten by every fetch of any remote
+        if url and any(self.normalize_url(line.rpartition(' of ')[2]) == self.normalize_url(url) for line in lines):
+            return mtime
+        return 0.0
+
+    def is_fresh(self, remote: str) -> bool:
+        """
+        Check if a remote was fetched within the TTL.
+        :param remote: remote name
+        :return: True if fresh
+        """
+        return time.time() - self.get_last_fetch(remote) < self.ttl
+
+    def is_fetching(self) -> bool:
+        """
+        Check if a background fetch is running.
+        :return: True if running
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def fetch(self, remote: str) -> bool:
+        """
+        Fetch a remote, pruning deleted branches.
+        :param remote: remote name
+        :return: True if fetched
+        """
+        # fetched alongside menus, so it must not ask for credentials on the terminal
+        code, _, _, _ = run_command_with_status(['git', '-C', self.repo_dir, 'fetch', '--prune', '--quiet', remote],
+                                                env=get_noninteractive_git_env(), interactive=False)
+        if code != 0:
+            return False
+        with self.lock:
+            self.last_fetch[remote] = time.time()
+        return True
+
+    def refresh(self) -> None:
+        """
+        Start fetching remotes which are not fresh in the background, unless already fetching.
+        :return: None
+        """
+        with self.lock:
+            if self.is_fetching():
+                return
+            remotes = [remote for remote in self.refs.remotes() if not self.is_fresh(remote)]
+            if not remotes:
+                return
+            self.thread = threading.Thread(target=lambda: [self.fetch(remote) for remote in remotes], daemon=True)
+            self.thread.start()
+
+    def wait(self) -> None:
+        """
+        Wait for the background fetch, before git commands updating the same refs.
+        :return: None
+        """
+        thread = self.thread
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+    def ensure_fresh(self, remote: str) -> bool:
+        """
+        Make sure a remote is fresh, waiting for the background fetch or fetching it now.
+        :param remote: remote name
+        :return: True if the remote is fresh
+        """
+        self.wait()
+        return self.is_fresh(remote) or self.fetch(remote)
@@ -0,0 +1,180 @@
+import os
+import re
+
+
+class GitRefs:
+    """
+    Reader of git HEAD and branches straight from the .git directory, without running git.
+    Loose refs and packed-refs are cached and re-read only when their directory or file modification time changes,
+    git writes refs by renaming lock files, so every ref update changes the modification time of its directory.
+    """
+
+    def __init__(self, repo_dir: str = '.'):
+        """
+        :param repo_dir: path to the working tree of the repository
+        """
+        self.git_dir = self.find_git_dir(repo_dir)
+        # shared refs of linked worktrees are in the common directory
+        self.common_dir = self.git_dir
+        commondir_file = os.path.join(self.git_dir, 'commondir')
+        if os.path.exists(commondir_file):
+            with open(commondir_file, 'r') as fr:
+                self.common_dir = os.path.normpath(os.path.join(self.git_dir, fr.read().strip()))
+        self.dir_cache = {}  # directory -> (mtime, dict of ref name to target)
+        self.file_cache = {}  # file -> ((mtime, size), parsed content)
+
+    @staticmethod
+    def find_git_dir(repo_dir: str) -> str:
+        """
+        Find the git directory of a working tree, following a .git file of worktrees and submodules.
+        :param repo_dir: path to the working tree
+        :return: path to the git directory
+        """
+        git_path = os.path.join(repo_dir, '.git')
+        if os.path.isfile(git_path):
+            with open(git_path, 'r') as fr:
+                content = fr.read().strip()
+            if not content.startswith('gitdir:'):
+                raise ValueError(f"Invalid .git file: {git_path}")
+            return os.path.normpath(os.path.join(repo_dir, content.removeprefix('gitdir:').strip()))
+        if not os.path.isdir(git_path):
+            raise ValueError(f"Not a git repository: {repo_dir}")
+        return git_path
+
+    def read_cached(self, path: str, parse) -> object:
+        """
+        Read and parse a file, re-reading it only if it was modified.
+        :param path: path to the file
+        :param parse: function parsing the file content
+        :return: parsed content, or None if the file doesn't exist
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.file_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        with open(path, 'r') as fr:
+            parsed = parse(fr.read())
+        self.file_cache[path] = (key, parsed)
+        return parsed
+
+    @staticmethod
+    def parse_packed_refs(content: str) -> dict:
+        """
+        Parse packed-refs file.
+        :param content: content of the file
+        :return: dict of ref name to commit hash
+        """
+        refs = {}
+        for line in content.splitlines():
+            if not line or line.startswith(('#', '^')):
+                continue
+            sha, _, name = line.partition(' ')
+            refs[name.strip()] = sha
+        return refs
+
+    def read_loose_refs(self, directory: str, prefix: str) -> dict:
+        """
+        Read loose refs of a directory and its subdirectories, re-reading only modified directories.
+        :param directory: path to the refs directory
+        :param prefix: ref name prefix of the directory, e.g. "refs/heads/"
+        :return: dict of ref name to its content, a commit hash or "ref: <target>" for symbolic refs
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            return {}
+        cached = self.dir_cache.get(directory)
+        if cached and cached[0] == mtime:
+            refs = dict(cached[1])
+        else:
+            refs = {}
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.lock'):
+                    try:
+                        with open(entry.path, 'r') as fr:
+                            refs[prefix + entry.name] = fr.read().strip()
+                    except OSError:
+                        continue
+            self.dir_cache[directory] = (mtime, dict(refs))
+        for entry in entries:
+            if entry.is_dir():
+                refs.update(self.read_loose_refs(entry.path, f"{prefix}{entry.name}/"))
+        return refs
+
+    def list_refs(self, prefix: str) -> dict:
+        """
+        List refs, loose refs take precedence over packed ones.
+        :param prefix: ref name prefix, e.g. "refs/heads/"
+        :return: dict of ref name to its content, a commit hash or "ref: <target>" for symbolic refs
+        """
+        packed = self.read_cached(os.path.join(self.common_dir, 'packed-refs'), self.parse_packed_refs) or {}
+        refs = {name: sha for name, sha in packed.items() if name.startswith(prefix)}
+        refs.update(self.read_loose_refs(os.path.join(self.common_dir, *prefix.strip('/').split('/')), prefix))
+        return refs
+
+    @staticmethod
+    def parse_remotes(content: str) -> dict:
+        """
+        Parse remotes and their URLs from git config.
+        :param content: content of the config file
+        :return: dict of remote name to its URL, None if not set
+        """
+        remotes = {}
+        remote = None
+        for line in content.splitlines():
+            line = line.strip()
+            if line.startswith('['):
+                match = re.fullmatch(r'\[remote\s+"([^"]+)"\s*\]', line)
+                remote = match.group(1) if match else None
+                if remote:
+                    remotes.setdefault(remote, None)
+            elif remote and remotes[remote] is None and (match := re.fullmatch(r'url\s*=\s*(.+)', line)):
+                remotes[remote] = match.group(1).strip().strip('"')
+        return remotes
+
+    def remotes(self) -> list[str]:
+        """
+        List remotes of the repository.
+        :return: list of remote names
+        """
+        return list(self.read_cached(os.path.join(self.common_dir, 'config'), self.parse_remotes) or {})
+
+    def remote_url(self, remote: str) -> str | None:
+        """
+        Get URL of a remote.
+        :param remote: remote name
+        :return: URL, or None if not set
+        """
+        return (self.read_cached(os.path.join(self.common_dir, 'config'), self.parse_remotes) or {}).get(remote)
+
+    def head(self) -> str:
+        """
+        Get the current branch.
+        :return: branch name, or "HEAD" if detached, like git rev-parse --abbrev-ref HEAD
+        """
+        content = self.read_cached(os.path.join(self.git_dir, 'HEAD'), str.strip) or ''
+        if content.startswith('ref: refs/heads/'):
+            return content.removeprefix('ref: refs/heads/')
+        return 'HEAD'
+
+    def local_branches(self) -> list[str]:
+        """
+        List local branches.
+        :return: sorted list of branch names
+        """
+        return sorted(name.removeprefix('refs/heads/') for name in self.list_refs('refs/heads/'))
+
+    def remote_branches(self, remote: str = None) -> list[str]:
+        """
+        List remote-tracking branches, without symbolic refs like origin/HEAD.
+        :param remote: only branches of this remote
+        :return: sorted list of branch names with the remote, e.g. "origin/main"
+        """
+        prefix = f"refs/remotes/{remote}/" if remote else 'refs/remotes/'
+        return sorted(name.removeprefix('refs/remotes/') for name, target in self.list_refs(prefix).items()
+                      if not target.startswith('ref:'))
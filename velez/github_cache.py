@@ -0,0 +1,247 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+
+import requests
+import requests.adapters
+from velez.utils import human_readable_to_bytes
+
+try:
+    # internals of PyGithub, see the supported versions in pyproject.toml
+    from github.Requester import HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass, Requester
+    CACHE_SUPPORTED = hasattr(Requester, 'injectConnectionClasses') and hasattr(Requester, 'noopAuth')
+except ImportError:
+    HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass, Requester = None, object, None
+    CACHE_SUPPORTED = False
+
+GITHUB_CACHE_DIR = os.getenv('GITHUB_CACHE_DIR', os.path.expanduser('~/.cache/velez/github'))
+GITHUB_CACHE_SIZE = os.getenv('GITHUB_CACHE_SIZE', '100MB')
+GITHUB_CACHE_PRUNE_EVERY = 100  # number of cache writes between size checks
+CONDITIONAL_HEADERS = ['If-None-Match', 'If-Modified-Since']
+
+
+class ResponseCache:
+    """
+    Disk cache of GitHub API responses with their ETag or Last-Modified, evicting least recently used entries.
+    """
+
+    def __init__(self, cache_dir: str = GITHUB_CACHE_DIR, max_size: str = GITHUB_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = human_readable_to_bytes(max_size)
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'uncached': 0}
+        # responses of private repositories are readable only by the user
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        os.chmod(cache_dir, 0o700)
+
+    @staticmethod
+    def get_key(request: requests.PreparedRequest) -> str:
+        """
+        Get cache key of a request, responses differ per URL, token and requested media type.
+        :param request: request
+        :return: hex digest
+        """
+        parts = [request.url, request.headers.get('Authorization', ''), request.headers.get('Accept', '')]
+        return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        Get path of a cache entry.
+        :param key: cache key
+        :return: path to the cache file
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def read(self, key: str) -> dict | None:
+        """
+        Read cached response, marking it as recently used.
+        :param key: cache key
+        :return: dict with etag, last_modified, headers, encoding and content, or None if not cached
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, 'r') as fr:
+                entry = json.load(fr)
+            entry['content'] = base64.b64decode(entry['content'])
+            os.utime(path)
+            return entry
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write(self, key: str, response: requests.Response) -> None:
+        """
+        Write response to the cache atomically, checking the cache size every few writes.
+        :param key: cache key
+        :param response: response with ETag or Last-Modified header
+        :return: None
+        """
+        # content is kept as raw bytes, responses are not always text
+        entry = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                 'headers': dict(response.headers), 'encoding': response.encoding,
+                 'content': base64.b64encode(response.content).decode('ascii')}
+        path = self.get_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as fw:
+                json.dump(entry, fw)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing GitHub cache: {e}")
+            return
+        with self.lock:
+            self.writes += 1
+            prune = self.writes >= GITHUB_CACHE_PRUNE_EVERY
+            if prune:
+                self.writes = 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """
+        Evict least recently used responses until the cache fits its size limit.
+        :return: None
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def count(self, stat: str) -> None:
+        """
+        Count a cache lookup.
+        :param stat: hits, misses or uncached
+        :return: None
+        """
+        with self.lock:
+            self.stats[stat] += 1
+
+
+class CachingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTP adapter revalidating cached GET responses with If-None-Match or If-Modified-Since.
+    Responses not modified (304) are served from the cache and don't count against the GitHub rate limit.
+    """
+
+    def __init__(self, cache: ResponseCache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != 'GET' or any(h in request.headers for h in CONDITIONAL_HEADERS):
+            # conditional requests made by PyGithub itself expect a 304
+            return super().send(request, **kwargs)
+        key = self.cache.get_key(request)
+        entry = self.cache.read(key)
+        if entry and entry['etag']:
+            request.headers['If-None-Match'] = entry['etag']
+        elif entry and entry['last_modified']:
+            request.headers['If-Modified-Since'] = entry['last_modified']
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.count('hits')
+            return self.build_cached_response(request, response, entry)
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.cache.count('misses')
+            self.cache.write(key, response)
+        else:
+            self.cache.count('uncached')
+        return response
+
+    @staticmethod
+    def build_cached_response(request: requests.PreparedRequest, not_modified: requests.Response,
+                              entry: dict) -> requests.Response:
+        """
+        Build response from the cache, with current headers of the 304 response, e.g. rate limit.
+        :param request: request
+        :param not_modified: 304 response
+        :param entry: cache entry
+        :return: response
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        response.headers.update(not_modified.headers)
+        response.encoding = entry['encoding']
+        response._content = entry['content']
+        response.url = request.url
+        response.request = request
+        response.connection = getattr(not_modified, 'connection', None)
+        return response
+
+
+class CachingHTTPSConnection(HTTPSRequestsConnectionClass):
+    """
+    PyGithub connection using a session with the caching adapter.
+    Injected connections are not persisted by PyGithub, so a single session is shared to keep connections alive.
+    """
+
+    cache: ResponseCache = None
+    hooks: list = []
+    session: requests.Session = None
+    session_lock = threading.Lock()
+
+    def __init__(self, host: str, port: int = None, strict: bool = False, timeout: int = None, retry=None,
+                 pool_size: int = None, **kwargs):
+        self.host = host
+        self.port = port if port else 443
+        self.protocol = 'https'
+        self.timeout = timeout
+        self.verify = kwargs.get('verify', True)
+        with CachingHTTPSConnection.session_lock:
+            if CachingHTTPSConnection.session is None:
+                pool_size = pool_size or requests.adapters.DEFAULT_POOLSIZE
+                adapter = CachingHTTPAdapter(self.cache, max_retries=requests.adapters.DEFAULT_RETRIES
+                                             if retry is None else retry,
+                                             pool_connections=pool_size, pool_maxsize=pool_size)
+                session = requests.Session()
+                session.auth = Requester.noopAuth
+                session.mount('https://', adapter)
+                session.hooks['response'].extend(self.hooks)
+                CachingHTTPSConnection.session = session
+        self.session = CachingHTTPSConnection.session
+
+    def close(self) -> None:
+        # the shared session is kept open
+        pass
+
+
+def install_cache(cache: ResponseCache = None, hooks: list = None) -> ResponseCache:
+    """
+    Install the response cache for all GitHub clients created afterward, or add hooks to the already installed one.
+    The cache and hooks are shared by the whole process, so hooks of other clients are kept.
+    :param cache: response cache, the installed one, or a default one if none is installed, is used if not given
+    :param hooks: functions called with every response, e.g. to follow the rate limit
+    :return: installed response cache
+    """
+    if not CACHE_SUPPORTED:
+        print("GitHub API responses are not cached, the installed PyGithub version is not supported.")
+        return cache or ResponseCache()
+    with CachingHTTPSConnection.session_lock:
+        if CachingHTTPSConnection.cache is None or (cache is not None and cache is not CachingHTTPSConnection.cache):
+            CachingHTTPSConnection.cache = cache or ResponseCache()
+            # the session is bound to the adapter of the previous cache
+            CachingHTTPSConnection.session = None
+        for hook in hooks or []:
+            if hook not in CachingHTTPSConnection.hooks:
+                CachingHTTPSConnection.hooks.append(hook)
+                if CachingHTTPSConnection.session is not None:
+                    CachingHTTPSConnection.session.hooks['response'].append(hook)
+    Requester.injectConnectionClasses(HTTPRequestsConnectionClass, CachingHTTPSConnection)
+    return CachingHTTPSConnection.cache
@@ -1,15 +1,29 @@
+import json
 import os
-import re
+import sqlite3
 import sys
-from datetime import datetime
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlparse
 
 import github
 from pick import pick
 from velez.file_ops import FileOperations
-from velez.utils import STR_BACK, STR_EXIT, run_command
+from velez.git_fetch import BackgroundFetcher
+from velez.git_refs import GitRefs
+from velez.github_cache import install_cache
+from velez.issue_snapshot import IssueSnapshot
+from velez.rate_limit import GITHUB_WORKERS, RateLimitController
+from velez.utils import STR_BACK, STR_EXIT, run_command, run_command_with_status, print_markdown_table
 
 STALE_BRANCHES_DAYS = int(os.getenv('GITHUB_STALE_BRANCHES_DAYS', 45))
 STALE_BRANCHES_COMMITS = int(os.getenv('GITHUB_STALE_BRANCHES_COMMITS', 30))
+SEARCH_RESULTS_LIMIT = 1000  # GitHub search returns at most this many results
+DELETE_BRANCHES_CHUNK = 100  # number of branches deleted by a single push
+REPO_METADATA_FILE = os.getenv('GITHUB_METADATA_FILE', os.path.expanduser('~/.cache/velez/github-repos.json'))
+REPO_METADATA_TTL = int(os.getenv('GITHUB_METADATA_TTL', 86400))
 
 STR_COMMIT = "→ Commit"
 STR_AMEND = "⇢ Amend commit"
@@ -32,7 +46,11 @@ STR_LIST_PR_ORG = "⎘ List PRs for the whole organization"
 STR_CREATE_ISSUE = "✶ Create new issue"
 STR_LIST_ISSUES_REPO = "⎗ List issues in the repository"
 STR_LIST_ISSUES_ORG = "⎘ List issues for the whole organization"
+STR_FILTER_ISSUES_ORG = "⌕ Filter and count issues for the whole organization"
 STR_DELETE_STALE_BRANCHES = "⌦ Delete stale branches"
+STR_DELETE_SELECTED = "☑ Select stale branches to delete"
+STR_DELETE_ALL_EXCEPT = "☒ Delete all stale branches except selected"
+STR_DRY_RUN = "☐ Dry run, list stale branches and check deleting them"
 
 
 class GitHubOperations:
@@ -46,28 +64,100 @@ class GitHubOperations:
             input("Press Enter to return to the main menu...")
             self.velez.main_menu()
         auth = github.Auth.Token(os.getenv('GITHUB_TOKEN'))
-        with github.Github(auth=auth) as gh:
-            self.gh = gh
-            self.repo_url = run_command(['git', 'remote', 'get-url', 'origin'], quiet=True)[0].strip()
-            self.repo_name = self.repo_url.split('/')[-1].replace('.git', '')
-            self.owner_name = self.repo_url.split('/')[-2]
-            self.full_name = f"{self.owner_name}/{self.repo_name}"
-            self.branch = run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], quiet=True)[0].strip()
+        self.rate_limit = RateLimitController()  # Concurrency of bulk API calls, following the rate limit
+        self.cache = install_cache(hooks=[self.rate_limit.observe])  # Conditional requests for all API calls
+        self.gh = github.Github(auth=auth)
+        self.repo_url = run_command(['git', 'remote', 'get-url', 'origin'], quiet=True)[0].strip()
+        self.owner_name, self.repo_name = self.parse_remote_url(self.repo_url)
+        self.full_name = f"{self.owner_name}/{self.repo_name}"
+        self.refs = GitRefs(self.velez.base_dir)  # Branches read from the .git directory
+        self.branch = self.refs.head()
+        self.fetcher = BackgroundFetcher(self.refs, self.velez.base_dir)  # Remotes fetched in the background
+        self.fetcher.refresh()
+        self._repo = None  # GitHub repository, created on first use
+        self.metadata = None  # Repository metadata, fetched on first use
+
+    @property
+    def repo(self):
+        """
+        GitHub repository, created without any API call, its attributes are fetched on first access.
+        :return: PyGithub repository
+        """
+        if self._repo is None:
+            self._repo = self.gh.withLazy(True).get_repo(self.full_name)
+        return self._repo
+
+    @staticmethod
+    def parse_remote_url(url: str) -> tuple[str, str]:
+        """
+        Parse owner and repository name from a git remote URL, e.g. https://github.com/owner/repo.git,
+        git@github.com:owner/repo.git or ssh://git@github.com:22/owner/repo.
+        :param url: remote URL
+        :return: tuple with owner and repository name
+        """
+        url = url.strip()
+        if '://' in url:
+            path = urlparse(url).path
+        elif ':' in url:
+            path = url.split(':', 1)[1]
+        else:
+            path = url
+        parts = [p for p in path.strip('/').removesuffix('.git').split('/') if p]
+        if len(parts) < 2:
+            raise ValueError(f"Can't parse owner and repository from remote URL: {url}")
+        return parts[-2], parts[-1]
+
+    @staticmethod
+    def get_remote_host(url: str) -> str:
+        """
+        Get host of a git remote URL, e.g. github.com for https://github.com/owner/repo.git or
+        git@github.com:owner/repo.git.
+        :param url: remote URL
+        :return: host name in lower case, or empty string for local paths
+        """
+        url = url.strip()
+        if '://' in url:
+            return (urlparse(url).hostname or '').lower()
+        if ':' in url:
+            return url.split(':', 1)[0].rsplit('@', 1)[-1].lower()
+        return ''
+
+    def get_repo_metadata(self) -> dict:
+        """
+        Get repository metadata, cached on disk per remote URL until it expires.
+        :return: dict with full_name, default_branch and fetched_at
+        """
+        if self.metadata is not None:
+            return self.metadata
+        try:
+            with open(REPO_METADATA_FILE, 'r') as fr:
+                cache = json.load(fr)
+        except (OSError, ValueError):
+            cache = {}
+        entry = cache.get(self.repo_url)
+        if not entry or time.time() - entry.get('fetched_at', 0) > REPO_METADATA_TTL:
+            entry = {'full_name': self.repo.full_name, 'default_branch': self.repo.default_branch,
+                     'fetched_at': time.time()}
+            cache[self.repo_url] = entry
             try:
-                org = self.gh.get_organization(self.owner_name)
-            except github.GithubException:
-                org = None
-            if org:
-                self.repo = org.get_repo(self.repo_name)
-            else:
-                self.repo = self.gh.get_user(self.owner_name).get_repo(self.repo_name)
+                os.makedirs(os.path.dirname(REPO_METADATA_FILE), exist_ok=True)
+                temp_file = f"{REPO_METADATA_FILE}.{os.getpid()}.tmp"
+                with open(temp_file, 'w') as fw:
+                    json.dump(cache, fw, indent=2)
+                os.replace(temp_file, REPO_METADATA_FILE)
+            except OSError as e:
+                print(f"An error occurred: {e}")
+        self.metadata = entry
+        return entry
 
     def github_menu(self) -> None:
         """
         Display GitHub operations menu.
         :return: None
         """
-        title = f"Current branch: {self.branch}. Choose a GitHub operation:"
+        stats = self.cache.stats
+        title = f"Current branch: {self.branch}. API cache: {stats['hits']} not modified, {stats['misses']} fetched. " \
+                f"Choose a GitHub operation:"
         options = [
             STR_COMMIT,
             STR_AMEND,
@@ -117,7 +207,7 @@ class GitHubOperations:
         # format HCL files before committing
         if self.velez.file_ops is None:
             self.velez.file_ops = FileOperations(self.velez)
-        self.velez.file_ops.format_hcl_files()
+        self.velez.file_ops.format_hcl_files(mode='changed')
 
         run_command(['git', 'diff', '--compact-summary'])
         git_command = ['git', 'commit']
@@ -134,6 +224,7 @@ class GitHubOperations:
         :return: None
         """
         run_command(['git', 'status'])
+        self.fetcher.wait()
         if force:
             run_command(['git', 'push', '--set-upstream', 'origin', self.branch, '--force'])
         else:
@@ -155,8 +246,10 @@ class GitHubOperations:
         option, index = pick(options, title)
 
         if option == STR_REBASE:
+            self.fetcher.wait()
             run_command(['git', 'pull', '--rebase'])
         elif option == STR_PULL:
+            self.fetcher.wait()
             run_command(['git', 'pull'])
         elif option == STR_BACK:
             self.github_menu()
@@ -216,9 +309,8 @@ class GitHubOperations:
         Select a local branch.
         :return: None
         """
-        run_command(['git', 'fetch', '--all'])
-        branches = run_command(['git', 'branch', '--all'])[0].split('\n')
-        branches = [re.sub(r'^\* ', '', branch.strip()) for branch in branches if branch]
+        self.fetcher.refresh()
+        branches = self.refs.local_branches() + [f"remotes/{b}" for b in self.refs.remote_branches()]
         branches += [STR_BACK, STR_EXIT]
         title = f"Current branch: {self.branch}. Select a local branch:"
         option, index = pick(branches, title)
@@ -227,8 +319,8 @@ class GitHubOperations:
         elif option == STR_EXIT:
             sys.exit()
         else:
-            self.branch = option
             run_command(['git', 'checkout', option])
+            self.branch = self.refs.head()
         input("Press Enter to return to the branches menu...")
 
     def select_remote_branch(self) -> None:
@@ -236,9 +328,8 @@ class GitHubOperations:
         Select a remote branch.
         :return: None
         """
-        run_command(['git', 'fetch', '--all'])
-        branches = run_command(['git', 'branch', '--remote'])[0].split('\n')
-        branches = [branch.strip() for branch in branches if branch]
+        self.fetcher.refresh()
+        branches = self.refs.remote_branches()
         branches += [STR_BACK, STR_EXIT]
         title = f"Current branch: {self.branch}. Select a remote branch:"
         option, index = pick(branches, title)
@@ -247,8 +338,11 @@ class GitHubOperations:
         elif option == STR_EXIT:
             sys.exit()
         else:
+            # the background fetch holds the same ref locks
+            self.fetcher.wait()
             run_command(['git', 'checkout', option])
             run_command(['git', 'pull'])
+            self.branch = self.refs.head()
         input("Press Enter to return to the branches menu...")
 
     def delete_local_branch(self) -> None:
@@ -256,9 +350,8 @@ class GitHubOperations:
         Delete a local branch.
         :return: None
         """
-        run_command(['git', 'fetch', '--prune'])
-        branches = run_command(['git', 'branch'])[0].split('\n')
-        branches = [branch.strip() for branch in branches if branch]
+        self.fetcher.refresh()
+        branches = [branch for branch in self.refs.local_branches() if branch != self.branch]
         branches += [STR_BACK, STR_EXIT]
         title = f"Current branch: {self.branch}. Select a local branch to delete:"
         option, index = pick(branches, title)
@@ -275,9 +368,8 @@ class GitHubOperations:
         Delete a remote branch.
         :return: None
         """
-        run_command(['git', 'fetch', '--prune'])
-        branches = run_command(['git', 'branch', '--remote'])[0].split('\n')
-        branches = [re.sub(r'^origin/', '', branch.strip()) for branch in branches if branch]
+        self.fetcher.refresh()
+        branches = [branch.removeprefix('origin/') for branch in self.refs.remote_branches('origin')]
         branches += [STR_BACK, STR_EXIT]
         title = f"Current branch: {self.branch}. Select a remote branch to delete:"
         option, index = pick(branches, title)
@@ -286,6 +378,7 @@ class GitHubOperations:
         elif option == STR_EXIT:
             sys.exit()
         else:
+            self.fetcher.wait()
             run_command(['git', 'push', 'origin', '--delete', option])
         input("Press Enter to return to the branches menu...")
 
@@ -322,8 +415,8 @@ class GitHubOperations:
         Create a pull request from the current branch.
         :return: None
         """
-        base_branch = self.repo.default_branch
-        head_branch = run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], quiet=True)[0].strip()
+        base_branch = self.get_repo_metadata()['default_branch']
+        head_branch = self.refs.head()
         title = input("Enter the pull request title: ")
         body = input("Enter the pull request description: ")
 
@@ -333,22 +426,49 @@ class GitHubOperations:
 
     def list_open_pull_requests(self, repo_only: bool) -> None:
         """
-        List open pull requests in the repository or the whole organization.
+        List open pull requests in the repository or the whole organization, printing them as they arrive.
         :param repo_only: if True, list pull requests for the repository only
         :return: None
         """
         if repo_only:
             pull_requests = self.repo.get_pulls(state='open')
         else:
-            org = self.gh.get_organization(self.owner_name)
-            pull_requests = []
-            for repo in org.get_repos():
-                pull_requests.extend(repo.get_pulls(state='open'))
+            pull_requests = self.iter_org_pull_requests()
 
+        count = 0
         for pr in pull_requests:
-            print(f"#{pr.number} - {pr.title}\nURL: {pr.html_url}\n")
+            print(f"#{pr.number} - {pr.title}\nURL: {pr.html_url}\n", flush=True)
+            count += 1
+        print(f"{count} open pull requests.")
         input("Press Enter to return to the GitHub menu...")
 
+    def iter_org_repos(self, fetch) -> Iterator:
+        """
+        Call a function on all non-archived repositories of the organization concurrently,
+        as fast as the rate limit allows.
+        :param fetch: function called with a repository, returning a list of items
+        :return: iterator of items, in order of completion
+        """
+        org = self.gh.get_organization(self.owner_name)
+        # the reported size is not reliable for small repositories, so empty ones are not skipped
+        repos = [repo for repo in org.get_repos() if not repo.archived]
+        for repo, items in self.rate_limit.map(lambda r: list(fetch(r)), repos):
+            if isinstance(items, Exception):
+                print(f"An error occurred in {repo.full_name}: {items}")
+            else:
+                yield from items
+
+    def iter_org_pull_requests(self) -> Iterator:
+        """
+        Iterate over open pull requests of the organization with a single search query, one page at a time.
+        Repositories are listed concurrently instead if there are more results than the search can return.
+        :return: iterator of pull requests, or issues representing them if found by search
+        """
+        results = self.gh.search_issues(f"is:pr is:open archived:false org:{self.owner_name}", sort='updated')
+        if results.totalCount < SEARCH_RESULTS_LIMIT:
+            return iter(results)
+        return self.iter_org_repos(lambda repo: repo.get_pulls(state='open'))
+
     def issues_menu(self) -> None:
         """
         Display issues submenu.
@@ -359,6 +479,7 @@ class GitHubOperations:
             STR_CREATE_ISSUE,
             STR_LIST_ISSUES_REPO,
             STR_LIST_ISSUES_ORG,
+            STR_FILTER_ISSUES_ORG,
             STR_BACK,
             STR_EXIT
         ]
@@ -370,6 +491,8 @@ class GitHubOperations:
             self.list_open_issues(repo_only=True)
         elif option == STR_LIST_ISSUES_ORG:
             self.list_open_issues(repo_only=False)
+        elif option == STR_FILTER_ISSUES_ORG:
+            self.filter_org_issues()
         elif option == STR_BACK:
             self.github_menu()
         elif option == STR_EXIT:
@@ -392,48 +515,174 @@ class GitHubOperations:
     def list_open_issues(self, repo_only: bool) -> None:
         """
         List open issues in the repository or the whole organization.
+        Issues of the organization are listed from the local snapshot, synchronized first.
         :param repo_only: if True, list issues for the repository only
         :return: None
         """
         if repo_only:
-            issues = self.repo.get_issues(state='open')
+            issues = [{'number': i.number, 'title': i.title, 'url': i.html_url}
+                      for i in self.repo.get_issues(state='open')]
         else:
-            org = self.gh.get_organization(self.owner_name)
-            issues = []
-            for repo in org.get_repos():
-                issues.extend(repo.get_issues(state='open'))
+            issues = self.sync_org_issues().list_issues(self.owner_name)
 
         for issue in issues:
-            print(f"#{issue.number} - {issue.title}\nURL: {issue.html_url}\n")
+            print(f"#{issue['number']} - {issue['title']}\nURL: {issue['url']}\n")
+        input("Press Enter to return to the GitHub menu...")
+
+    def sync_org_issues(self) -> IssueSnapshot:
+        """
+        Synchronize the local snapshot of issues of the organization.
+        :return: issue snapshot
+        """
+        snapshot = IssueSnapshot()
+        try:
+            updated, removed = snapshot.sync(self.gh.get_organization(self.owner_name))
+            print(f"Issue snapshot synchronized: {updated} updated, {removed} closed.")
+        except (github.GithubException, sqlite3.Error) as e:
+            print(f"An error occurred: {e}, using the last snapshot.")
+        return snapshot
+
+    def filter_org_issues(self) -> None:
+        """
+        Filter open issues of the organization by repository, label and assignee, and count them per repository.
+        :return: None
+        """
+        snapshot = self.sync_org_issues()
+        repo = input("Filter by repository (leave empty for all): ")
+        label = input("Filter by label (leave empty for all): ")
+        assignee = input("Filter by assignee (leave empty for all): ")
+        issues = snapshot.list_issues(self.owner_name, repo=repo or None, label=label or None,
+                                      assignee=assignee or None)
+        for issue in issues:
+            print(f"{issue['repo']}#{issue['number']} - {issue['title']} [{', '.join(issue['labels'])}]\n"
+                  f"URL: {issue['url']}\n")
+        counts = {}
+        for issue in issues:
+            counts[issue['repo']] = counts.get(issue['repo'], 0) + 1
+        print_markdown_table("Repository | Open issues", [[r, str(c)] for r, c in sorted(counts.items())])
         input("Press Enter to return to the GitHub menu...")
 
     def get_stale_branches(self) -> list:
         """
         Get a list of stale branches based on the set criteria.
+        Branches are checked locally after fetching origin if not fresh, the GitHub API is used only if origin can't be
+        fetched.
         :return: list of stale branches
         """
-        stale_branches = []
-        branches = self.repo.get_branches()
-        main_branch = self.repo.get_branch(self.repo.default_branch)
-        main_branch_commit = main_branch.commit
+        if not self.fetcher.ensure_fresh('origin'):
+            print("An error occurred fetching origin, using the GitHub API.")
+            return self.get_stale_branches_api()
+        main_branch = self.get_default_remote_branch()
+        branches = self.get_remote_branches_info(main_branch)
+        return self.find_stale_branches(branches, main_branch, datetime.now(tz=timezone.utc))
+
+    def get_default_remote_branch(self) -> str:
+        """
+        Get the default branch of origin from the local origin/HEAD, or from the GitHub API if not set.
+        :return: default branch name
+        """
+        return self.get_origin_head() or self.get_repo_metadata()['default_branch']
+
+    @staticmethod
+    def get_origin_head(repo_dir: str = '.') -> str | None:
+        """
+        Get the default branch of origin from the local origin/HEAD.
+        :param repo_dir: path to the repository
+        :return: default branch name, or None if origin/HEAD is not set
+        """
+        code, out, _, _ = run_command_with_status(['git', '-C', repo_dir, 'symbolic-ref', '--short',
+                                                   'refs/remotes/origin/HEAD'])
+        if code == 0 and out.strip():
+            return out.strip().removeprefix('origin/')
+        return None
+
+    @staticmethod
+    def get_remote_branches_info(main_branch: str, repo_dir: str = '.') -> dict:
+        """
+        Get date of the last commit and number of commits behind the default branch of all branches of origin.
+        The counts come from a single for-each-ref call, or from rev-list calls run concurrently on git before 2.41.
+        :param main_branch: default branch name
+        :param repo_dir: path to the repository
+        :return: dict of branch name to tuple with date of the last commit and number of commits behind
+        """
+        main_ref = f"refs/remotes/origin/{main_branch}"
+        git = ['git', '-C', repo_dir]
+        code, out, _, _ = run_command_with_status(
+            git + ['for-each-ref', f'--format=%(refname:lstrip=3)%09%(authordate:unix)%09%(ahead-behind:{main_ref})',
+                   'refs/remotes/origin/'])
+        if code == 0:
+            return GitHubOperations.parse_branches_info(out)
+
+        _, out, _, _ = run_command_with_status(
+            git + ['for-each-ref', '--format=%(refname:lstrip=3)%09%(authordate:unix)', 'refs/remotes/origin/'])
+        branches = GitHubOperations.parse_branches_info(out)
+
+        def count_behind(branch: str) -> int:
+            _, count, _, _ = run_command_with_status(
+                git + ['rev-list', '--count', f"refs/remotes/origin/{branch}..{main_ref}"])
+            return int(count.strip() or 0)
+
+        with ThreadPoolExecutor(max_workers=GITHUB_WORKERS) as executor:
+            counts = executor.map(count_behind, branches)
+        return {branch: (branches[branch][0], behind) for branch, behind in zip(list(branches), counts)}
+
+    @staticmethod
+    def parse_branches_info(output: str) -> dict:
+        """
+        Parse for-each-ref output with branch name, author date and optionally ahead and behind counts.
+        :param output: for-each-ref output, one tab separated branch per line
+        :return: dict of branch name to tuple with date of the last commit and number of commits behind, or None
+        """
+        branches = {}
+        for line in output.splitlines():
+            fields = line.split('\t')
+            if len(fields) < 2 or fields[0] == 'HEAD':
+                continue
+            behind = int(fields[2].split()[1]) if len(fields) > 2 and fields[2] else None
+            branches[fields[0]] = (datetime.fromtimestamp(int(fields[1]), tz=timezone.utc), behind)
+        return branches
 
-        for branch in branches:
-            if branch.name == main_branch.name:
+    @staticmethod
+    def find_stale_branches(branches: dict, main_branch: str, now: datetime) -> list:
+        """
+        Find stale branches based on the set criteria.
+        :param branches: dict of branch name to tuple with date of the last commit and number of commits behind
+        :param main_branch: default branch name
+        :param now: current time
+        :return: list of stale branches
+        """
+        stale_branches = []
+        for branch, (commit_date, commits_behind) in sorted(branches.items()):
+            if branch == main_branch:
                 continue
+            if (now - commit_date).days > STALE_BRANCHES_DAYS or (commits_behind or 0) > STALE_BRANCHES_COMMITS:
+                stale_branches.append(branch)
+        return stale_branches
 
-            branch_commit = branch.commit
-            commit_date = branch_commit.commit.author.date
-            days_since_last_commit = (datetime.now(tz=commit_date.tzinfo) - commit_date).days
-            commits_behind = self.repo.compare(main_branch_commit.sha, branch_commit.sha).behind_by
+    def get_stale_branches_api(self) -> list:
+        """
+        Get a list of stale branches based on the set criteria, comparing branches concurrently with the GitHub API.
+        :return: list of stale branches
+        """
+        main_branch = self.repo.get_branch(self.get_repo_metadata()['default_branch'])
+        main_branch_commit = main_branch.commit
+        branches = [branch for branch in self.repo.get_branches() if branch.name != main_branch.name]
 
-            if days_since_last_commit > STALE_BRANCHES_DAYS or commits_behind > STALE_BRANCHES_COMMITS:
-                stale_branches.append(branch.name)
+        def get_branch_info(branch) -> tuple:
+            commit_date = branch.commit.commit.author.date
+            return commit_date, self.repo.compare(main_branch_commit.sha, branch.commit.sha).behind_by
 
-        return stale_branches
+        infos = {}
+        for branch, info in self.rate_limit.map(get_branch_info, branches):
+            if isinstance(info, Exception):
+                print(f"An error occurred comparing {branch.name}: {info}")
+            else:
+                infos[branch.name] = info
+        return self.find_stale_branches(infos, main_branch.name, datetime.now(tz=timezone.utc))
 
     def delete_stale_branches(self) -> None:
         """
-        Delete stale branches based on the set criteria.
+        Delete stale branches based on the set criteria, selected or all except selected, with a single push.
         :return: None
         """
         stale_branches = self.get_stale_branches()
@@ -442,12 +691,36 @@ class GitHubOperations:
             input("Press Enter to return to the branches menu...")
             return
 
-        title = f"Current branch: {self.branch}. Select a stale branch to delete:"
-        option, index = pick(stale_branches + [STR_BACK, STR_EXIT], title)
+        title = f"Current branch: {self.branch}. Found {len(stale_branches)} stale branches:"
+        option, index = pick([STR_DELETE_SELECTED, STR_DELETE_ALL_EXCEPT, STR_DRY_RUN, STR_BACK, STR_EXIT], title)
         if option == STR_BACK:
-            self.branches_menu()
+            return
         elif option == STR_EXIT:
             sys.exit()
+        elif option == STR_DRY_RUN:
+            print('\n'.join(stale_branches))
+            self.delete_remote_branches(stale_branches, dry_run=True)
         else:
-            run_command(['git', 'push', 'origin', '--delete', option])
-            input("Press Enter to return to the branches menu...")
+            title = "Select branches to delete (SPACE to mark, ENTER to confirm):" if option == STR_DELETE_SELECTED \
+                else "Select branches to keep (SPACE to mark, ENTER to confirm):"
+            selected = [branch for branch, _ in pick(stale_branches, title, multiselect=True)]
+            branches = selected if option == STR_DELETE_SELECTED else \
+                [branch for branch in stale_branches if branch not in selected]
+            if not branches:
+                print("No branches to delete.")
+            elif input(f"Delete {len(branches)} branches from origin? (y/n): ") == 'y':
+                self.fetcher.wait()
+                self.delete_remote_branches(branches)
+        input("Press Enter to return to the branches menu...")
+
+    @staticmethod
+    def delete_remote_branches(branches: list, dry_run: bool = False) -> None:
+        """
+        Delete branches from origin, many branches with a single push.
+        :param branches: list of branch names
+        :param dry_run: if True, only check what would be deleted
+        :return: None
+        """
+        for i in range(0, len(branches), DELETE_BRANCHES_CHUNK):
+            command = ['git', 'push', 'origin'] + (['--dry-run'] if dry_run else [])
+            run_command(command + ['--delete'] + branches[i:i + DELETE_BRANCHES_CHUNK])
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import statistics
+import time
+
+HISTORY_DB = os.getenv('VELEZ_HISTORY_DB', os.path.expanduser('~/.cache/velez/history.sqlite'))
+HISTORY_ESTIMATE_RUNS = 5  # number of recent successful runs used for estimates
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Get a percentile of values, interpolating between the closest ranks.
+    :param values: list of values
+    :param percent: percentile, from 0 to 100
+    :return: percentile value
+    """
+    values = sorted(values)
+    rank = (len(values) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+class ExecutionHistory:
+    """
+    Local SQLite store of Terragrunt runs, with their duration and resource usage.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB):
+        """
+        :param db_path: path to the database, history is disabled if it can't be created
+        """
+        self.db_path = db_path
+        try:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            with self.connect() as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    module TEXT NOT NULL,
+                    command TEXT NOT NULL,
+                    exit_code INTEGER NOT NULL,
+                    wall_time REAL NOT NULL,
+                    cpu_time REAL NOT NULL,
+                    max_rss INTEGER NOT NULL,
+                    output_size INTEGER NOT NULL
+                )''')
+                conn.execute('CREATE INDEX IF NOT EXISTS runs_module_command ON runs (module, command)')
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error opening run history, runs are not recorded: {e}")
+            self.db_path = None
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open a connection, one is used per operation so the store can be used from many threads.
+        :return: connection
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def query(self, sql: str, params: tuple) -> list[tuple]:
+        """
+        Run a read query.
+        :param sql: SQL query
+        :param params: query parameters
+        :return: list of rows, empty if history is disabled or the query failed
+        """
+        if not self.db_path:
+            return []
+        try:
+            with self.connect() as conn:
+                return conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading run history: {e}")
+            return []
+
+    @staticmethod
+    def get_command_name(args: list) -> str:
+        """
+        Get command name of Terragrunt arguments, e.g. "plan" for ['run', 'plan', '-target', 'x'].
+        :param args: Terragrunt arguments
+        :return: command name
+        """
+        args = [a for a in args if a and not a.startswith('-')]
+        if len(args) > 1 and args[0] == 'run':
+            # keep subcommands, e.g. "state list"
+            return ' '.join(args[1:3]) if args[1] == 'state' else args[1]
+        return args[0] if args else ''
+
+    def record(self, module: str, args: list, exit_code: int, wall_time: float, cpu_time: float, max_rss: int,
+               output_size: int) -> None:
+        """
+        Record a Terragrunt run.
+        :param module: path to the module
+        :param args: Terragrunt arguments
+        :param exit_code: exit code of the run
+        :param wall_time: wall time in seconds
+        :param cpu_time: user and system CPU time in seconds
+        :param max_rss: maximum resident set size in bytes
+        :param output_size: size of stdout and stderr in bytes
+        :return: None
+        """
+        if not self.db_path:
+            return
+        try:
+            with self.connect() as conn:
+                conn.execute('INSERT INTO runs (started_at, module, command, exit_code, wall_time, cpu_time, max_rss, '
+                             'output_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (time.time() - wall_time, module, self.get_command_name(args), exit_code, wall_time,
+                              cpu_time, max_rss, output_size))
+        except sqlite3.Error as e:
+            print(f"Error recording run history: {e}")
+
+    def estimate(self, module: str, command: str) -> float | None:
+        """
+        Estimate duration of a run from the median of recent successful runs.
+        :param module: path to the module
+        :param command: command name
+        :return: estimated duration in seconds, or None if never run
+        """
+        rows = self.query('SELECT wall_time FROM runs WHERE module = ? AND command = ? AND exit_code = 0 '
+                          'ORDER BY id DESC LIMIT ?', (module, command, HISTORY_ESTIMATE_RUNS))
+        return statistics.median(r[0] for r in rows) if rows else None
+
+    def command_stats(self, module_prefix: str = '') -> list[dict]:
+        """
+        Get duration percentiles per command.
+        :param module_prefix: only include modules with this path prefix
+        :return: list of dicts with command, runs, failures, p50 and p95, sorted by command
+        """
+        rows = self.query('SELECT command, wall_time, exit_code FROM runs WHERE module LIKE ?', (f"{module_prefix}%",))
+        by_command = {}
+        for command, wall_time, exit_code in rows:
+            by_command.setdefault(command, []).append((wall_time, exit_code))
+        return [{'command': command, 'runs': len(runs), 'failures': sum(1 for r in runs if r[1] != 0),
+                 'p50': percentile([r[0] for r in runs], 50), 'p95': percentile([r[0] for r in runs], 95)}
+                for command, runs in sorted(by_command.items())]
+
+    def slowest_modules(self, module_prefix: str = '', limit: int = 20) -> list[dict]:
+        """
+        Get modules with the longest average duration of a command.
+        :param module_prefix: only include modules with this path prefix
+        :param limit: maximum number of modules
+        :return: list of dicts with module, command, runs, average and max wall time, average CPU time and max RSS
+        """
+        rows = self.query('SELECT module, command, COUNT(*), AVG(wall_time), MAX(wall_time), AVG(cpu_time), '
+                          'MAX(max_rss) FROM runs WHERE module LIKE ? GROUP BY module, command '
+                          'ORDER BY AVG(wall_time) DESC LIMIT ?', (f"{module_prefix}%", limit))
+        keys = ['module', 'command', 'runs', 'avg_wall_time', 'max_wall_time', 'avg_cpu_time', 'max_rss']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def trend(self, module: str, command: str, limit: int = 10) -> list[float]:
+        """
+        Get durations of recent runs, oldest first.
+        :param module: path to the module
+        :param command: command name
+        :param limit: maximum number of runs
+        :return: list of durations in seconds
+        """
+        rows = self.query('SELECT wall_time FROM runs WHERE module = ? AND command = ? ORDER BY id DESC LIMIT ?',
+                          (module, command, limit))
+        return [r[0] for r in reversed(rows)]
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+ISSUES_DB = os.getenv('GITHUB_ISSUES_DB', os.path.expanduser('~/.cache/velez/issues.sqlite'))
+ISSUES_FULL_SYNC_TTL = int(os.getenv('GITHUB_ISSUES_FULL_SYNC_TTL', 86400))
+SYNC_OVERLAP = timedelta(minutes=1)  # re-fetch issues updated shortly before the last sync, to tolerate clock skew
+
+
+class IssueSnapshot:
+    """
+    Local SQLite snapshot of open issues of an organization, synchronized incrementally.
+    Only issues updated since the last synchronization are fetched, closed ones are removed from the snapshot.
+    All open issues are fetched again periodically, to remove issues which were transferred or deleted.
+    """
+
+    def __init__(self, db_path: str = ISSUES_DB):
+        """
+        :param db_path: path to the database, a snapshot in memory is used if it can't be created
+        """
+        self.db_path = db_path
+        self.memory = None
+        try:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self.create_schema()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error opening issue snapshot, issues are synchronized in memory: {e}")
+            self.db_path = None
+            self.memory = sqlite3.connect(':memory:')
+            self.create_schema()
+
+    def create_schema(self) -> None:
+        """
+        Create tables of the snapshot if they don't exist.
+        :return: None
+        """
+        with self.connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS issues (
+                org TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                url TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                assignees TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (repo, number)
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS issues_org ON issues (org, repo)')
+            conn.execute('CREATE TABLE IF NOT EXISTS syncs (org TEXT PRIMARY KEY, synced_at TEXT NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS full_syncs (org TEXT PRIMARY KEY, synced_at TEXT NOT NULL)')
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open a connection, or return the connection of the snapshot in memory.
+        :return: connection
+        """
+        if self.memory is not None:
+            return self.memory
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def get_synced_at(self, org: str, full: bool = False) -> datetime | None:
+        """
+        Get time of the last synchronization of an organization.
+        :param org: organization name
+        :param full: if True, get time of the last synchronization of all open issues
+        :return: time of the last synchronization, or None if never synchronized
+        """
+        with self.connect() as conn:
+            row = conn.execute(f"SELECT synced_at FROM {'full_syncs' if full else 'syncs'} WHERE org = ?",
+                               (org,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def sync(self, org) -> tuple[int, int]:
+        """
+        Synchronize issues of an organization, fetching only issues updated since the last synchronization,
+        or all open issues if the last full synchronization is older than its TTL.
+        :param org: PyGithub organization
+        :return: tuple with numbers of updated and removed issues
+        """
+        started_at = datetime.now(timezone.utc)
+        synced_at = self.get_synced_at(org.login)
+        full_synced_at = self.get_synced_at(org.login, full=True)
+        full = not synced_at or not full_synced_at or \
+            started_at - full_synced_at > timedelta(seconds=ISSUES_FULL_SYNC_TTL)
+        if full:
+            issues = org.get_issues(filter='all', state='open')
+        else:
+            issues = org.get_issues(filter='all', state='all', since=synced_at - SYNC_OVERLAP)
+        updated, removed = 0, 0
+        with self.connect() as conn:
+            stale = set(conn.execute('SELECT repo, number FROM issues WHERE org = ?', (org.login,))) if full else set()
+            for issue in issues:
+                if issue.pull_request is not None:
+                    continue
+                repo = issue.repository.full_name
+                stale.discard((repo, issue.number))
+                if issue.state == 'open':
+                    conn.execute('INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (org.login, repo, issue.number, issue.title, issue.html_url,
+                                  json.dumps(sorted(label.name for label in issue.labels)),
+                                  json.dumps(sorted(assignee.login for assignee in issue.assignees)),
+                                  issue.updated_at.isoformat()))
+                    updated += 1
+                else:
+                    removed += conn.execute('DELETE FROM issues WHERE repo = ? AND number = ?',
+                                            (repo, issue.number)).rowcount
+            # issues transferred, deleted or of repositories archived since are never returned by updates
+            for repo, number in stale:
+                removed += conn.execute('DELETE FROM issues WHERE repo = ? AND number = ?', (repo, number)).rowcount
+            conn.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?)', (org.login, started_at.isoformat()))
+            if full:
+                conn.execute('INSERT OR REPLACE INTO full_syncs VALUES (?, ?)', (org.login, started_at.isoformat()))
+        return updated, removed
+
+    def list_issues(self, org: str, repo: str = None, label: str = None, assignee: str = None) -> list[dict]:
+        """
+        List open issues from the snapshot.
+        :param org: organization name
+        :param repo: only issues of this repository, given as full name or name
+        :param label: only issues with this label
+        :param assignee: only issues assigned to this user
+        :return: list of dicts with repo, number, title, url, labels and assignees, most recently updated first
+        """
+        query = 'SELECT repo, number, title, url, labels, assignees FROM issues WHERE org = ?'
+        params = [org]
+        if repo:
+            query += ' AND (repo = ? OR repo = ?)'
+            params += [repo, f"{org}/{repo}"]
+        if label:
+            query += ' AND EXISTS (SELECT 1 FROM json_each(labels) WHERE value = ?)'
+            params.append(label)
+        if assignee:
+            query += ' AND EXISTS (SELECT 1 FROM json_each(assignees) WHERE value = ?)'
+            params.append(assignee)
+        with self.connect() as conn:
+            rows = conn.execute(query + ' ORDER BY updated_at DESC', params).fetchall()
+        return [{'repo': r[0], 'number': r[1], 'title': r[2], 'url': r[3], 'labels': json.loads(r[4]),
+                 'assignees': json.loads(r[5])} for r in rows]
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import github
+
+GITHUB_WORKERS = int(os.getenv('GITHUB_WORKERS', 8))
+RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', 100))
+RATE_LIMIT_RETRIES = 3  # attempts of an item hitting the rate limit
+
+
+class RateLimitController:
+    """
+    Concurrency controller for GitHub API fan-out, fed with headers of every API response.
+    Concurrency is halved when a rate limit is hit and grows back by one worker after each round of successful
+    responses. Work is paused until Retry-After or the rate limit reset, and spread over the time left until the reset
+    when the remaining quota is lower than the remaining work.
+    """
+
+    def __init__(self, max_workers: int = GITHUB_WORKERS, reserve: int = RATE_LIMIT_RESERVE):
+        """
+        :param max_workers: maximum number of concurrent workers
+        :param reserve: requests of the quota left for other operations
+        """
+        self.max_workers = max_workers
+        self.reserve = reserve
+        self.concurrency = max_workers
+        self.running = 0
+        self.pending = 0
+        self.successes = 0
+        self.remaining = None
+        self.reset_at = 0.0
+        self.paused_until = 0.0
+        self.last_start = 0.0
+        self.condition = threading.Condition()
+
+    def observe(self, response, *args, **kwargs):
+        """
+        Update the state from an API response, used as a requests response hook.
+        :param response: requests response
+        :return: the response
+        """
+        headers = response.headers
+        now = time.time()
+        with self.condition:
+            if 'X-RateLimit-Remaining' in headers:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+                self.reset_at = float(headers.get('X-RateLimit-Reset', 0))
+            retry_after = headers.get('Retry-After')
+            if response.status_code in [403, 429] and (retry_after or self.remaining == 0):
+                wait = float(retry_after) if retry_after else max(0.0, self.reset_at - now)
+                self.paused_until = max(self.paused_until, now + wait)
+                self.concurrency = max(1, self.concurrency // 2)
+                self.successes = 0
+            elif response.status_code < 400 and self.concurrency < self.max_workers:
+                self.successes += 1
+                if self.successes >= self.concurrency:
+                    self.concurrency += 1
+                    self.successes = 0
+            self.condition.notify_all()
+        return response
+
+    def get_delay(self, now: float) -> float:
+        """
+        Get time to wait before starting the next item.
+        :param now: current time
+        :return: delay in seconds
+        """
+        if self.paused_until > now:
+            return self.paused_until - now
+        if self.remaining is None or self.remaining - self.reserve >= self.pending:
+            return 0.0
+        if self.remaining <= self.reserve:
+            return max(0.0, self.reset_at - now)
+        interval = max(0.0, self.reset_at - now) / (self.remaining - self.reserve)
+        return max(0.0, self.last_start + interval - now)
+
+    def acquire(self) -> None:
+        """
+        Wait for a free worker slot and the rate limit.
+        :return: None
+        """
+        with self.condition:
+            while True:
+                now = time.time()
+                delay = self.get_delay(now)
+                if delay <= 0 and self.running < self.concurrency:
+                    self.running += 1
+                    self.pending -= 1
+                    self.last_start = now
+                    return
+                self.condition.wait(timeout=delay if delay > 0 else None)
+
+    def release(self) -> None:
+        """
+        Release a worker slot.
+        :return: None
+        """
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def call(self, fn, item):
+        """
+        Call a function on an item within the limits, retrying if the rate limit is hit.
+        :param fn: function to call
+        :param item: item
+        :return: result of the function
+        """
+        for attempt in range(RATE_LIMIT_RETRIES):
+            self.acquire()
+            try:
+                return fn(item)
+            except github.RateLimitExceededException:
+                if attempt == RATE_LIMIT_RETRIES - 1:
+                    raise
+                with self.condition:
+                    self.pending += 1
+            finally:
+                self.release()
+
+    def map(self, fn, items: list) -> Iterator[tuple]:
+        """
+        Call a function on all items concurrently, as fast as the rate limit allows.
+        :param fn: function to call
+        :param items: list of items
+        :return: iterator of tuples with item and result, or exception raised, in order of completion
+        """
+        with self.condition:
+            self.pending += len(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.call, fn, item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+CHECKPOINT_DIR = os.getenv('VELEZ_CHECKPOINT_DIR', os.path.expanduser('~/.cache/velez/checkpoints'))
+SKIP_DIRS = ['.terragrunt-cache', '.terraform', '.git']
+
+
+def hash_module_inputs(module_dir: str, config: dict, arguments: list) -> str:
+    """
+    Hash inputs of a module run: its files, rendered configuration (including included files) and arguments.
+    Files of nested modules and caches are not included.
+    :param module_dir: path to the module
+    :param config: rendered Terragrunt configuration of the module
+    :param arguments: Terraform command and its arguments
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([config, arguments], sort_keys=True, default=str).encode())
+    for root, dirs, files in os.walk(module_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS
+                         and not os.path.exists(os.path.join(root, d, 'terragrunt.hcl')))
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            digest.update(os.path.relpath(path, module_dir).encode() + b'\0')
+            try:
+                with open(path, 'rb') as fr:
+                    for chunk in iter(lambda: fr.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            except OSError:
+                continue
+    return digest.hexdigest()
+
+
+class RunCheckpoint:
+    """
+    Append-only journal of a run on many modules, with the result and input hash of each finished module.
+    Every entry is flushed to disk as soon as a module finishes, so an interrupted run can be resumed.
+    """
+
+    def __init__(self, base_dir: str, arguments: list, checkpoint_dir: str = CHECKPOINT_DIR):
+        """
+        :param base_dir: directory the run was started in
+        :param arguments: Terraform command and its arguments
+        :param checkpoint_dir: directory of checkpoint journals
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.arguments = arguments
+        name = hashlib.sha256(json.dumps([self.base_dir, arguments]).encode()).hexdigest()[:16]
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, f"{name}.jsonl")
+        self.lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """
+        Check if a journal of a previous run exists.
+        :return: True if exists
+        """
+        return os.path.exists(self.path)
+
+    def load(self) -> dict:
+        """
+        Load the journal of a previous run, the last entry of a module wins and a truncated last line is ignored.
+        :return: dict of module path to dict with status, input hash and duration
+        """
+        entries = {}
+        try:
+            with open(self.path, 'r') as fr:
+                for line in fr:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'module' in entry:
+                        entries[entry['module']] = entry
+        except OSError:
+            pass
+        return entries
+
+    def start(self, modules: list[str], resume: bool = False) -> None:
+        """
+        Start the journal of a run, keeping entries of the previous run if resumed.
+        :param modules: list of module paths of the run
+        :param resume: if True, append to the previous journal
+        :return: None
+        """
+        with open(self.path, 'a' if resume else 'w') as fw:
+            fw.write(json.dumps({'started': time.time(), 'base_dir': self.base_dir, 'arguments': self.arguments,
+                                 'modules': modules}) + '\n')
+
+    def record(self, module: str, status: str, input_hash: str, duration: float) -> None:
+        """
+        Record a finished module.
+        :param module: path to the module
+        :param status: status of the run
+        :param input_hash: hash of inputs of the module
+        :param duration: duration in seconds
+        :return: None
+        """
+        line = json.dumps({'module': module, 'status': status, 'input_hash': input_hash, 'duration': duration})
+        with self.lock:
+            with open(self.path, 'a') as fw:
+                fw.write(line + '\n')
+                fw.flush()
+                os.fsync(fw.fileno())
@@ -0,0 +1,215 @@
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+LOCK_POLL_INTERVAL = float(os.getenv('VELEZ_LOCK_POLL_INTERVAL', 10))
+LOCK_POLL_MAX_INTERVAL = float(os.getenv('VELEZ_LOCK_POLL_MAX_INTERVAL', 120))
+LOCK_WAIT_TIMEOUT = float(os.getenv('VELEZ_LOCK_WAIT_TIMEOUT', 1800))
+
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_LOCKED = "locked"
+STATUS_SKIPPED = "skipped"
+
+
+class RunQueue:
+    """
+    Run modules with a pool of workers, checking state locks before dispatching.
+    A module is ready once all its dependencies succeeded, ready modules with the longest remaining path
+    through their dependents are dispatched first, so long chains start early and workers are not left idle at the end.
+    Locked modules are parked and polled with exponential backoff while other modules keep running.
+    """
+
+    def __init__(self, run_module, get_lock, workers: int = 8, estimates: dict = None, dependencies: dict = None,
+                 poll_interval: float = LOCK_POLL_INTERVAL, max_poll_interval: float = LOCK_POLL_MAX_INTERVAL,
+                 lock_timeout: float = LOCK_WAIT_TIMEOUT):
+        """
+        :param run_module: function running a module, given its path, returning True on success
+        :param get_lock: function returning description of the lock holder of a module, or None if not locked
+        :param workers: number of modules run at once
+        :param estimates: dict of module path to its estimated duration in seconds, or None if unknown
+        :param dependencies: dict of module path to set of module paths which must succeed before it is run
+        :param poll_interval: initial interval between lock checks of a parked module, in seconds
+        :param max_poll_interval: maximum interval between lock checks, in seconds
+        :param lock_timeout: time after which a module still locked is given up, in seconds
+        """
+        self.run_module = run_module
+        self.get_lock = get_lock
+        self.workers = workers
+        self.estimates = estimates or {}
+        self.dependencies = dependencies or {}
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.lock_timeout = lock_timeout
+
+    def check_lock(self, module: str) -> str | None:
+        """
+        Check lock of a module, treating errors as not locked and leaving locking to Terraform.
+        :param module: path to the module
+        :return: description of the lock holder, or None if not locked
+        """
+        try:
+            return self.get_lock(module)
+        except Exception as e:
+            print(f"Could not check lock of {module}: {e}")
+            return None
+
+    def get_eta(self, pending: list[str], running: dict) -> float | None:
+        """
+        Estimate remaining time of the run, spreading estimated durations of remaining modules over the workers.
+        Modules without estimate are assumed to take the average of known estimates.
+        :param pending: modules not started yet
+        :param running: dict of module to its start time
+        :return: remaining time in seconds, or None if nothing is known
+        """
+        known = [e for e in self.estimates.values() if e is not None]
+        if not known:
+            return None
+        average = sum(known) / len(known)
+        now = time.monotonic()
+        remaining = sum(self.estimates.get(m) or average for m in pending)
+        remaining += sum(max(0.0, (self.estimates.get(m) or average) - (now - start)) for m, start in running.items())
+        return remaining / self.workers
+
+    def get_estimate(self, module: str) -> float:
+        """
+        Get estimated duration of a module, the average of known estimates if unknown, or 1 if nothing is known.
+        :param module: path to the module
+        :return: estimated duration in seconds
+        """
+        if self.estimates.get(module) is not None:
+            return self.estimates[module]
+        known = [e for e in self.estimates.values() if e is not None]
+        return sum(known) / len(known) if known else 1.0
+
+    def get_priorities(self, modules: list[str]) -> dict:
+        """
+        Get priority of each module, the estimated duration of the longest path from the module through its dependents.
+        :param modules: list of module paths
+        :return: dict of module path to its priority
+        """
+        dependents = {m: [] for m in modules}
+        for module in modules:
+            for dependency in self.dependencies.get(module, ()):
+                if dependency in dependents:
+                    dependents[dependency].append(module)
+        priorities = {}
+        for root in modules:
+            # iterative post-order walk, modules in a cycle keep their own estimate
+            stack = [(root, False)]
+            visiting = set()
+            while stack:
+                module, expanded = stack.pop()
+                if module in priorities:
+                    continue
+                if expanded:
+                    visiting.discard(module)
+                    priorities[module] = self.get_estimate(module) + max(
+                        (priorities.get(d, 0.0) for d in dependents[module]), default=0.0)
+                elif module not in visiting:
+                    visiting.add(module)
+                    stack.append((module, True))
+                    stack.extend((d, False) for d in dependents[module] if d not in priorities and d not in visiting)
+        return priorities
+
+    def timed_run(self, module: str) -> tuple[bool, float]:
+        """
+        Run a module, measuring its wall time.
+        :param module: path to the module
+        :return: tuple with success and duration in seconds
+        """
+        start = time.monotonic()
+        try:
+            ok = self.run_module(module)
+        except Exception as e:
+            print(f"Error running {module}: {e}")
+            ok = False
+        return ok, time.monotonic() - start
+
+    def run(self, modules: list[str]) -> dict:
+        """
+        Run all modules.
+        :param modules: list of module paths, the order is used to dispatch modules of equal priority
+        :return: dict of module path to dict with status and duration
+        """
+        results = {}
+        priorities = self.get_priorities(modules)
+        order = {m: i for i, m in enumerate(modules)}
+        waiting = {m: {d for d in self.dependencies.get(m, ()) if d in order and d != m} for m in modules}
+        ready = []  # heap of (-priority, order, module)
+        parked = {}  # module -> (next check time, current poll interval, parked since)
+        running = {}  # future -> module
+        started = {}  # module -> start time
+
+        def release(done_module: str) -> None:
+            # mark dependents of a finished module ready, or skipped if it did not succeed
+            for module, deps in list(waiting.items()):
+                if done_module not in deps:
+                    continue
+                if results[done_module]['status'] != STATUS_SUCCEEDED:
+                    waiting.pop(module)
+                    print(f"⏭ {module} skipped, dependency {done_module} {results[done_module]['status']}")
+                    results[module] = {'status': STATUS_SKIPPED, 'duration': 0.0}
+                    release(module)
+                    continue
+                deps.discard(done_module)
+                if not deps:
+                    waiting.pop(module)
+                    heapq.heappush(ready, (-priorities[module], order[module], module))
+
+        for module, deps in list(waiting.items()):
+            if not deps:
+                waiting.pop(module)
+                heapq.heappush(ready, (-priorities[module], order[module], module))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while ready or parked or running:
+                now = time.monotonic()
+                for module, (next_check, interval, since) in list(parked.items()):
+                    if next_check <= now:
+                        # queued for another check, don't queue again until it's done
+                        parked[module] = (float('inf'), interval, since)
+                        heapq.heappush(ready, (-priorities[module], order[module], module))
+
+                while ready and len(running) < self.workers:
+                    _, _, module = heapq.heappop(ready)
+                    lock = self.check_lock(module)
+                    if lock:
+                        _, interval, since = parked.get(module, (now, self.poll_interval / 2, now))
+                        if now - since >= self.lock_timeout:
+                            print(f"⏹ {module} still locked after {now - since:.0f}s, skipping")
+                            parked.pop(module)
+                            results[module] = {'status': STATUS_LOCKED, 'duration': 0.0}
+                            release(module)
+                            continue
+                        interval = min(interval * 2, self.max_poll_interval)
+                        if module not in parked:
+                            print(f"⏸ {module} is locked by {lock}, waiting")
+                        parked[module] = (now + interval, interval, since)
+                        continue
+                    parked.pop(module, None)
+                    started[module] = time.monotonic()
+                    running[executor.submit(self.timed_run, module)] = module
+
+                next_checks = [p[0] for p in parked.values() if p[0] != float('inf')]
+                timeout = max(0.0, min(next_checks) - time.monotonic()) if next_checks else None
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        module = running.pop(future)
+                        ok, duration = future.result()
+                        results[module] = {'status': STATUS_SUCCEEDED if ok else STATUS_FAILED, 'duration': duration}
+                        release(module)
+                        pending = [r[2] for r in ready] + list(parked) + list(waiting)
+                        eta = self.get_eta(pending, {m: started[m] for m in running.values()})
+                        progress = f"{len(results)}/{len(modules)} done" + (f", ETA {eta:.0f}s" if eta else '')
+                        print(f"{'✔' if ok else '✘'} {module} ({duration:.1f}s) - {progress}")
+                elif timeout is not None:
+                    time.sleep(timeout)
+
+        for module in waiting:
+            # dependency cycle or dependency never finished
+            print(f"⏭ {module} skipped, dependencies never finished: {', '.join(sorted(waiting[module]))}")
+            results[module] = {'status': STATUS_SKIPPED, 'duration': 0.0}
+        return results
@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is used if not installed
+    zstandard = None
+
+STATE_BACKUP_DIR = os.getenv('VELEZ_STATE_BACKUP_DIR', os.path.expanduser('~/.cache/velez/state-backups'))
+
+
+class StateBackup:
+    """
+    Local content-addressed store of Terraform state backups.
+    States are stored compressed once per content, an index of S3 ETags allows skipping unchanged states,
+    and every backup run is recorded as a point-in-time snapshot of all backed up modules.
+    """
+
+    def __init__(self, backup_dir: str = STATE_BACKUP_DIR):
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, 'objects')
+        self.snapshots_dir = os.path.join(backup_dir, 'snapshots')
+        self.index_file = os.path.join(backup_dir, 'index.json')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        try:
+            with open(self.index_file, 'r') as fr:
+                self.index = json.load(fr)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def find(self, bucket: str, key: str, etag: str) -> str | None:
+        """
+        Find already stored state object by its S3 ETag.
+        :param bucket: S3 bucket
+        :param key: S3 key
+        :param etag: S3 ETag of the state object
+        :return: name of the stored object, or None if not stored
+        """
+        name = self.index.get(f"{bucket}/{key}", {}).get(etag)
+        if name and os.path.exists(os.path.join(self.objects_dir, name)):
+            return name
+        return None
+
+    def store(self, bucket: str, key: str, etag: str, data: bytes) -> str:
+        """
+        Store state content compressed, unless the same content is already stored.
+        :param bucket: S3 bucket
+        :param key: S3 key
+        :param etag: S3 ETag of the state object
+        :param data: state content
+        :return: name of the stored object
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        extension = 'zst' if zstandard else 'gz'
+        # the same content may have been stored compressed either way
+        existing = [f"{digest}.tfstate.{e}" for e in ['zst', 'gz']
+                    if os.path.exists(os.path.join(self.objects_dir, f"{digest}.tfstate.{e}"))]
+        if existing:
+            name = existing[0]
+        else:
+            name = f"{digest}.tfstate.{extension}"
+            compressed = zstandard.ZstdCompressor().compress(data) if zstandard else gzip.compress(data)
+            temp_path = os.path.join(self.objects_dir, f".{name}.{threading.get_ident()}")
+            with open(temp_path, 'wb') as fw:
+                fw.write(compressed)
+            os.replace(temp_path, os.path.join(self.objects_dir, name))
+        with self.lock:
+            self.index.setdefault(f"{bucket}/{key}", {})[etag] = name
+        return name
+
+    def read(self, name: str) -> bytes:
+        """
+        Read stored state content.
+        :param name: name of the stored object
+        :return: state content
+        """
+        with open(os.path.join(self.objects_dir, name), 'rb') as fr:
+            data = fr.read()
+        if name.endswith('.zst'):
+            if not zstandard:
+                raise RuntimeError(f"zstandard package is required to read {name}")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def save_snapshot(self, entries: dict) -> str:
+        """
+        Save a point-in-time snapshot of backed up states, together with the ETag index.
+        :param entries: dict of module path to dict with bucket, key, etag, object and dynamodb_table
+        :return: name of the snapshot
+        """
+        # microseconds keep names sortable by time, exclusive creation keeps snapshots from overwriting each other
+        base_name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+        name, attempt = base_name, 0
+        while True:
+            try:
+                fw = open(os.path.join(self.snapshots_dir, f"{name}.json"), 'x')
+                break
+            except FileExistsError:
+                attempt += 1
+                name = f"{base_name}-{attempt}"
+        with fw:
+            json.dump(entries, fw, indent=2, sort_keys=True)
+        with self.lock:
+            with open(self.index_file, 'w') as fw:
+                json.dump(self.index, fw)
+        return name
+
+    def list_snapshots(self) -> list[str]:
+        """
+        List snapshots, newest first.
+        :return: list of snapshot names
+        """
+        return sorted((f.removesuffix('.json') for f in os.listdir(self.snapshots_dir) if f.endswith('.json')),
+                      reverse=True)
+
+    def load_snapshot(self, name: str) -> dict:
+        """
+        Load a snapshot.
+        :param name: name of the snapshot
+        :return: dict of module path to dict with bucket, key, etag, object and dynamodb_table
+        """
+        with open(os.path.join(self.snapshots_dir, f"{name}.json"), 'r') as fr:
+            return json.load(fr)
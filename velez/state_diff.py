@@ -0,0 +1,81 @@
+import hashlib
+import json
+from collections.abc import Iterator
+
+try:
+    import ijson
+except ImportError:  # optional, whole state is loaded into memory if not installed
+    ijson = None
+
+ijson_warned = False
+STR_IJSON_MISSING = ("Warning: ijson is not installed, whole states are loaded into memory. "
+                     "Install velez[state] to diff large states with bounded memory.")
+
+
+def get_instance_address(resource: dict, instance: dict) -> str:
+    """
+    Get address of a resource instance from the state file, as listed by state list.
+    :param resource: resource from the state file
+    :param instance: instance of the resource from the state file
+    :return: resource instance address
+    """
+    address = f"{resource['module']}." if resource.get('module') else ''
+    address += 'data.' if resource.get('mode') == 'data' else ''
+    address += f"{resource['type']}.{resource['name']}"
+    if 'index_key' in instance:
+        address += f"[{json.dumps(instance['index_key'], default=str)}]"
+    return address
+
+
+def iter_state_instances(state_file: str) -> Iterator[tuple[str, dict]]:
+    """
+    Iterate over resource instances of a state file, one resource at a time if ijson is installed.
+    :param state_file: path to the state file
+    :return: iterator of tuples with instance address and its attributes
+    """
+    global ijson_warned
+    if not ijson and not ijson_warned:
+        print(STR_IJSON_MISSING)
+        ijson_warned = True
+    with open(state_file, 'rb') as fr:
+        resources = ijson.items(fr, 'resources.item') if ijson else json.load(fr).get('resources', [])
+        for resource in resources:
+            for instance in resource.get('instances', []):
+                yield get_instance_address(resource, instance), instance.get('attributes') or {}
+
+
+def get_state_digests(state_file: str) -> dict:
+    """
+    Get digests of attributes of all resource instances in a state file.
+    :param state_file: path to the state file
+    :return: dict of instance address to attributes digest
+    """
+    return {address: hashlib.sha256(json.dumps(attributes, sort_keys=True, default=str).encode()).digest()
+            for address, attributes in iter_state_instances(state_file)}
+
+
+def diff_states(old_file: str, new_file: str) -> dict:
+    """
+    Compute resource-level difference between two state files.
+    Only digests of all instances and attributes of changed instances are kept in memory.
+    :param old_file: path to the older state file
+    :param new_file: path to the newer state file
+    :return: dict with sorted lists of added and removed addresses, and dict of changed addresses to
+             dict of attribute name to tuple of old and new value (None if the attribute is absent)
+    """
+    old_digests = get_state_digests(old_file)
+    new_digests = get_state_digests(new_file)
+    changed = {a for a in old_digests.keys() & new_digests.keys() if old_digests[a] != new_digests[a]}
+    old_attributes = {a: attrs for a, attrs in iter_state_instances(old_file) if a in changed}
+    new_attributes = {a: attrs for a, attrs in iter_state_instances(new_file) if a in changed}
+
+    changes = {}
+    for address in sorted(changed):
+        old, new = old_attributes[address], new_attributes[address]
+        changes[address] = {name: (old.get(name), new.get(name)) for name in sorted(old.keys() | new.keys())
+                            if old.get(name) != new.get(name)}
+    return {
+        'added': sorted(new_digests.keys() - old_digests.keys()),
+        'removed': sorted(old_digests.keys() - new_digests.keys()),
+        'changed': changes,
+    }
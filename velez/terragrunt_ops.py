@@ -1,15 +1,37 @@
+import csv
+import getpass
+import hashlib
+import json
 import os
 import re
+import shlex
+import shutil
+import socket
 import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import boto3
 from pick import pick
 from velez.file_ops import FileOperations, STR_CLEAN_FILES
-from velez.utils import run_command, STR_BACK, STR_EXIT
+from velez.history import ExecutionHistory
+from velez.state_backup import STATE_BACKUP_DIR, StateBackup
+from velez.state_diff import diff_states, get_instance_address
+from velez.run_checkpoint import RunCheckpoint, hash_module_inputs
+from velez.run_queue import RunQueue, STATUS_FAILED, STATUS_SUCCEEDED
+from velez.utils import run_command, run_command_with_status, STR_BACK, STR_EXIT, print_markdown_table, \
+    bytes_to_human_readable, get_date_str
+
+MODULE_MIRROR_DIR = os.getenv('VELEZ_MODULE_MIRROR', os.path.expanduser('~/.cache/velez/modules'))
+MODULE_MIRROR_WORKERS = int(os.getenv('VELEZ_MODULE_MIRROR_WORKERS', 8))
+TERRAGRUNT_WORKERS = int(os.getenv('VELEZ_TG_WORKERS', 8))
 
 STR_PLAN = "▷ Plan"
 STR_APPLY = "▶︎ Apply"
 STR_IMPORT = "◁ Import"
+STR_IMPORT_BULK = "◁ Bulk import"
 STR_DESTROY = "⌧ Destroy"
 STR_OUTPUT = "✉︎ Output"
 STR_INIT = "✦ Initialize"
@@ -22,6 +44,8 @@ STR_STATE_RM = "⌧ Remove"
 STR_STATE_SHOW = "⎚ Show"
 STR_STATE_PULL = "↓ Pull"
 STR_STATE_PUSH = "↑ Push"
+STR_STATE_BATCH = "⇶ Batch move/remove"
+STR_STATE_HISTORY = "⏲ History and diff"
 STR_MODULE_MENU = "⎄ Module operations"
 STR_MODULE_MOVE = "↔ Move module"
 STR_MODULE_DESTROY = "⌧ Destroy module"
@@ -29,9 +53,18 @@ STR_MODULE_DESTROY_BACKEND = "⌧ Destroy backend"
 STR_TAINT_MENU = "☣︎ Taint operations"
 STR_TAINT = "☣ Taint"
 STR_UNTAINT = "♺️ Untaint"
+STR_REPLACE_BULK = "☣ Bulk replace"
+STR_UNTAINT_BULK = "♺️ Bulk untaint"
 STR_LOCK_MENU = "⎉ Lock operations"
 STR_LOCK_INFO = "ℹ Lock info"
 STR_UNLOCK = "⇭ Unlock"
+STR_TREE_MENU = "⌘ Operations on all modules"
+STR_RUN_ALL = "▶ Run command on all modules"
+STR_HISTORY = "⏱ Execution history"
+STR_PREFETCH_SOURCES = "⇊ Prefetch module sources"
+STR_RECONCILE_BACKENDS = "⚖ Reconcile backend states"
+STR_BACKUP_STATES = "⛁ Back up states"
+STR_RESTORE_STATES = "⛃ Restore states from backup"
 
 
 class TerragruntOperations:
@@ -54,10 +87,14 @@ class TerragruntOperations:
         self.use_s3_backend = False  # If S3 backend is used, will be updated for each module separately
         self.use_dynamodb_locks = False  # If DynamoDB locks are used, will be updated for each module separately
         self.dynamodb_table = None  # DynamoDB table name, will be updated for each module separately
+        self.use_s3_lockfile = False  # If S3 native lock file is used, will be updated for each module separately
         self.dynamodb_lockid = None  # DynamoDB lock ID, will be updated for each module separately
         self.s3_bucket_name = None  # S3 backend bucket name, will be updated for each module separately
         self.s3_state_key = None  # S3 tfstate key, will be updated for each module separately
         self.s3_state_path = None  # Full S3 tfstate path, will be updated for each module separately
+        self.terraform_source = None  # Terraform source of the module, will be updated for each module separately
+        self.state_addresses = {}  # Cached resource addresses in the state of each module
+        self._history = None  # Durations and resource usage of past runs, opened on first use
         self.terragrunt_version = self.get_terragrunt_version(quiet=True)
         self.terraform_version = self.get_terraform_version(quiet=True)
         self.opentofu_version = self.get_opentofu_version(quiet=True)
@@ -183,12 +220,14 @@ class TerragruntOperations:
                 options.append(f"🌟 {os.path.basename(folder)}")
             else:
                 options.append(f"📁 {os.path.basename(folder)}")
-        options += [STR_BACK, STR_EXIT]
+        options += [STR_TREE_MENU, STR_BACK, STR_EXIT]
 
         title = f"Current Directory: {os.path.relpath(current_dir, self.velez.base_dir)}. Choose a folder to explore:"
         option, index = pick(options, title)
 
-        if option == STR_BACK:
+        if option == STR_TREE_MENU:
+            self.tree_menu(current_dir)
+        elif option == STR_BACK:
             if current_dir == self.velez.base_dir:
                 self.velez.main_menu()
             else:
@@ -205,6 +244,46 @@ class TerragruntOperations:
             else:
                 self.folder_menu(selected_folder)
 
+    def tree_menu(self, current_dir: str) -> None:
+        """
+        Display menu of operations on all modules in the directory tree.
+        :param current_dir: current directory
+        :return: None
+        """
+        options = [
+            STR_RUN_ALL,
+            STR_PREFETCH_SOURCES,
+            STR_RECONCILE_BACKENDS,
+            STR_BACKUP_STATES,
+            STR_RESTORE_STATES,
+            STR_HISTORY,
+            STR_BACK,
+            STR_EXIT
+        ]
+        title = f"Current Directory: {os.path.relpath(current_dir, self.velez.base_dir)}. " \
+                f"Choose an operation on all modules:"
+        option, index = pick(options, title)
+
+        if option == STR_BACK:
+            self.folder_menu(current_dir)
+            return
+        elif option == STR_EXIT:
+            sys.exit()
+        elif option == STR_RUN_ALL:
+            self.run_all_action(current_dir)
+        elif option == STR_PREFETCH_SOURCES:
+            self.prefetch_module_sources(current_dir)
+        elif option == STR_RECONCILE_BACKENDS:
+            self.reconcile_backends(current_dir)
+        elif option == STR_BACKUP_STATES:
+            self.backup_states(self.resolve_backends(current_dir)[0])
+        elif option == STR_RESTORE_STATES:
+            self.restore_states_action()
+        elif option == STR_HISTORY:
+            self.history_action(current_dir)
+        input("Press Enter to return to the menu...")
+        self.tree_menu(current_dir)
+
     def action_menu(self) -> None:
         """
         Display Terragrunt actions menu.
@@ -214,6 +293,7 @@ class TerragruntOperations:
             STR_PLAN,
             STR_APPLY,
             STR_IMPORT,
+            STR_IMPORT_BULK,
             STR_DESTROY,
             STR_OUTPUT,
             STR_INIT,
@@ -248,6 +328,9 @@ class TerragruntOperations:
         elif option == STR_IMPORT:
             self.import_action()
             self.action_menu()
+        elif option == STR_IMPORT_BULK:
+            self.import_bulk_action()
+            self.action_menu()
         elif option == STR_DESTROY:
             self.destroy_action()
             self.action_menu()
@@ -309,6 +392,76 @@ class TerragruntOperations:
         if resource and resource_id:
             self.run_terragrunt(['run', 'import', resource, resource_id])
 
+    def import_bulk_action(self) -> None:
+        """
+        Terraform bulk import action, importing all resources with a single apply using import blocks.
+        :return: None
+        """
+        imports_file = input("Enter the path to CSV (address,id) or JSON ({address: id}) file of resources to import: ")
+        if not imports_file:
+            return
+        try:
+            imports = self.load_imports(imports_file)
+        except (OSError, ValueError) as e:
+            print(f"An error occurred: {e}")
+            input("Press Enter to continue...")
+            return
+        if not imports:
+            print("No resources to import.")
+            input("Press Enter to continue...")
+            return
+        if self.terraform_version and tuple(map(int, self.terraform_version.split('.'))) < (1, 5, 0):
+            print(f"Import blocks require Terraform 1.5.0 or newer, found {self.terraform_version}.")
+            input("Press Enter to continue...")
+            return
+
+        imports_tf = os.path.join(self.module, 'velez_imports.tf')
+        with open(imports_tf, 'w') as fw:
+            fw.write(self.render_import_blocks(imports))
+        print(f"Importing {len(imports)} resources using {imports_tf}...")
+        try:
+            self.run_terragrunt(['run', 'apply'])
+        finally:
+            os.remove(imports_tf)
+
+    @staticmethod
+    def load_imports(imports_file: str) -> dict:
+        """
+        Load resource addresses and IDs to import from a CSV or JSON file.
+        CSV has address and ID columns, with an optional header. JSON is an object of address to ID,
+        or a list of objects with address and id keys.
+        :param imports_file: path to the file
+        :return: dictionary of resource address to ID
+        """
+        with open(imports_file, 'r') as fr:
+            if imports_file.endswith('.json'):
+                data = json.load(fr)
+                if isinstance(data, list):
+                    return {item['address']: str(item['id']) for item in data}
+                return {address: str(resource_id) for address, resource_id in data.items()}
+            imports = {}
+            for row in csv.reader(fr):
+                if not row or row[0].startswith('#') or [c.strip().lower() for c in row] == ['address', 'id']:
+                    continue
+                if len(row) != 2:
+                    raise ValueError(f"Invalid import row: {','.join(row)}")
+                imports[row[0].strip()] = row[1].strip()
+            return imports
+
+    @staticmethod
+    def render_import_blocks(imports: dict) -> str:
+        """
+        Render Terraform import blocks.
+        :param imports: dictionary of resource address to ID
+        :return: Terraform code
+        """
+        blocks = []
+        for address, resource_id in imports.items():
+            # JSON string is a valid HCL string, template sequences have to be escaped
+            hcl_id = json.dumps(resource_id).replace('${', '$${').replace('%{', '%%{')
+            blocks.append(f"import {{\n  to = {address}\n  id = {hcl_id}\n}}\n")
+        return "# Generated by velez for bulk import, removed after the run\n\n" + "\n".join(blocks)
+
     def destroy_action(self) -> None:
         """
         Terraform Destroy action.
@@ -362,6 +515,8 @@ class TerragruntOperations:
             STR_STATE_SHOW,
             STR_STATE_PULL,
             STR_STATE_PUSH,
+            STR_STATE_BATCH,
+            STR_STATE_HISTORY,
             STR_BACK,
             STR_EXIT
         ]
@@ -395,6 +550,12 @@ class TerragruntOperations:
         elif state_option == STR_STATE_PUSH:
             self.run_terragrunt(['run', 'state', 'push'])
             self.action_menu()
+        elif state_option == STR_STATE_BATCH:
+            self.state_batch_action()
+            self.action_menu()
+        elif state_option == STR_STATE_HISTORY:
+            self.state_history_action()
+            self.action_menu()
 
     def module_menu(self) -> None:
         """
@@ -430,6 +591,8 @@ class TerragruntOperations:
         taint_options = [
             STR_UNTAINT,
             STR_TAINT,
+            STR_REPLACE_BULK,
+            STR_UNTAINT_BULK,
             STR_BACK,
             STR_EXIT
         ]
@@ -443,6 +606,12 @@ class TerragruntOperations:
             self.taint_action()
         elif taint_option == STR_UNTAINT:
             self.untaint_action()
+        elif taint_option == STR_REPLACE_BULK:
+            self.replace_bulk_action()
+            self.action_menu()
+        elif taint_option == STR_UNTAINT_BULK:
+            self.untaint_bulk_action()
+            self.action_menu()
 
     def lock_menu(self) -> None:
         """
@@ -532,10 +701,18 @@ class TerragruntOperations:
             input("Press Enter to return to previous menu...")
             self.action_menu()
 
+        print("Backing up state file...")
+        if not self.backup_states({self.module: self.get_state_backend()}):
+            print("Backup failed, not destroying resources.")
+            input("Press Enter to return to previous menu...")
+            self.action_menu()
+            return
+
         print("Destroying resources...")
         self.run_terragrunt(['run', 'destroy'])
         self.dynamodb_delete_lock()
-        self.s3_delete_state()
+        # the state was backed up before destroying, a backup now would only hold the empty state
+        self.s3_delete_state(backup=False)
 
         print("Deleting module folder...")
         try:
@@ -573,7 +750,7 @@ class TerragruntOperations:
         try:
             dynamodb = boto3.client('dynamodb')
             dynamodb.delete_item(
-                TableName=self.dynamodb_name,
+                TableName=self.dynamodb_table,
                 Key={'LockID': {'S': self.dynamodb_lockid}}
             )
         except Exception as e:
@@ -588,18 +765,114 @@ class TerragruntOperations:
         try:
             dynamodb = boto3.client('dynamodb')
             response = dynamodb.get_item(
-                TableName=self.dynamodb_name,
+                TableName=self.dynamodb_table,
                 Key={'LockID': {'S': self.dynamodb_lockid}}
             )
             print(response)
         except Exception as e:
             print(f"An error occurred: {e}")
 
-    def s3_delete_state(self) -> None:
+    def dynamodb_acquire_lock(self, operation: str) -> str | None:
+        """
+        Acquire Terraform state lock of the module in DynamoDB, the same way Terraform does.
+        :param operation: description of the operation holding the lock
+        :return: lock ID if acquired, None otherwise
+        """
+        backend = {'bucket': self.s3_bucket_name, 'key': self.s3_state_key, 'dynamodb_table': self.dynamodb_table}
+        return self.acquire_state_lock(backend, operation, self.terraform_version or self.opentofu_version)
+
+    def dynamodb_release_lock(self, lock_id: str) -> None:
+        """
+        Release Terraform state lock of the module in DynamoDB acquired by dynamodb_acquire_lock.
+        :param lock_id: lock ID returned when acquiring the lock
+        :return: None
+        """
+        backend = {'bucket': self.s3_bucket_name, 'key': self.s3_state_key, 'dynamodb_table': self.dynamodb_table}
+        self.release_state_lock(backend, lock_id)
+
+    @staticmethod
+    def acquire_state_lock(backend: dict, operation: str, version: str = '') -> str | None:
+        """
+        Acquire Terraform state lock in DynamoDB, or with S3 lock file, the same way Terraform does.
+        :param backend: S3 backend configuration with dynamodb_table or use_lockfile
+        :param operation: description of the operation holding the lock
+        :param version: Terraform or OpenTofu version recorded in the lock
+        :return: lock ID if acquired, None otherwise
+        """
+        lock_info = {
+            'ID': str(uuid.uuid4()),
+            'Operation': operation,
+            'Info': '',
+            'Who': f"{getpass.getuser()}@{socket.gethostname()}",
+            'Version': version or '',
+            'Created': datetime.now(timezone.utc).isoformat(),
+            'Path': f"{backend['bucket']}/{backend['key']}",
+        }
+        try:
+            if backend.get('dynamodb_table'):
+                dynamodb = boto3.client('dynamodb')
+                dynamodb.put_item(
+                    TableName=backend['dynamodb_table'],
+                    Item={'LockID': {'S': lock_info['Path']}, 'Info': {'S': json.dumps(lock_info)}},
+                    ConditionExpression='attribute_not_exists(LockID)'
+                )
+            elif backend.get('use_lockfile'):
+                s3 = boto3.client('s3')
+                s3.put_object(Bucket=backend['bucket'], Key=f"{backend['key']}.tflock", Body=json.dumps(lock_info),
+                              ContentType='application/json', IfNoneMatch='*')
+            else:
+                print(f"Could not acquire state lock: no locking configured for {lock_info['Path']}")
+                return None
+        except Exception as e:
+            print(f"Could not acquire state lock: {e}")
+            return None
+        return lock_info['ID']
+
+    @staticmethod
+    def release_state_lock(backend: dict, lock_id: str) -> None:
+        """
+        Release Terraform state lock acquired by acquire_state_lock, only if still held with the same ID.
+        :param backend: S3 backend configuration with dynamodb_table or use_lockfile
+        :param lock_id: lock ID returned when acquiring the lock
+        :return: None
+        """
+        try:
+            if backend.get('dynamodb_table'):
+                dynamodb = boto3.client('dynamodb')
+                dynamodb.delete_item(
+                    TableName=backend['dynamodb_table'],
+                    Key={'LockID': {'S': f"{backend['bucket']}/{backend['key']}"}},
+                    ConditionExpression='contains(Info, :id)',
+                    ExpressionAttributeValues={':id': {'S': lock_id}}
+                )
+            elif backend.get('use_lockfile'):
+                s3 = boto3.client('s3')
+                lock_key = f"{backend['key']}.tflock"
+                response = s3.get_object(Bucket=backend['bucket'], Key=lock_key)
+                if json.loads(response['Body'].read()).get('ID') != lock_id:
+                    raise RuntimeError("lock is held by another operation")
+                s3.delete_object(Bucket=backend['bucket'], Key=lock_key, IfMatch=response['ETag'])
+        except Exception as e:
+            print(f"Could not release state lock {lock_id}: {e}")
+
+    def get_state_backend(self) -> dict:
+        """
+        Get the S3 backend configuration of the state of the module, as used by state backups.
+        :return: dict with bucket, key and DynamoDB table
+        """
+        return {'bucket': self.s3_bucket_name, 'key': self.s3_state_key, 'dynamodb_table': self.dynamodb_table}
+
+    def s3_delete_state(self, backup: bool = True) -> None:
         """
         Delete state file on S3.
+        :param backup: if True, back up the state file before deleting it
         :return: None
         """
+        if backup:
+            print("Backing up state file...")
+            if not self.backup_states({self.module: self.get_state_backend()}):
+                if input("Backup failed. Delete state file anyway? (y/N): ").lower() != 'y':
+                    return
         print("Deleting state file on S3...")
         try:
             s3 = boto3.client('s3')
@@ -641,32 +914,403 @@ class TerragruntOperations:
         self.run_terragrunt(['run', 'force-unlock'])
         self.action_menu()
 
-    def run_terragrunt(self, arguments: list, quiet: bool = False) -> None:
+    def state_batch_action(self) -> None:
+        """
+        Batch state move and remove action.
+        :return: None
+        """
+        print("Operations are given one per line: 'mv SOURCE DESTINATION', 'rm ADDRESS', "
+              "'mv-re REGEX REPLACEMENT' or 'rm-re REGEX'. Arguments are quoted like in a shell, "
+              "e.g. 'aws_s3_bucket.b[\"a b\"]'. Lines starting with # are ignored.")
+        operations_file = input("Enter the path to the file with operations (will ask for operations if empty): ")
+        if operations_file:
+            try:
+                with open(operations_file, 'r') as fr:
+                    lines = fr.readlines()
+            except OSError as e:
+                print(f"An error occurred: {e}")
+                input("Press Enter to continue...")
+                return
+        else:
+            lines = []
+            while line := input("Enter an operation (finish with an empty line): "):
+                lines.append(line)
+        try:
+            operations = self.parse_state_operations(lines)
+        except ValueError as e:
+            print(f"Error: {e}")
+            input("Press Enter to continue...")
+            return
+        if operations:
+            self.state_batch(operations)
+        input("Press Enter to continue...")
+
+    @staticmethod
+    def parse_state_operations(lines: list[str]) -> list[tuple]:
+        """
+        Parse state operations, one per line, with arguments quoted like in a shell.
+        :param lines: lines with operations
+        :return: list of tuples with operation name and its arguments
+        """
+        expected_args = {'mv': 2, 'rm': 1, 'mv-re': 2, 'rm-re': 1}
+        operations = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                parts = shlex.split(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid state operation: {line}: {e}")
+            if parts[0] not in expected_args or len(parts) - 1 != expected_args[parts[0]]:
+                raise ValueError(f"Invalid state operation: {line}")
+            operations.append(tuple(parts))
+        return operations
+
+    @staticmethod
+    def expand_state_operations(operations: list[tuple], addresses: list[str]) -> list[tuple]:
+        """
+        Expand regular expression operations into plain moves and removals of the matching state addresses.
+        :param operations: list of parsed state operations
+        :param addresses: list of resource addresses in the state
+        :return: list of mv and rm operations
+        """
+        expanded = []
+        for operation in operations:
+            if operation[0] == 'mv-re':
+                pattern = re.compile(operation[1])
+                expanded += [('mv', a, pattern.sub(operation[2], a)) for a in addresses if pattern.fullmatch(a)]
+            elif operation[0] == 'rm-re':
+                pattern = re.compile(operation[1])
+                expanded += [('rm', a) for a in addresses if pattern.fullmatch(a)]
+            else:
+                expanded.append(operation)
+        return expanded
+
+    @staticmethod
+    def simulate_state_operations(addresses: list[str], operations: list[tuple]) -> set[str]:
+        """
+        Get addresses expected in the state after applying moves and removals in order.
+        An operation on a module or a resource applies to everything inside it.
+        :param addresses: list of resource addresses in the state before the operations
+        :param operations: list of mv and rm operations
+        :return: set of expected addresses
+        """
+        def contains(target: str, address: str) -> bool:
+            return address == target or address.startswith((f"{target}.", f"{target}["))
+
+        expected = set(addresses)
+        for operation in operations:
+            target = operation[1]
+            matching = {a for a in expected if contains(target, a)}
+            expected -= matching
+            if operation[0] == 'mv':
+                expected |= {operation[2] + a[len(target):] for a in matching}
+        return expected
+
+    def list_local_state(self, state_file: str) -> list[str] | None:
+        """
+        List resource addresses in a local state file.
+        :param state_file: path to the state file
+        :return: list of addresses, or None on error
+        """
+        tf_ot = self.velez.get_tf_ot()
+        code, out, err, _ = run_command_with_status([tf_ot, f'-chdir={os.path.dirname(state_file)}', 'state', 'list',
+                                                     f'-state={state_file}'])
+        if code != 0:
+            print(f"Error listing state: {err}")
+            return None
+        return [address for address in out.splitlines() if address.strip()]
+
+    def state_batch(self, operations: list[tuple]) -> bool:
+        """
+        Apply many state moves and removals in a single pull-edit-push cycle, holding the state lock once.
+        :param operations: list of parsed state operations
+        :return: True if the state was pushed, False otherwise
+        """
+        tf_ot = self.velez.get_tf_ot()
+
+        def apply_operations(state_file: str) -> bool:
+            addresses = self.list_local_state(state_file)
+            if addresses is None:
+                return False
+            try:
+                expanded = self.expand_state_operations(operations, addresses)
+            except re.error as e:
+                print(f"Error: {e}")
+                return False
+            if not expanded:
+                print("No resources in the state match the operations.")
+                return False
+            for operation in expanded:
+                code, out, err, _ = run_command_with_status([tf_ot, f'-chdir={os.path.dirname(state_file)}', 'state',
+                                                             operation[0], f'-state={state_file}', '-backup=-'] +
+                                                            list(operation[1:]))
+                if code != 0:
+                    print(f"Error in '{shlex.join(operation)}': {err}")
+                    return False
+                print(out.strip())
+
+            # validate the result before pushing
+            expected = self.simulate_state_operations(addresses, expanded)
+            addresses = self.list_local_state(state_file)
+            if addresses is None:
+                return False
+            if set(addresses) != expected:
+                unexpected = sorted(set(addresses) - expected) + sorted(expected - set(addresses))
+                print(f"Validation failed, unexpected addresses: {', '.join(unexpected)}, state not pushed.")
+                return False
+            return True
+
+        return self.edit_state('velez state batch', apply_operations)
+
+    def edit_state(self, operation: str, edit) -> bool:
+        """
+        Pull the state of the module, edit it locally and push it once, holding the state lock for the whole cycle.
+        The original state is kept in the edits directory of the state backup store for recovery.
+        :param operation: description of the operation holding the lock
+        :param edit: function editing the local state file in place, given its path, returning True on success
+        :return: True if the state was pushed, False otherwise
+        """
+        backend = {'bucket': self.s3_bucket_name, 'key': self.s3_state_key,
+                   'dynamodb_table': self.dynamodb_table if self.use_dynamodb_locks else None,
+                   'use_lockfile': self.use_s3_lockfile}
+        if not self.use_s3_backend or not (backend['dynamodb_table'] or backend['use_lockfile']):
+            print("Error: State is not locked with DynamoDB or S3 lock file, state not edited.")
+            return False
+        lock_id = self.acquire_state_lock(backend, operation, self.terraform_version or self.opentofu_version)
+        if not lock_id:
+            return False
+        work_dir = tempfile.mkdtemp(prefix='velez-state-')
+        state_file = os.path.join(work_dir, 'terraform.tfstate')
+        try:
+            print("Pulling state...")
+            code, out, err = self.run_terragrunt_with_status(['run', 'state', 'pull'], quiet=True, wait=False,
+                                                             record=False)
+            try:
+                original = json.loads(out) if code == 0 else None
+            except ValueError:
+                original = None
+            if original is None:
+                print(f"Error pulling state: {err}")
+                return False
+            with open(state_file, 'w') as fw:
+                fw.write(out)
+            backup_file = self.save_original_state(out)
+            print(f"Original state saved to {backup_file}")
+
+            if not edit(state_file):
+                return False
+            try:
+                with open(state_file, 'r') as fr:
+                    edited = json.load(fr)
+            except ValueError as e:
+                print(f"Validation failed: {e}, state not pushed.")
+                return False
+            if edited.get('lineage') != original.get('lineage') or edited.get('serial', 0) <= original.get('serial', 0):
+                print("Validation failed: unexpected state lineage or serial, state not pushed.")
+                return False
+
+            print("Pushing state...")
+            # the lock is already held by velez
+            code, out, err = self.run_terragrunt_with_status(['run', 'state', 'push', '-lock=false', state_file],
+                                                             quiet=True, wait=False, record=False)
+            if code != 0:
+                print(f"Error pushing state: {err}")
+                return False
+            print("State pushed.")
+            return True
+        finally:
+            self.state_addresses.pop(self.module, None)
+            self.release_state_lock(backend, lock_id)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def save_original_state(self, state: str) -> str:
+        """
+        Save the state of the module before editing it, in the edits directory of the state backup store.
+        :param state: state content
+        :return: path to the saved state
+        """
+        edits_dir = os.path.join(STATE_BACKUP_DIR, 'edits')
+        os.makedirs(edits_dir, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', self.module or '.').strip('_.') or 'root'
+        path = os.path.join(edits_dir, f"{name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f')}.tfstate")
+        with open(path, 'w') as fw:
+            fw.write(state)
+        return path
+
+    def get_state_addresses(self, refresh: bool = False) -> list[str]:
+        """
+        Get resource addresses in the state of the module, cached until the state is changed by velez.
+        Failed reads are not cached.
+        :param refresh: if True, read the state again
+        :return: list of addresses, empty if the state can't be read
+        """
+        if refresh or self.module not in self.state_addresses:
+            code, out, err = self.run_terragrunt_with_status(['run', 'state', 'list'], quiet=True, wait=False,
+                                                             record=False)
+            if code != 0:
+                print(f"Error listing state: {err}")
+                self.state_addresses.pop(self.module, None)
+                return []
+            # one address per line, addresses can contain spaces in their keys
+            self.state_addresses[self.module] = [address for address in out.splitlines() if address.strip()]
+        return self.state_addresses[self.module]
+
+    @staticmethod
+    def match_addresses(pattern: str, addresses: list[str]) -> list[str]:
+        """
+        Match resource addresses with a glob, where only * and ? are wildcards, or a regular expression prefixed
+        with "re:".
+        :param pattern: glob or regular expression
+        :param addresses: list of resource addresses
+        :return: list of matching addresses
+        """
+        if pattern.startswith('re:'):
+            regex = re.compile(pattern[3:])
+        else:
+            regex = re.compile(re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.'))
+        return [a for a in addresses if regex.fullmatch(a)]
+
+    @staticmethod
+    def untaint_state(state: dict, addresses: list[str]) -> int:
+        """
+        Untaint resource instances in the state, in place.
+        :param state: state file content
+        :param addresses: addresses of the instances to untaint
+        :return: number of untainted instances
+        """
+        addresses = set(addresses)
+        untainted = 0
+        for resource in state.get('resources', []):
+            for instance in resource.get('instances', []):
+                if instance.get('status') == 'tainted' and \
+                        get_instance_address(resource, instance) in addresses:
+                    del instance['status']
+                    untainted += 1
+        if untainted:
+            state['serial'] = state.get('serial', 0) + 1
+        return untainted
+
+    def replace_bulk_action(self) -> None:
+        """
+        Plan or apply replacement of all resources matching a pattern with a single run.
+        :return: None
+        """
+        pattern = input("Enter a glob (e.g., module.app.aws_instance.*) or regex prefixed with 're:' to replace: ")
+        try:
+            addresses = self.match_addresses(pattern, self.get_state_addresses())
+        except re.error as e:
+            print(f"Error: {e}")
+            input("Press Enter to continue...")
+            return
+        if not addresses:
+            print("No resources in the state match the pattern.")
+            input("Press Enter to continue...")
+            return
+        print("\n".join(addresses))
+        command = 'apply' if input(f"Apply replacement of {len(addresses)} resources? (y/N; "
+                                   f"will only plan if not 'y'): ").lower() == 'y' else 'plan'
+        self.run_terragrunt(['run', command] + [f'-replace={a}' for a in addresses])
+
+    def untaint_bulk_action(self) -> None:
+        """
+        Untaint all resources matching a pattern in a single state update.
+        :return: None
+        """
+        pattern = input("Enter a glob (e.g., module.app.aws_instance.*) or regex prefixed with 're:' to untaint: ")
+
+        def untaint(state_file: str) -> bool:
+            with open(state_file, 'r') as fr:
+                state = json.load(fr)
+            addresses = [get_instance_address(r, i) for r in state.get('resources', [])
+                         for i in r.get('instances', [])]
+            try:
+                addresses = self.match_addresses(pattern, addresses)
+            except re.error as e:
+                print(f"Error: {e}")
+                return False
+            untainted = self.untaint_state(state, addresses)
+            if not untainted:
+                print("No tainted resources in the state match the pattern.")
+                return False
+            with open(state_file, 'w') as fw:
+                json.dump(state, fw, indent=2)
+            print(f"Untainted {untainted} resource instances.")
+            return True
+
+        self.edit_state('velez untaint', untaint)
+        input("Press Enter to continue...")
+
+    @property
+    def history(self) -> ExecutionHistory:
+        """
+        Store of past runs, opened on first use.
+        :return: execution history
+        """
+        if self._history is None:
+            self._history = ExecutionHistory()
+        return self._history
+
+    def run_terragrunt(self, arguments: list, quiet: bool = False, wait: bool = True, record: bool = True) -> tuple:
         """
         Run Terragrunt command.
         :param arguments: list of arguments to pass to Terragrunt
         :param quiet: if True, suppress output and errors
-        :return: None
+        :param wait: if False, never wait for user input after running the command
+        :param record: if False, the run is not recorded in the history, e.g. for internal commands
+        :return: tuple with stdout and stderr
+        """
+        _, out, err = self.run_terragrunt_with_status(arguments, quiet=quiet, wait=wait, record=record)
+        return out, err
+
+    def run_terragrunt_with_status(self, arguments: list, quiet: bool = False, wait: bool = True,
+                                   record: bool = True) -> tuple:
+        """
+        Run Terragrunt command, capturing its exit code.
+        :param arguments: list of arguments to pass to Terragrunt
+        :param quiet: if True, suppress output and errors
+        :param wait: if False, never wait for user input after running the command
+        :param record: if False, the run is not recorded in the history, e.g. for internal commands
+        :return: tuple with exit code, stdout and stderr
         """
         args = [i for i in arguments if i is not None or i != '']
-        # Building the full command
+        command = self.build_terragrunt_command(args, self.module, self.terraform_source)
+        code, out, err, usage = run_command_with_status(command, quiet=quiet)
+        if record:
+            self.history.record(self.module or '.', args, code, usage['wall_time'], usage['cpu_time'],
+                                usage['max_rss'], len(out) + len(err))
+        if any(i in args for i in ['apply', 'destroy', 'import', 'mv', 'rm', 'push', 'taint', 'untaint']):
+            self.state_addresses.pop(self.module, None)
+        if wait and not any(i in args for i in self.list_not_wait_for()):
+            input("Press Enter when ready to continue...")
+        return code, out, err
+
+    def build_terragrunt_command(self, args: list, module: str = None, terraform_source: str = None) -> list:
+        """
+        Build full Terragrunt command.
+        :param args: list of arguments to pass to Terragrunt
+        :param module: path to the module to run in
+        :param terraform_source: Terraform source of the module, to use the local mirror if prefetched
+        :return: command as a list
+        """
         command = ['terragrunt'] + args
         # check if cli-redesign is possible
         if self.terragrunt_version >= '0.73.0':
             if 'run' in args:
                 command += ['--tf-forward-stdout', '--experiment', 'cli-redesign']
-        if self.module:
-            command += ['--working-dir', f'{self.module}']
-        out, err = run_command(command, quiet=quiet)
-        if not any(i in args for i in self.list_not_wait_for()):
-            input("Press Enter when ready to continue...")
+        if module:
+            command += ['--working-dir', f'{module}']
+        if 'run' in args:
+            command += self.get_source_map_args(terraform_source)
+        return command
 
     def load_terragrunt_config(self) -> dict:
         """
         Load Terragrunt module configuration from running Terragrunt.
         :return: dict
         """
-        self.run_terragrunt(['render-json', '--out', self.temp_config], quiet=True)
+        self.run_terragrunt(['render-json', '--out', self.temp_config], quiet=True, record=False)
         if self.velez.file_ops is None:
             self.velez.file_ops = FileOperations(self.velez)
         return self.velez.file_ops.load_json_file(self.temp_config)
@@ -679,6 +1323,11 @@ class TerragruntOperations:
         """
         self.module = module_path
         config = self.load_terragrunt_config()
+        self.terraform_source = config.get('terraform', {}).get('source')
+        # locking of the previous module must not leak into this one
+        self.use_dynamodb_locks = False
+        self.dynamodb_table = None
+        self.use_s3_lockfile = False
         if 'remote_state' in config:
             remote_state = config['remote_state']
             if remote_state['backend'] == 's3':
@@ -688,6 +1337,7 @@ class TerragruntOperations:
                     if 'dynamodb_table' in config:
                         self.use_dynamodb_locks = True
                         self.dynamodb_table = config['dynamodb_table']
+                    self.use_s3_lockfile = bool(config.get('use_lockfile'))
                     if 'bucket' in config:
                         self.s3_bucket_name = config['bucket']
                     if 'key' in config:
@@ -695,3 +1345,661 @@ class TerragruntOperations:
                     if self.dynamodb_table and self.s3_bucket_name and self.s3_state_key:
                         self.dynamodb_lockid = f"{self.s3_bucket_name}/{self.s3_state_key}-md5"
                         self.s3_state_path = f"s3://{self.s3_bucket_name}/{self.s3_state_key}"
+
+    @staticmethod
+    def parse_git_source(source: str) -> tuple[str, str] | None:
+        """
+        Parse a Terraform git source into repository URL and ref.
+        E.g. "git::https://github.com/org/repo.git//modules/vpc?ref=v1.0.0" gives
+        ("git::https://github.com/org/repo.git", "v1.0.0").
+        :param source: Terraform source
+        :return: tuple with repository URL and ref, or None if not a pinned git source
+        """
+        if not source:
+            return None
+        source = source.strip('"')
+        match = re.fullmatch(r'(git::(?:[a-z+]+://)?[^?]+?)(?://[^?]*)?\?(?:.*&)?ref=([^&]+).*', source)
+        if not match or '${' in source:
+            return None
+        return match.group(1), match.group(2)
+
+    @staticmethod
+    def get_mirror_path(repo: str, ref: str) -> str:
+        """
+        Get path of a module source in the local mirror.
+        :param repo: repository URL, as returned by parse_git_source
+        :param ref: git ref
+        :return: path to the mirrored source
+        """
+        key = hashlib.sha256(f"{repo}?ref={ref}".encode()).hexdigest()[:16]
+        return os.path.join(MODULE_MIRROR_DIR, key)
+
+    def fetch_module_source(self, repo: str, ref: str) -> str | None:
+        """
+        Fetch a single ref of a repository into the local mirror, unless already mirrored.
+        :param repo: repository URL, as returned by parse_git_source
+        :param ref: git ref, i.e. a tag, branch or commit
+        :return: path to the mirrored source, or None if fetching failed
+        """
+        mirror_path = self.get_mirror_path(repo, ref)
+        if os.path.isdir(mirror_path):
+            return mirror_path
+        os.makedirs(MODULE_MIRROR_DIR, exist_ok=True)
+        temp_path = tempfile.mkdtemp(dir=MODULE_MIRROR_DIR, prefix='.fetch-')
+        url = repo.removeprefix('git::')
+        run_command(['git', 'init', '--quiet', temp_path], quiet=True)
+        run_command(['git', '-C', temp_path, 'fetch', '--quiet', '--depth', '1', url, ref], quiet=True)
+        run_command(['git', '-C', temp_path, 'checkout', '--quiet', 'FETCH_HEAD'], quiet=True)
+        if not run_command(['git', '-C', temp_path, 'rev-parse', '--verify', '--quiet', 'HEAD'], quiet=True)[0]:
+            print(f"Error fetching {url} at {ref}")
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return None
+        shutil.rmtree(os.path.join(temp_path, '.git'), ignore_errors=True)
+        try:
+            os.rename(temp_path, mirror_path)
+        except OSError:
+            # fetched concurrently by another process
+            shutil.rmtree(temp_path, ignore_errors=True)
+        return mirror_path
+
+    def prefetch_module_sources(self, base_dir: str = None) -> dict:
+        """
+        Fetch every unique pinned git source of the modules once, in parallel, into the local mirror.
+        Modules are then initialized from the mirror using Terragrunt source map.
+        :param base_dir: directory to search for modules
+        :return: dictionary of (repository URL, ref) to mirror path
+        """
+        if base_dir is None:
+            base_dir = self.velez.base_dir
+        if self.velez.file_ops is None:
+            self.velez.file_ops = FileOperations(self.velez)
+
+        sources = set()
+        modules = self.velez.file_ops.list_terragrunt_modules(base_dir)
+        configs = self.velez.file_ops.load_hcl_files([os.path.join(m, 'terragrunt.hcl') for m in modules])
+        for config in configs.values():
+            for block in config.get('terraform', []):
+                git_source = self.parse_git_source(block.get('source'))
+                if git_source:
+                    sources.add(git_source)
+
+        print(f"Fetching {len(sources)} unique sources used by {len(modules)} modules...")
+        with ThreadPoolExecutor(max_workers=MODULE_MIRROR_WORKERS) as executor:
+            paths = dict(zip(sources, executor.map(lambda s: self.fetch_module_source(*s), sources)))
+        for (repo, ref), path in sorted(paths.items()):
+            print(f"{repo}?ref={ref} -> {path}")
+        return paths
+
+    @staticmethod
+    def get_source_map_args(terraform_source: str) -> list:
+        """
+        Get Terragrunt arguments mapping the module source to the local mirror, if it was prefetched.
+        :param terraform_source: Terraform source of the module
+        :return: list of arguments
+        """
+        git_source = TerragruntOperations.parse_git_source(terraform_source)
+        if not git_source:
+            return []
+        repo, ref = git_source
+        mirror_path = TerragruntOperations.get_mirror_path(repo, ref)
+        if not os.path.isdir(mirror_path):
+            return []
+        return ['--source-map', f'{repo}={mirror_path}']
+
+    def render_module_config(self, module: str) -> dict:
+        """
+        Render Terragrunt configuration of any module, without changing the current module.
+        :param module: path to the module
+        :return: dict, empty if rendering failed
+        """
+        with tempfile.TemporaryDirectory(prefix='velez-render-') as temp_dir:
+            out_file = os.path.join(temp_dir, 'terragrunt_rendered.json')
+            run_command(['terragrunt', 'render-json', '--out', out_file, '--working-dir', module], quiet=True)
+            try:
+                return FileOperations.load_json_file(out_file)
+            except (OSError, ValueError):
+                return {}
+
+    @staticmethod
+    def get_s3_backend(config: dict) -> dict | None:
+        """
+        Get S3 backend configuration from a rendered Terragrunt configuration.
+        :param config: rendered configuration
+        :return: dict with bucket, key, optional dynamodb_table and use_lockfile, or None if S3 backend is not used
+        """
+        remote_state = config.get('remote_state') or {}
+        backend = remote_state.get('config') or {}
+        if remote_state.get('backend') != 's3' or not backend.get('bucket') or not backend.get('key'):
+            return None
+        return {'bucket': backend['bucket'], 'key': backend['key'], 'dynamodb_table': backend.get('dynamodb_table'),
+                'use_lockfile': bool(backend.get('use_lockfile'))}
+
+    def render_modules(self, base_dir: str) -> dict:
+        """
+        Render configurations of all modules in the directory tree concurrently.
+        :param base_dir: directory to search for modules
+        :return: dict of module path, relative to the base directory of velez, to rendered configuration
+        """
+        if self.velez.file_ops is None:
+            self.velez.file_ops = FileOperations(self.velez)
+        modules = self.velez.file_ops.list_terragrunt_modules(base_dir)
+        print(f"Rendering configuration of {len(modules)} modules...")
+        with ThreadPoolExecutor(max_workers=TERRAGRUNT_WORKERS) as executor:
+            configs = executor.map(self.render_module_config, modules)
+        return {os.path.relpath(m, self.velez.base_dir): c for m, c in zip(modules, configs)}
+
+    def resolve_backends(self, base_dir: str) -> tuple[dict, list]:
+        """
+        Resolve S3 backends of all modules in the directory tree.
+        :param base_dir: directory to search for modules
+        :return: tuple with dict of module path to S3 backend configuration, modules without S3 backend are skipped,
+                 and list of modules which failed to render
+        """
+        backends = {}
+        failed = []
+        for module, config in self.render_modules(base_dir).items():
+            if not config:
+                failed.append(module)
+                continue
+            backend = self.get_s3_backend(config)
+            if backend:
+                backends[module] = backend
+        if failed:
+            print(f"Failed to render configuration of {len(failed)} modules:")
+            for module in failed:
+                print(f"  {module}")
+        return backends, failed
+
+    @staticmethod
+    def get_common_prefix(keys: list[str]) -> str:
+        """
+        Get the deepest common directory of S3 keys.
+        :param keys: list of S3 keys
+        :return: common prefix ending with "/", or empty string
+        """
+        common = os.path.commonpath([os.path.dirname(k) for k in keys]) if keys else ''
+        return f"{common}/" if common else ''
+
+    @staticmethod
+    def list_state_objects(bucket: str, prefix: str = '') -> dict:
+        """
+        List state objects in an S3 bucket with a single paginated listing.
+        :param bucket: bucket name
+        :param prefix: only list keys with this prefix
+        :return: dict of key to object metadata
+        """
+        s3 = boto3.client('s3')
+        objects = {}
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.tfstate'):
+                    objects[obj['Key']] = obj
+        return objects
+
+    @staticmethod
+    def diff_backend_states(backends: dict, objects: dict) -> tuple[list, list]:
+        """
+        Compare expected state keys of modules with state objects found in buckets.
+        :param backends: dict of module path to S3 backend configuration
+        :param objects: dict of bucket to dict of key to object metadata
+        :return: tuple with list of orphaned (bucket, object) and list of modules with missing state
+        """
+        expected = {(b['bucket'], b['key']) for b in backends.values()}
+        orphaned = [(bucket, obj) for bucket, bucket_objects in sorted(objects.items())
+                    for key, obj in sorted(bucket_objects.items()) if (bucket, key) not in expected]
+        missing = [module for module, b in sorted(backends.items()) if b['key'] not in objects.get(b['bucket'], {})]
+        return orphaned, missing
+
+    def reconcile_backends(self, base_dir: str = None) -> None:
+        """
+        Report state objects not matching any module and modules without state, optionally deleting orphans.
+        :param base_dir: directory to search for modules
+        :return: None
+        """
+        if base_dir is None:
+            base_dir = self.velez.base_dir
+        backends, failed = self.resolve_backends(base_dir)
+        buckets = sorted({b['bucket'] for b in backends.values()})
+        objects = {}
+        unscoped = []
+        for bucket in buckets:
+            # only look at the part of the bucket used by the modules in the tree
+            prefix = self.get_common_prefix([b['key'] for b in backends.values() if b['bucket'] == bucket])
+            if not prefix:
+                unscoped.append(bucket)
+            print(f"Listing s3://{bucket}/{prefix}...")
+            try:
+                objects[bucket] = self.list_state_objects(bucket, prefix)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                return
+        orphaned, missing = self.diff_backend_states(backends, objects)
+
+        if orphaned:
+            rows = [[f"s3://{bucket}/{obj['Key']}", bytes_to_human_readable(obj['Size']),
+                     get_date_str(obj['LastModified'])] for bucket, obj in orphaned]
+            print_markdown_table("Orphaned state | Size | Last modified", rows)
+        else:
+            print("No orphaned states found.")
+        if missing:
+            print_markdown_table("Module without state | Expected state",
+                                 [[m, f"s3://{backends[m]['bucket']}/{backends[m]['key']}"] for m in missing])
+        else:
+            print("No modules with missing state found.")
+
+        if not orphaned:
+            return
+        if failed:
+            # states of modules which failed to render would be reported as orphaned
+            print("Deleting orphaned states is disabled, as some modules failed to render.")
+        elif unscoped:
+            # keys of the modules share no directory, so the whole bucket was listed, including states of other trees
+            print(f"Deleting orphaned states is disabled, as whole buckets were listed: {', '.join(unscoped)}.")
+        elif input(f"Delete {len(orphaned)} orphaned states? (type 'delete' to confirm): ") == 'delete':
+            self.s3_delete_objects(orphaned)
+
+    @staticmethod
+    def s3_delete_objects(objects: list) -> None:
+        """
+        Delete S3 objects in batches.
+        :param objects: list of (bucket, object metadata)
+        :return: None
+        """
+        s3 = boto3.client('s3')
+        by_bucket = {}
+        for bucket, obj in objects:
+            by_bucket.setdefault(bucket, []).append({'Key': obj['Key']})
+        errors = 0
+        for bucket, keys in by_bucket.items():
+            for i in range(0, len(keys), 1000):
+                try:
+                    response = s3.delete_objects(Bucket=bucket, Delete={'Objects': keys[i:i + 1000], 'Quiet': True})
+                    for error in response.get('Errors', []):
+                        print(f"Error deleting s3://{bucket}/{error['Key']}: {error['Message']}")
+                        errors += 1
+                except Exception as e:
+                    print(f"An error occurred: {e}")
+                    errors += len(keys[i:i + 1000])
+        if errors:
+            print(f"Failed to delete {errors} of {len(objects)} objects.")
+        else:
+            print(f"Deleted {len(objects)} objects.")
+
+    def backup_states(self, backends: dict) -> str | None:
+        """
+        Download states of modules concurrently into the local backup store, skipping states already stored,
+        and record them as a point-in-time snapshot.
+        :param backends: dict of module path to S3 backend configuration
+        :return: name of the snapshot, or None on error
+        """
+        store = StateBackup()
+        s3 = boto3.client('s3')
+        objects = {}
+        for bucket in sorted({b['bucket'] for b in backends.values()}):
+            prefix = self.get_common_prefix([b['key'] for b in backends.values() if b['bucket'] == bucket])
+            try:
+                objects[bucket] = self.list_state_objects(bucket, prefix)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                return None
+
+        entries = {}
+        to_download = {}
+        for module, backend in backends.items():
+            obj = objects[backend['bucket']].get(backend['key'])
+            if not obj:
+                continue
+            etag = obj['ETag'].strip('"')
+            entries[module] = dict(backend, etag=etag, object=store.find(backend['bucket'], backend['key'], etag))
+            if not entries[module]['object']:
+                to_download[module] = entries[module]
+
+        def download(entry: dict) -> str:
+            response = s3.get_object(Bucket=entry['bucket'], Key=entry['key'], IfMatch=f'"{entry["etag"]}"')
+            return store.store(entry['bucket'], entry['key'], entry['etag'], response['Body'].read())
+
+        print(f"Backing up {len(entries)} states, {len(to_download)} changed since the last backup...")
+        with ThreadPoolExecutor(max_workers=TERRAGRUNT_WORKERS) as executor:
+            futures = {module: executor.submit(download, entry) for module, entry in to_download.items()}
+        for module, future in futures.items():
+            try:
+                entries[module]['object'] = future.result()
+            except Exception as e:
+                print(f"Error backing up {module}: {e}")
+                del entries[module]
+        if not entries:
+            print("No states to back up.")
+            return None
+        snapshot = store.save_snapshot(entries)
+        print(f"Snapshot {snapshot} saved in {store.backup_dir}")
+        return snapshot
+
+    def restore_states_action(self) -> None:
+        """
+        Restore all states from a selected backup snapshot.
+        :return: None
+        """
+        store = StateBackup()
+        snapshots = store.list_snapshots()
+        if not snapshots:
+            print("No backups found.")
+            return
+        option, index = pick(snapshots + [STR_BACK], "Choose a snapshot to restore:")
+        if option == STR_BACK:
+            return
+        entries = store.load_snapshot(option)
+        print("\n".join(f"{m} -> s3://{e['bucket']}/{e['key']}" for m, e in sorted(entries.items())))
+        if input(f"Overwrite {len(entries)} states with snapshot {option}? (type 'restore' to confirm): ") == 'restore':
+            self.restore_states(store, entries)
+
+    @staticmethod
+    def get_restore_conflict(current: dict | None, restored: dict) -> str | None:
+        """
+        Check if restoring a state would overwrite a state of another lineage or a newer state.
+        :param current: current state, or None if there is no state
+        :param restored: state to restore
+        :return: description of the conflict, or None if the state can be restored safely
+        """
+        if current is None:
+            return None
+        if current.get('lineage') != restored.get('lineage'):
+            return f"current state has lineage {current.get('lineage')}, backup has {restored.get('lineage')}"
+        if current.get('serial', 0) > restored.get('serial', 0):
+            return f"current state serial {current.get('serial')} is newer than backup serial {restored.get('serial')}"
+        return None
+
+    @staticmethod
+    def restore_states(store: StateBackup, entries: dict) -> None:
+        """
+        Upload states from the backup store while holding their state locks, updating state digests in DynamoDB
+        so Terraform accepts them. Restoring over a newer state or a state of another lineage needs confirmation.
+        :param store: backup store
+        :param entries: snapshot entries to restore
+        :return: None
+        """
+        s3 = boto3.client('s3')
+        dynamodb = boto3.client('dynamodb')
+        for module, entry in sorted(entries.items()):
+            lock_id = None
+            if entry.get('dynamodb_table') or entry.get('use_lockfile'):
+                lock_id = TerragruntOperations.acquire_state_lock(entry, 'velez restore')
+                if not lock_id:
+                    print(f"Skipped {module}, state is locked.")
+                    continue
+            try:
+                data = store.read(entry['object'])
+                try:
+                    current = json.loads(s3.get_object(Bucket=entry['bucket'], Key=entry['key'])['Body'].read())
+                except s3.exceptions.NoSuchKey:
+                    current = None
+                conflict = TerragruntOperations.get_restore_conflict(current, json.loads(data))
+                if conflict and input(f"{module}: {conflict}. Restore anyway? (y/N): ").lower() != 'y':
+                    print(f"Skipped {module}")
+                    continue
+                s3.put_object(Bucket=entry['bucket'], Key=entry['key'], Body=data)
+                if entry.get('dynamodb_table'):
+                    dynamodb.put_item(
+                        TableName=entry['dynamodb_table'],
+                        Item={'LockID': {'S': f"{entry['bucket']}/{entry['key']}-md5"},
+                              'Digest': {'S': hashlib.md5(data).hexdigest()}}
+                    )
+                print(f"Restored {module}")
+            except Exception as e:
+                print(f"Error restoring {module}: {e}")
+            finally:
+                if lock_id:
+                    TerragruntOperations.release_state_lock(entry, lock_id)
+
+    def list_state_versions(self) -> list[dict]:
+        """
+        List versions of the state object of the module in a versioned S3 bucket.
+        :return: list of versions, newest first
+        """
+        s3 = boto3.client('s3')
+        versions = []
+        for page in s3.get_paginator('list_object_versions').paginate(Bucket=self.s3_bucket_name,
+                                                                      Prefix=self.s3_state_key):
+            versions += [v for v in page.get('Versions', []) if v['Key'] == self.s3_state_key]
+        return sorted(versions, key=lambda v: v['LastModified'], reverse=True)
+
+    def state_history_action(self) -> None:
+        """
+        Show versions of the module state and resource-level difference between two of them.
+        :return: None
+        """
+        try:
+            versions = self.list_state_versions()
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            input("Press Enter to continue...")
+            return
+        if len(versions) < 2:
+            print("Less than two state versions found, is versioning enabled on the bucket?")
+            input("Press Enter to continue...")
+            return
+        options = [f"{get_date_str(v['LastModified'])} | {bytes_to_human_readable(v['Size'])} | {v['VersionId']}"
+                   for v in versions]
+        new_option, new_index = pick(options + [STR_BACK], f"Current Module: {self.module}. Choose the newer version:")
+        if new_option == STR_BACK:
+            return
+        old_options = options[new_index + 1:]
+        if not old_options:
+            print("No older versions to compare with.")
+            input("Press Enter to continue...")
+            return
+        old_option, old_index = pick(old_options + [STR_BACK], "Choose the older version to compare with:")
+        if old_option == STR_BACK:
+            return
+        old_version, new_version = versions[new_index + 1 + old_index], versions[new_index]
+
+        s3 = boto3.client('s3')
+        with tempfile.TemporaryDirectory(prefix='velez-history-') as temp_dir:
+            paths = [os.path.join(temp_dir, f"{v['VersionId']}.tfstate") for v in [old_version, new_version]]
+
+            def download(version: dict, path: str) -> None:
+                s3.download_file(self.s3_bucket_name, self.s3_state_key, path,
+                                 ExtraArgs={'VersionId': version['VersionId']})
+
+            print("Downloading state versions...")
+            try:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    list(executor.map(download, [old_version, new_version], paths))
+                diff = diff_states(*paths)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                input("Press Enter to continue...")
+                return
+        self.print_state_diff(diff)
+        input("Press Enter to continue...")
+
+    @staticmethod
+    def print_state_diff(diff: dict, max_value_length: int = 80) -> None:
+        """
+        Print resource-level difference between two states.
+        :param diff: difference as returned by diff_states
+        :param max_value_length: maximum length of printed attribute values
+        :return: None
+        """
+        def shorten(value) -> str:
+            text = json.dumps(value, default=str)
+            return text if len(text) <= max_value_length else f"{text[:max_value_length - 3]}..."
+
+        for address in diff['added']:
+            print(f"+ {address}")
+        for address in diff['removed']:
+            print(f"- {address}")
+        for address, attributes in diff['changed'].items():
+            print(f"~ {address}")
+            for name, (old, new) in attributes.items():
+                print(f"    ~ {name}: {shorten(old)} -> {shorten(new)}")
+        print(f"{len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed.")
+
+    @staticmethod
+    def get_lock_holder(backend: dict) -> str | None:
+        """
+        Check if the state is locked, in DynamoDB or with S3 lock file.
+        :param backend: S3 backend configuration
+        :return: description of the lock holder, or None if not locked
+        """
+        path = f"{backend['bucket']}/{backend['key']}"
+        if backend.get('dynamodb_table'):
+            dynamodb = boto3.client('dynamodb')
+            item = dynamodb.get_item(TableName=backend['dynamodb_table'], Key={'LockID': {'S': path}},
+                                     ConsistentRead=True).get('Item')
+            if not item:
+                return None
+            info = json.loads(item.get('Info', {}).get('S') or '{}')
+            return f"{info.get('Who', 'unknown')} ({info.get('Operation', 'unknown operation')} " \
+                   f"since {info.get('Created', 'unknown')})"
+        if backend.get('use_lockfile'):
+            s3 = boto3.client('s3')
+            try:
+                s3.head_object(Bucket=backend['bucket'], Key=f"{backend['key']}.tflock")
+            except s3.exceptions.ClientError as e:
+                if e.response['Error']['Code'] in ['404', 'NoSuchKey', 'NotFound']:
+                    return None
+                raise
+            return "S3 lock file"
+        return None
+
+    @staticmethod
+    def get_dependencies(configs: dict, base_dir: str) -> dict:
+        """
+        Get dependencies of modules from their dependency and dependencies blocks.
+        :param configs: dict of module path, relative to the base directory, to rendered configuration
+        :param base_dir: base directory of velez
+        :return: dict of module path to set of module paths it depends on, limited to the given modules
+        """
+        dependencies = {}
+        for module, config in configs.items():
+            paths = list((config.get('dependencies') or {}).get('paths') or [])
+            paths += [d.get('config_path') for d in (config.get('dependency') or {}).values() if isinstance(d, dict)]
+            resolved = set()
+            for path in filter(None, paths):
+                path = os.path.normpath(os.path.join(base_dir, module, path))
+                resolved.add(os.path.relpath(path, base_dir))
+            dependencies[module] = {d for d in resolved if d in configs and d != module}
+        return dependencies
+
+    def run_all_action(self, current_dir: str) -> None:
+        """
+        Run a Terraform command on all modules in the directory tree.
+        :param current_dir: current directory
+        :return: None
+        """
+        arguments = input("Enter the command to run on all modules (e.g., plan): ").split()
+        if not arguments:
+            return
+        if arguments[0] in ['apply', 'destroy']:
+            if input(f"Run {arguments[0]} without confirmation on all modules in {current_dir}? "
+                     f"(type 'yes' to confirm): ") != 'yes':
+                return
+            arguments.append('-auto-approve')
+        arguments.append('-input=false')
+        resume = False
+        if RunCheckpoint(current_dir, arguments).exists():
+            resume = input("Resume the previous run, skipping modules which succeeded with unchanged inputs? (y/n): ") \
+                == 'y'
+        self.run_all(current_dir, arguments, resume=resume)
+
+    @staticmethod
+    def get_completed_modules(entries: dict, hashes: dict, dependencies: dict) -> set:
+        """
+        Get modules of a previous run which don't have to be run again: they succeeded with the same inputs,
+        and so did all modules they depend on.
+        :param entries: dict of module path to its checkpoint entry from the previous run
+        :param hashes: dict of module path to hash of its current inputs
+        :param dependencies: dict of module path to set of module paths it depends on
+        :return: set of module paths
+        """
+        completed = {m for m, e in entries.items()
+                     if m in hashes and e.get('status') == STATUS_SUCCEEDED and e.get('input_hash') == hashes[m]}
+        changed = True
+        while changed:
+            # a dependency run again may change outputs used as inputs
+            invalid = {m for m in completed if any(d in hashes and d not in completed for d in dependencies.get(m, ()))}
+            completed -= invalid
+            changed = bool(invalid)
+        return completed
+
+    def run_all(self, base_dir: str, arguments: list, resume: bool = False) -> dict:
+        """
+        Run a Terraform command on all modules in the directory tree with a pool of workers.
+        Modules are run after their dependencies (before them for destroy), longest chains of past durations first.
+        Modules locked by others are waited for, while other modules keep running.
+        Output of each module is saved to a log file, and its result to a checkpoint journal.
+        :param base_dir: directory to search for modules
+        :param arguments: Terraform command and its arguments
+        :param resume: if True, skip modules which succeeded in the previous run with unchanged inputs
+        :return: dict of module path to dict with status and duration
+        """
+        configs = self.render_modules(base_dir)
+        dependencies = self.get_dependencies(configs, self.velez.base_dir)
+        if arguments[0] == 'destroy':
+            # dependents have to be destroyed first
+            dependencies = {m: {d for d, deps in dependencies.items() if m in deps} for m in dependencies}
+        hashes = {m: hash_module_inputs(os.path.join(self.velez.base_dir, m), c, arguments) for m, c in configs.items()}
+        checkpoint = RunCheckpoint(base_dir, arguments)
+        previous = checkpoint.load() if resume else {}
+        completed = self.get_completed_modules(previous, hashes, dependencies)
+        modules = [m for m in configs if m not in completed]
+        checkpoint.start(modules, resume=resume)
+        log_dir = tempfile.mkdtemp(prefix='velez-run-')
+        if completed:
+            print(f"Resuming, {len(completed)} modules already succeeded with unchanged inputs")
+        print(f"Running '{' '.join(arguments)}' on {len(modules)} modules, logs in {log_dir}")
+
+        def run_module(module: str) -> bool:
+            source = (configs[module].get('terraform') or {}).get('source')
+            command = self.build_terragrunt_command(['run'] + arguments, module, source)
+            code, out, err, usage = run_command_with_status(command)
+            self.history.record(module, ['run'] + arguments, code, usage['wall_time'], usage['cpu_time'],
+                                usage['max_rss'], len(out) + len(err))
+            with open(os.path.join(log_dir, f"{module.replace(os.sep, '__')}.log"), 'w') as fw:
+                fw.write(out + err)
+            status = STATUS_SUCCEEDED if code == 0 else STATUS_FAILED
+            checkpoint.record(module, status, hashes[module], usage['wall_time'])
+            return code == 0
+
+        def get_lock(module: str) -> str | None:
+            backend = self.get_s3_backend(configs[module])
+            return self.get_lock_holder(backend) if backend else None
+
+        command_name = self.history.get_command_name(['run'] + arguments)
+        estimates = {module: self.history.estimate(module, command_name) for module in modules}
+        try:
+            results = RunQueue(run_module, get_lock, workers=TERRAGRUNT_WORKERS, estimates=estimates,
+                               dependencies=dependencies).run(modules)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted, finished modules are recorded in {checkpoint.path}, run again with resume "
+                  f"to continue.")
+            return {}
+        results.update({m: {'status': f"{STATUS_SUCCEEDED} (previous run)", 'duration': previous[m]['duration']}
+                        for m in completed})
+        rows = [[module, r['status'], f"{r['duration']:.1f}s"] for module, r in sorted(results.items())]
+        print_markdown_table("Module | Result | Duration", rows)
+        return results
+
+    def history_action(self, current_dir: str) -> None:
+        """
+        Show statistics of past runs of modules in the directory tree.
+        :param current_dir: current directory
+        :return: None
+        """
+        prefix = os.path.relpath(current_dir, self.velez.base_dir)
+        prefix = '' if prefix == '.' else prefix
+        stats = self.history.command_stats(prefix)
+        if not stats:
+            print("No runs recorded yet.")
+            return
+        print_markdown_table("Command | Runs | Failures | p50 | p95",
+                             [[s['command'], str(s['runs']), str(s['failures']), f"{s['p50']:.1f}s",
+                               f"{s['p95']:.1f}s"] for s in stats])
+        print()
+        rows = []
+        for m in self.history.slowest_modules(prefix):
+            trend = ' → '.join(f"{d:.0f}" for d in self.history.trend(m['module'], m['command']))
+            rows.append([m['module'], m['command'], str(m['runs']), f"{m['avg_wall_time']:.1f}s",
+                         f"{m['max_wall_time']:.1f}s", f"{m['avg_cpu_time']:.1f}s",
+                         bytes_to_human_readable(m['max_rss']), trend])
+        print_markdown_table("Slowest module | Command | Runs | Avg | Max | Avg CPU | Max RSS | Recent runs (s)", rows)
@@ -1,6 +1,11 @@
+import os
+import re
 import shutil
-from datetime import datetime
 import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
 
 STR_BACK = "⏮️  BACK"
 STR_EXIT = "📛 EXIT"
@@ -35,6 +40,72 @@ def run_command(command: list[str], quiet: bool = False) -> tuple:
             print(f"\n\nError running command: {e}\n\n")
         return '', str(e)
 
+def get_noninteractive_git_env() -> dict:
+    """
+    Get environment for git commands run alongside menus, failing instead of asking for credentials or passphrases.
+    :return: environment variables
+    """
+    ssh_command = os.getenv('GIT_SSH_COMMAND') or 'ssh'
+    return dict(os.environ, GIT_TERMINAL_PROMPT='0', GIT_SSH_COMMAND=f"{ssh_command} -o BatchMode=yes")
+
+
+def run_command_with_status(command: list[str], quiet: bool = True, env: dict = None,
+                            interactive: bool = True) -> tuple:
+    """
+    Run a command, capturing its exit code and resource usage.
+    :param command: command to run
+    :param quiet: if True, suppress output and errors
+    :param env: environment variables, the current environment if not given
+    :param interactive: if False, the command gets no input instead of reading the terminal
+    :return: tuple with exit code, stdout, stderr and dict with wall_time, cpu_time (both in seconds)
+             and max_rss (in bytes)
+    """
+    usage = {'wall_time': 0.0, 'cpu_time': 0.0, 'max_rss': 0}
+    if not shutil.which(command[0]):
+        if not quiet:
+            print(f"Error: Command not found: {command[0]}")
+        return 127, '', f"Command not found: {command[0]}", usage
+    if not quiet:
+        print(f"Running command: {' '.join(command)}")
+
+    start = time.monotonic()
+    try:
+        cmd = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                               env=env, stdin=None if interactive else subprocess.DEVNULL)
+        # read both pipes concurrently and reap the process with wait4 to get its own resource usage
+        output = {}
+        readers = [threading.Thread(target=lambda name, pipe: output.__setitem__(name, pipe.read()), args=(n, p))
+                   for n, p in [('out', cmd.stdout), ('err', cmd.stderr)]]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(cmd.pid, 0)
+            cmd.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            # resource usage is not available without wait4, e.g. on Windows
+            rusage = None
+            cmd.wait()
+        cmd.stdout.close()
+        cmd.stderr.close()
+    except Exception as e:
+        if not quiet:
+            print(f"\n\nError running command: {e}\n\n")
+        return 1, '', str(e), usage
+    usage['wall_time'] = time.monotonic() - start
+    if rusage:
+        usage['cpu_time'] = rusage.ru_utime + rusage.ru_stime
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        usage['max_rss'] = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    out, err = output.get('out', ''), output.get('err', '')
+    if not quiet:
+        if out:
+            print(out)
+        if err:
+            print(err)
+    return cmd.returncode, out, err, usage
+
 def get_date_str(date: str | datetime) -> str:
     """
     Convert date and time to a string.
@@ -110,3 +181,18 @@ def bytes_to_human_readable(size: int) -> str:
         unit_index += 1
 
     return f"{size:.2f} {units[unit_index]}"
+
+def human_readable_to_bytes(size: str | int) -> int:
+    """
+    Convert a human-readable size string to a number of bytes.
+    :param size: size as a string, e.g. "512MB", "10G", "1.5 TB" or a number of bytes
+    :return: number of bytes
+    """
+    if isinstance(size, int):
+        return size
+    units = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4, "p": 1024 ** 5}
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgtp]?)i?b?\s*', size.lower())
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    number, unit = match.groups()
+    return int(float(number) * units[unit])
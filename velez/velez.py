@@ -9,12 +9,15 @@ from velez.file_ops import FileOperations
 from velez.github_ops import GitHubOperations
 from velez.terragrunt_ops import TerragruntOperations
 from velez.docker_ops import DockerOperations
+from velez.run_queue import STATUS_SUCCEEDED
+from velez.workspace_ops import WorkspaceOperations
 from velez.utils import STR_EXIT
 
 STR_TERRAGRUNT_MENU = "🌐 Run Terragrunt"
 STR_FILE_MENU = "📂 File operations"
 STR_GITHUB_MENU = "💻 GitHub operations"
 STR_DOCKER_MENU = "🚢 Docker operations"
+STR_WORKSPACE_MENU = "🗂 Workspace operations"
 
 
 class Velez:
@@ -28,6 +31,7 @@ class Velez:
         self.file_ops = None
         self.github_ops = None
         self.docker_ops = None
+        self.workspace_ops = None
 
     def main_menu(self) -> None:
         """
@@ -40,6 +44,7 @@ class Velez:
             STR_FILE_MENU,
             STR_GITHUB_MENU if self.check_github() else None,
             STR_DOCKER_MENU if self.check_docker() else None,
+            STR_WORKSPACE_MENU,
             STR_EXIT
         ]
         options = [o for o in options if o]
@@ -61,21 +66,44 @@ class Velez:
             if self.docker_ops is None:
                 self.docker_ops = DockerOperations(self)
             self.docker_ops.docker_menu()
+        elif option == STR_WORKSPACE_MENU:
+            if self.workspace_ops is None:
+                self.workspace_ops = WorkspaceOperations(self)
+            self.workspace_ops.workspace_menu()
         elif option == STR_EXIT:
             sys.exit()
 
         self.main_menu()
 
-    def run(self, terragrunt: bool = False, file: bool = False, github: bool = False, **kwargs: dict) -> None:
+    def run(self, terragrunt: bool = False, file: bool = False, github: bool = False, workspace: bool = False,
+            **kwargs: dict) -> None:
         """
         Run the framework passing the arguments.
         :param terragrunt: run Terragrunt operations
         :param file: run file operations
         :param github: run GitHub operations
+        :param workspace: run operations on all repositories in the workspace directory
         :param kwargs: additional arguments
         :return: None
         """
-        if terragrunt and kwargs.get('pos_args'):
+        if terragrunt and kwargs.get('pos_args') and kwargs['pos_args'][0] == 'run-all':
+            # velez -tg run-all <directory> <command> [<arguments>] [--resume]
+            pos_args = kwargs.get('pos_args')
+            if len(pos_args) < 3:
+                print("Usage: velez -tg run-all <directory> <command> [<arguments>] [--resume]")
+                sys.exit(2)
+            # without a terminal to confirm on, apply and destroy would fail in every module
+            if pos_args[2] in ['apply', 'destroy'] and '-auto-approve' not in pos_args:
+                print(f"Error: run-all {pos_args[2]} can't ask for confirmation, add -auto-approve to confirm it "
+                      f"for all modules in {pos_args[1]}.")
+                sys.exit(2)
+            if self.terragrunt_ops is None:
+                self.terragrunt_ops = TerragruntOperations(self)
+            arguments = [a for a in pos_args[2:] if a != '--resume'] + ['-input=false']
+            results = self.terragrunt_ops.run_all(pos_args[1], arguments, resume='--resume' in pos_args)
+            if not results or any(not r['status'].startswith(STATUS_SUCCEEDED) for r in results.values()):
+                sys.exit(1)
+        elif terragrunt and kwargs.get('pos_args'):
             pos_args = kwargs.get('pos_args')
             option = pos_args[0]
             # module = pos_args[1]
@@ -95,6 +123,11 @@ class Velez:
             if self.github_ops is None:
                 self.github_ops = GitHubOperations(self)
             self.github_ops.github_menu()
+        elif workspace:
+            # velez -ws [<workspace directory>]
+            pos_args = kwargs.get('pos_args')
+            self.workspace_ops = WorkspaceOperations(self, root=pos_args[0] if pos_args else None)
+            self.workspace_ops.workspace_menu()
         else:
             self.main_menu()
 
@@ -175,6 +208,8 @@ def main() -> None:
     parser.add_argument('-f', '--file', action='store_true', help='Run file operations')
     parser.add_argument('-gh', '--github', action='store_true', help='Run GitHub operations')
     parser.add_argument('-d', '--docker', action='store_true', help='Run Docker operations')
+    parser.add_argument('-ws', '--workspace', action='store_true',
+                        help='Run git and GitHub operations on all repositories in the workspace directory')
     parser.add_argument('-v', '--version', action='store_true', help='Show version')
     parser.add_argument('pos_args', nargs=argparse.REMAINDER, help='Arguments to pass further')
     args = parser.parse_args()
@@ -184,7 +219,8 @@ def main() -> None:
         sys.exit()
 
     framework = Velez()
-    framework.run(terragrunt=args.terragrunt, file=args.file, github=args.github, docker=args.docker, pos_args=args.pos_args)
+    framework.run(terragrunt=args.terragrunt, file=args.file, github=args.github, docker=args.docker,
+                  workspace=args.workspace, pos_args=args.pos_args)
 
 
 if __name__ == "__main__":
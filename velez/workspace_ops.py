@@ -0,0 +1,206 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import github
+from pick import pick
+from velez.github_cache import install_cache
+from velez.github_ops import GitHubOperations
+from velez.rate_limit import RateLimitController
+from velez.utils import STR_BACK, STR_EXIT, get_noninteractive_git_env, print_markdown_table, run_command_with_status
+
+WORKSPACE_WORKERS = int(os.getenv('VELEZ_WORKSPACE_WORKERS', 8))
+WORKSPACE_DEPTH = int(os.getenv('VELEZ_WORKSPACE_DEPTH', 3))
+SKIP_DIRS = ['node_modules', '.terragrunt-cache', '.terraform']
+
+STR_WORKSPACE_STATUS = "☰ Status of all repositories"
+STR_WORKSPACE_PULL = "↘︎ Pull with rebase all repositories"
+STR_WORKSPACE_PUSH = "⇧ Push all repositories"
+STR_WORKSPACE_STALE = "⌦ Find stale branches in all repositories"
+STR_WORKSPACE_PRS = "⎘ List PRs of all repositories"
+
+
+class WorkspaceOperations:
+    """
+    Class for git and GitHub operations on all repositories checked out under a workspace directory.
+    """
+
+    def __init__(self, velez, root: str = None):
+        self.velez = velez
+        self.root = os.path.abspath(root or self.velez.base_dir)
+        self.repos = self.discover_repos(self.root)
+
+    def workspace_menu(self) -> None:
+        """
+        Display workspace operations menu.
+        :return: None
+        """
+        title = f"Workspace: {self.root} with {len(self.repos)} repositories. Choose an operation:"
+        options = [
+            STR_WORKSPACE_STATUS,
+            STR_WORKSPACE_PULL,
+            STR_WORKSPACE_PUSH,
+            STR_WORKSPACE_STALE,
+            STR_WORKSPACE_PRS,
+            STR_BACK,
+            STR_EXIT
+        ]
+        option, index = pick(options, title)
+
+        if option == STR_WORKSPACE_STATUS:
+            print_markdown_table("Repository | Branch | Ahead | Behind | Changes", self.run_on_repos(self.repo_status))
+        elif option == STR_WORKSPACE_PULL:
+            print_markdown_table("Repository | Result | Message",
+                                 self.run_on_repos(lambda repo: self.run_git(repo, ['pull', '--rebase'])))
+        elif option == STR_WORKSPACE_PUSH:
+            if input(f"Push the current branch of {len(self.repos)} repositories? (y/n): ") == 'y':
+                print_markdown_table("Repository | Result | Message",
+                                     self.run_on_repos(lambda repo: self.run_git(repo, ['push'])))
+        elif option == STR_WORKSPACE_STALE:
+            print_markdown_table("Repository | Stale branches | Branches", self.run_on_repos(self.repo_stale_branches))
+        elif option == STR_WORKSPACE_PRS:
+            print_markdown_table("Repository | Number | Title | URL", self.list_pull_requests())
+        elif option == STR_BACK:
+            self.velez.main_menu()
+        elif option == STR_EXIT:
+            sys.exit()
+        input("Press Enter to return to the workspace menu...")
+
+        self.workspace_menu()
+
+    @staticmethod
+    def discover_repos(root: str, depth: int = WORKSPACE_DEPTH) -> list[str]:
+        """
+        Find git repositories under a directory, without looking inside repositories.
+        :param root: workspace directory
+        :param depth: maximum depth of repositories below the workspace directory
+        :return: sorted list of repository paths, relative to the workspace directory
+        """
+        repos = []
+        for current, dirs, files in os.walk(root):
+            relative = os.path.relpath(current, root)
+            if '.git' in dirs or '.git' in files:
+                repos.append(relative)
+                dirs[:] = []
+                continue
+            if relative != '.' and relative.count(os.sep) + 1 >= depth:
+                dirs[:] = []
+                continue
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in SKIP_DIRS]
+        return sorted(repos)
+
+    def run_on_repos(self, operation) -> list[list[str]]:
+        """
+        Run an operation on all repositories with a pool of workers.
+        :param operation: function called with a repository path, returning a list of table cells
+        :return: list of table rows, starting with the repository, in order of repositories
+        """
+        def run(repo: str) -> list[str]:
+            try:
+                return [repo] + operation(os.path.join(self.root, repo))
+            except Exception as e:
+                return [repo, f"An error occurred: {e}"]
+
+        print(f"Running on {len(self.repos)} repositories...")
+        with ThreadPoolExecutor(max_workers=WORKSPACE_WORKERS) as executor:
+            return list(executor.map(run, self.repos))
+
+    @staticmethod
+    def run_git(repo_dir: str, args: list) -> list[str]:
+        """
+        Run a git command in a repository.
+        :param repo_dir: path to the repository
+        :param args: git arguments
+        :return: list with result and the last line of the output
+        """
+        # run concurrently in many repositories, so git must not ask for credentials on the terminal
+        code, out, err, _ = run_command_with_status(['git', '-C', repo_dir] + args, env=get_noninteractive_git_env(),
+                                                    interactive=False)
+        lines = [line.strip() for line in (out + err).splitlines() if line.strip()]
+        return ['ok' if code == 0 else 'failed', lines[-1] if lines else '']
+
+    @staticmethod
+    def parse_status(output: str) -> dict:
+        """
+        Parse git status --porcelain=v2 --branch output.
+        :param output: git status output
+        :return: dict with branch, ahead and behind (None without upstream) and number of changed files
+        """
+        status = {'branch': '', 'ahead': None, 'behind': None, 'changes': 0}
+        for line in output.splitlines():
+            if line.startswith('# branch.head '):
+                status['branch'] = line.removeprefix('# branch.head ')
+            elif line.startswith('# branch.ab '):
+                ahead, behind = line.removeprefix('# branch.ab ').split()
+                status['ahead'], status['behind'] = int(ahead), -int(behind)
+            elif line and not line.startswith('#'):
+                status['changes'] += 1
+        return status
+
+    def repo_status(self, repo_dir: str) -> list[str]:
+        """
+        Get status of a repository with a single git call.
+        :param repo_dir: path to the repository
+        :return: list with branch, commits ahead and behind upstream, and number of changed files
+        """
+        code, out, err, _ = run_command_with_status(['git', '-C', repo_dir, 'status', '--porcelain=v2', '--branch'])
+        if code != 0:
+            return [f"An error occurred: {err.strip()}"]
+        status = self.parse_status(out)
+        no_upstream = status['ahead'] is None
+        return [status['branch'], '-' if no_upstream else str(status['ahead']),
+                '-' if no_upstream else str(status['behind']), str(status['changes'])]
+
+    @staticmethod
+    def repo_stale_branches(repo_dir: str) -> list[str]:
+        """
+        Find stale branches of origin of a repository from local refs after fetching it.
+        :param repo_dir: path to the repository
+        :return: list with number of stale branches and their names
+        """
+        result, message = WorkspaceOperations.run_git(repo_dir, ['fetch', '--prune', '--quiet', 'origin'])
+        if result != 'ok':
+            return [f"An error occurred fetching origin: {message}"]
+        main_branch = GitHubOperations.get_origin_head(repo_dir)
+        if not main_branch:
+            return ["An error occurred: origin/HEAD not set, run git remote set-head origin --auto"]
+        branches = GitHubOperations.get_remote_branches_info(main_branch, repo_dir)
+        stale = GitHubOperations.find_stale_branches(branches, main_branch, datetime.now(tz=timezone.utc))
+        return [str(len(stale)), ', '.join(stale)]
+
+    def list_pull_requests(self) -> list[list[str]]:
+        """
+        List open pull requests of all repositories hosted on GitHub, as fast as the rate limit allows.
+        :return: list of table rows with repository, number, title and URL
+        """
+        if not os.getenv('GITHUB_TOKEN'):
+            print("Error: GITHUB_TOKEN environment variable not set.")
+            return []
+        # the rate limit and the response cache are shared with the GitHub menu
+        github_ops = getattr(self.velez, 'github_ops', None)
+        rate_limit = github_ops.rate_limit if github_ops is not None else RateLimitController()
+        install_cache(hooks=[rate_limit.observe])
+        gh = github.Github(auth=github.Auth.Token(os.getenv('GITHUB_TOKEN'))).withLazy(True)
+
+        full_names = {}
+        for repo in self.repos:
+            code, url, _, _ = run_command_with_status(['git', '-C', os.path.join(self.root, repo), 'remote',
+                                                       'get-url', 'origin'])
+            # repositories hosted elsewhere, like GitLab, are not known to the GitHub API
+            if code != 0 or GitHubOperations.get_remote_host(url) != 'github.com':
+                full_names[repo] = None
+                continue
+            try:
+                full_names[repo] = '/'.join(GitHubOperations.parse_remote_url(url))
+            except ValueError:
+                full_names[repo] = None
+
+        rows = []
+        repos = [repo for repo in self.repos if full_names[repo]]
+        for repo, pulls in rate_limit.map(lambda r: list(gh.get_repo(full_names[r]).get_pulls(state='open')), repos):
+            if isinstance(pulls, Exception):
+                rows.append([repo, '', f"An error occurred: {pulls}", ''])
+            else:
+                rows += [[repo, f"#{pr.number}", pr.title, pr.html_url] for pr in pulls]
+        return sorted(rows, key=lambda row: row[0])